@@ -1,11 +1,11 @@
 import streamlit as st
 import hashlib
-from modulo_clima_laboral import mostrar_dashboard_clima_laboral
-from modulo_produccion import mostrar_dashboard_produccion
-from modulo_satisfaccion_cliente import mostrar_dashboard_satisfaccion
-from modulo_ordenes_bordado import mostrar_dashboard_ordenes
-from modulo_capacitacion import mostrar_dashboard_capacitacion
-#from modulo_formulario_confirmacion import mostrar_formulario_confirmacion  # ✅ NUEVO MÓDULO
+import importlib
+import sys
+import time
+from trazas import iniciar_rerun, finalizar_rerun, mostrar_panel_rendimiento, span
+
+_inicio_rerun = time.perf_counter()
 
 
 # Configuración de la página
@@ -25,6 +25,66 @@ HASHES_MODULOS = {
     #"📝 Crear/Confirmar Órdenes": "8995eeefb28d9bf4f258c49f50cbde651e93e3138c71c03883eb6bfffabea046" 
 }
 
+# 📦 Módulos: se importan solo al abrir su sección (ya desbloqueada).
+# Las dependencias pesadas se importan una por una antes del módulo para medir cada una.
+MODULOS = {
+    "🏭 Producción": (
+        "modulo_produccion", "mostrar_dashboard_produccion",
+        ["pandas", "numpy", "plotly.express", "gspread", "oauth2client.service_account"]
+    ),
+    "👥 Clima Laboral": (
+        "modulo_clima_laboral", "mostrar_dashboard_clima_laboral",
+        ["pandas", "numpy", "matplotlib.pyplot", "seaborn", "gspread", "oauth2client.service_account"]
+    ),
+    "😊 Satisfacción Cliente": (
+        "modulo_satisfaccion_cliente", "mostrar_dashboard_satisfaccion",
+        ["pandas", "matplotlib.pyplot", "gspread", "oauth2client.service_account"]
+    ),
+    "📦 Órdenes Bordado": (
+        "modulo_ordenes_bordado", "mostrar_dashboard_ordenes",
+        ["pandas", "gspread", "google.oauth2.service_account", "googleapiclient.discovery"]
+    ),
+    "🎓 Capacitación": (
+        "modulo_capacitacion", "mostrar_dashboard_capacitacion",
+        ["pandas", "plotly.graph_objects", "google.oauth2.service_account", "googleapiclient.discovery"]
+    ),
+    #"📝 Crear/Confirmar Órdenes": ("modulo_formulario_confirmacion", "mostrar_formulario_confirmacion", [])
+}
+
+@st.cache_resource
+def obtener_tiempos_importacion():
+    """Tiempos de importación del proceso (ms por módulo), compartidos entre sesiones"""
+    return {}
+
+def importar_con_tiempo(nombre):
+    """Importar un módulo registrando cuánto tardó la primera vez en este proceso"""
+    if nombre in sys.modules:
+        return sys.modules[nombre]
+    inicio = time.perf_counter()
+    modulo = importlib.import_module(nombre)
+    obtener_tiempos_importacion()[nombre] = (time.perf_counter() - inicio) * 1000
+    return modulo
+
+def cargar_modulo(nombre_modulo):
+    """Importar (solo la primera vez) el módulo de una sección y devolver su función principal"""
+    archivo, funcion, dependencias = MODULOS[nombre_modulo]
+    with span(f"importar {archivo}", "import"):
+        for dependencia in dependencias:
+            importar_con_tiempo(dependencia)
+        return getattr(importar_con_tiempo(archivo), funcion)
+
+def mostrar_tiempos_arranque():
+    """Reporte de arranque: importaciones del proceso y duración de este rerun"""
+    tiempos = obtener_tiempos_importacion()
+    with st.sidebar.expander("⏱️ Tiempos de arranque", expanded=False):
+        st.caption(f"Este rerun: {(time.perf_counter() - _inicio_rerun) * 1000:,.0f} ms")
+        if not tiempos:
+            st.caption("Aún no se ha importado ningún módulo en este proceso")
+            return
+        st.caption(f"Importaciones del proceso: {sum(tiempos.values()):,.0f} ms")
+        for nombre, ms in sorted(tiempos.items(), key=lambda item: item[1], reverse=True):
+            st.caption(f"`{nombre}`: {ms:,.0f} ms")
+
 # 🔐 Función de verificación
 def verificar_contraseña(input_password, stored_hash):
     return hashlib.sha256(input_password.encode()).hexdigest() == stored_hash
@@ -38,11 +98,12 @@ for modulo in HASHES_MODULOS.keys():
 st.sidebar.title("🌐 Navegación")
 modulo_seleccionado = st.sidebar.radio(
     "Seleccionar Módulo:",
-    ["🏭 Producción", "👥 Clima Laboral", "😊 Satisfacción Cliente", 
-     "📦 Órdenes Bordado", "🎓 Capacitación" #"📝 Crear/Confirmar Órdenes"
-    ] 
+    list(MODULOS)
 )
 
+# 🔬 Trazas de rendimiento de este rerun
+iniciar_rerun(modulo_seleccionado)
+
 # Título principal
 st.title("📊 Dashboard Integral de Métricas")
 
@@ -79,24 +140,9 @@ if not st.session_state[modulo_acceso_key]:
         """)
     
 else:
-    # Módulo desbloqueado - mostrar contenido
-    if modulo_seleccionado == "🏭 Producción":
-        mostrar_dashboard_produccion()
-        
-    elif modulo_seleccionado == "👥 Clima Laboral":
-        mostrar_dashboard_clima_laboral()
-        
-    elif modulo_seleccionado == "😊 Satisfacción Cliente":
-        mostrar_dashboard_satisfaccion()
-        
-    elif modulo_seleccionado == "📦 Órdenes Bordado":
-        mostrar_dashboard_ordenes()
-
-    elif modulo_seleccionado == "🎓 Capacitación":  # ✅ NUEVA LÓGICA
-        mostrar_dashboard_capacitacion()
-        
-    #elif modulo_seleccionado == "📝 Crear/Confirmar Órdenes":  # ✅ NUEVA LÓGICA
-        #mostrar_formulario_confirmacion()
+    # Módulo desbloqueado - importar (solo la primera vez) y mostrar contenido
+    mostrar_dashboard = cargar_modulo(modulo_seleccionado)
+    mostrar_dashboard()
     
     # Botón para cerrar sesión del módulo actual
     st.sidebar.markdown("---")
@@ -110,3 +156,6 @@ if st.sidebar.button("🚪 Cerrar Todas las Sesiones"):
     for modulo in HASHES_MODULOS.keys():
         st.session_state[f"acceso_{modulo}"] = False
     st.rerun()
+
+mostrar_tiempos_arranque()
+mostrar_panel_rendimiento(finalizar_rerun())
@@ -0,0 +1,8 @@
+# config_pandas.py
+import pandas as pd
+
+# 🐄 Copy-on-Write: filtros y selecciones comparten los datos hasta que alguien los modifica,
+# así no hace falta copiar DataFrames "por si acaso" (en pandas >= 3 siempre está activo).
+# Lo importan los módulos de datos (no el arranque de la app, que no carga pandas)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
@@ -0,0 +1,108 @@
+# coordinacion.py
+import os
+import tempfile
+import threading
+import time
+
+# Un arrendamiento más viejo que esto se considera abandonado (proceso caído a mitad de la escritura)
+TTL_ARRENDAMIENTO_SEG = 300
+
+# Directorio compartido por los procesos del servidor (dashboard y ejecutor por lotes)
+DIRECTORIO_COORDINACION = os.environ.get(
+    "DASHBOARD_COORDINACION_DIR", os.path.join(tempfile.gettempdir(), "dashboard_bordado")
+)
+
+_locks_proceso = {}
+_versiones_hechas = {}
+_lock_registro = threading.Lock()
+
+def _ruta(nombre, extension):
+    os.makedirs(DIRECTORIO_COORDINACION, exist_ok=True)
+    return os.path.join(DIRECTORIO_COORDINACION, f"{nombre}.{extension}")
+
+class Arrendamiento:
+    """Lease entre procesos: archivo creado con O_EXCL que caduca a los `ttl` segundos"""
+
+    def __init__(self, nombre, ttl=TTL_ARRENDAMIENTO_SEG):
+        self.ruta = _ruta(nombre, "lease")
+        self.ttl = ttl
+        self.adquirido = False
+
+    def adquirir(self):
+        """Intentar tomar el lease sin esperar; devuelve True si se obtuvo"""
+        for _ in range(2):
+            try:
+                descriptor = os.open(self.ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    vencido = time.time() - os.path.getmtime(self.ruta) > self.ttl
+                except FileNotFoundError:
+                    continue
+                if not vencido:
+                    return False
+                # El dueño anterior no lo liberó: se descarta y se reintenta una vez
+                try:
+                    os.remove(self.ruta)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(descriptor, "w") as f:
+                f.write(f"{os.getpid()} {time.time():.0f}")
+            self.adquirido = True
+            return True
+        return False
+
+    def liberar(self):
+        if self.adquirido:
+            self.adquirido = False
+            try:
+                os.remove(self.ruta)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self.adquirir()
+
+    def __exit__(self, *exc):
+        self.liberar()
+
+def leer_version_materializada(nombre):
+    """Última versión de datos materializada por cualquier proceso (None si nunca)"""
+    try:
+        with open(_ruta(nombre, "version"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _registrar_version(nombre, version):
+    ruta = _ruta(nombre, "version")
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(temporal, ruta)
+
+def ejecutar_una_vez(nombre, version, funcion):
+    """Ejecutar `funcion` a lo sumo una vez por versión de datos entre hilos y procesos.
+
+    Devuelve True si este llamador hizo el trabajo y False si ya estaba hecho o lo está
+    haciendo otro proceso. Si `funcion` lanza una excepción, la versión no se registra.
+    """
+    with _lock_registro:
+        lock = _locks_proceso.setdefault(nombre, threading.Lock())
+        hechas = _versiones_hechas.setdefault(nombre, set())
+
+    with lock:
+        if version in hechas or leer_version_materializada(nombre) == version:
+            hechas.add(version)
+            return False
+        with Arrendamiento(nombre) as adquirido:
+            if not adquirido:
+                return False
+            # Otro proceso pudo terminar entre la primera lectura y el lease
+            if leer_version_materializada(nombre) == version:
+                hechas.add(version)
+                return False
+            funcion()
+            _registrar_version(nombre, version)
+        hechas.add(version)
+        return True
@@ -0,0 +1,222 @@
+# esquemas.py
+import pandas as pd
+from indice_texto import normalizar_texto
+import config_pandas  # noqa: F401 (Copy-on-Write en pandas < 3)
+
+# Formato de "Marca temporal" de Google Forms
+FORMATO_MARCA_TEMPORAL = "%d/%m/%Y %H:%M:%S"
+
+# 📋 Un esquema por pestaña: columna canónica → tipo, alias, formato de fecha, si es requerida
+# y valor por defecto cuando la hoja no la trae. Las columnas no declaradas se conservan como texto.
+# Tipos: "texto" (sin espacios al inicio/fin), "numero" (lo inválido queda NaN; "relleno" lo sustituye)
+# y "fecha" ("formato" primero; lo que no encaje se interpreta con el día primero).
+ESQUEMAS = {
+    "reporte_de_trabajo": {
+        "hoja": "reporte_de_trabajo",
+        "descartar": ["Dirección de correo electrónico"],
+        "columnas": {
+            "Marca temporal": {"tipo": "fecha", "formato": FORMATO_MARCA_TEMPORAL, "requerida": True},
+            "OPERADOR": {"tipo": "texto", "requerida": True},
+            "#DE PEDIDO": {"tipo": "texto", "alias": ["# DE PEDIDO", "#PEDIDO", "PEDIDO"]},
+            "CANTIDAD": {"tipo": "numero", "requerida": True},
+            "PUNTADAS": {"tipo": "numero", "relleno": 0, "requerida": True},
+            "MULTIPLOS": {"tipo": "numero"},
+            "CABEZAS": {"tipo": "numero", "alias": ["NO_DE_CABEZAS", "NUMERO_CABEZAS", "NO CABEZAS"]},
+        },
+    },
+    "resumen_ejecutivo": {
+        "hoja": "resumen_ejecutivo",
+        "columnas": {
+            "FECHA": {"tipo": "fecha", "formato": "%Y-%m-%d", "requerida": True},
+            "OPERADOR": {"tipo": "texto", "requerida": True},
+            "TOTAL_PUNTADAS": {"tipo": "numero", "requerida": True},
+            "COMISION": {"tipo": "numero", "requerida": True},
+            "BONIFICACION": {"tipo": "numero", "requerida": True},
+            "COMISION_TOTAL": {"tipo": "numero", "requerida": True},
+        },
+    },
+    "ordenes_bordado": {
+        "hoja": "OrdenesBordado",
+        "columnas": {
+            "Número Orden": {"tipo": "texto", "alias": ["Número de Orden", "No. Orden"]},
+            "Estado Aprobación": {"tipo": "texto", "alias": ["Estado de Aprobación", "Aprobación"], "defecto": "Pendiente"},
+            "Estado Producción": {
+                "tipo": "texto", "alias": ["Estado de Producción", "Producción"], "defecto": "Pendiente Aprobación"
+            },
+            "Vendedor": {"tipo": "texto", "requerida": True},
+            "Cliente": {"tipo": "texto", "requerida": True},
+            "Fecha Compromiso": {"tipo": "fecha", "formato": "%d/%m/%Y", "alias": ["Fecha de Compromiso", "Fecha Entrega"]},
+        },
+    },
+    "oee_produccion": {
+        "hoja": "Produccion",
+        "columnas": {
+            "maquina": {"tipo": "texto", "requerida": True},
+            "codigo_pedido": {"tipo": "texto", "requerida": True},
+            "fecha_inic": {"tipo": "fecha"},
+            "cantidad_producida": {"tipo": "numero", "requerida": True},
+            "unidades_defectuosas": {"tipo": "numero"},
+            "unidades_buenas": {"tipo": "numero", "requerida": True},
+            "tiempo_planificado_min": {"tipo": "numero", "requerida": True},
+            "tiempo_paro_planeado_min": {"tipo": "numero", "requerida": True},
+            "tiempo_paro_no_planeado_min": {"tipo": "numero", "requerida": True},
+            "run_time_min": {"tipo": "numero"},
+            "tiempo_ciclo_ideal_unit_seg": {"tipo": "numero", "requerida": True},
+        },
+    },
+    "satisfaccion_costumatic": {
+        "hoja": "respuesta_cliente_costumatic",
+        "columnas": {
+            "Marca temporal": {"tipo": "fecha", "formato": FORMATO_MARCA_TEMPORAL, "requerida": True},
+            "Atencion_Cliente": {
+                "tipo": "numero", "alias": ["¿Cómo calificarías nuestra atención al cliente?"], "requerida": True
+            },
+            "Satisfaccion_General": {
+                "tipo": "numero",
+                "alias": ["¿Qué tan satisfecho está con los productos y servicios que ofrece Costumatic?"],
+            },
+            "Recomendacion": {"tipo": "texto", "alias": ["¿Nos recomendarías?"], "requerida": True},
+            "Comentarios": {"tipo": "texto", "alias": ["¿Tienes algún comentario o sugerencia?"], "defecto": ""},
+        },
+    },
+    "satisfaccion_bordamatic": {
+        "hoja": "respuesta_cliente_bordamatic",
+        "columnas": {
+            "Marca temporal": {"tipo": "fecha", "formato": FORMATO_MARCA_TEMPORAL, "requerida": True},
+            "Atencion_Cliente": {
+                "tipo": "numero", "alias": ["¿Cómo calificarías nuestra atención al cliente?"], "requerida": True
+            },
+            "Tiempo_Entrega": {"tipo": "numero", "alias": ["¿Cómo calificarías el tiempo de entrega?"]},
+            "Calidad_Trabajo": {"tipo": "texto", "alias": ["¿La calidad del trabajo fue la esperada?"]},
+            "Recomendacion": {"tipo": "texto", "alias": ["¿Nos recomendarías?"], "requerida": True},
+            "Comentarios": {"tipo": "texto", "alias": ["¿Tienes algún comentario o sugerencia?"], "defecto": ""},
+        },
+    },
+}
+
+class ErrorEsquema(ValueError):
+    """La hoja no trae las columnas que el esquema declara como requeridas"""
+
+    def __init__(self, nombre_esquema, faltantes, encontradas):
+        self.nombre_esquema = nombre_esquema
+        self.faltantes = list(faltantes)
+        self.encontradas = list(encontradas)
+        hoja = ESQUEMAS[nombre_esquema]["hoja"]
+        super().__init__(
+            f"La hoja '{hoja}' no tiene las columnas requeridas {self.faltantes} "
+            f"(columnas encontradas: {self.encontradas})"
+        )
+
+def _limpiar_encabezado(columna):
+    return str(columna).strip()
+
+def resolver_columnas(encabezados, nombre_esquema):
+    """{columna canónica: [encabezados de la hoja que la alimentan, en orden de preferencia]}"""
+    esquema = ESQUEMAS[nombre_esquema]
+    por_nombre = {}
+    for encabezado in encabezados:
+        por_nombre.setdefault(normalizar_texto(_limpiar_encabezado(encabezado)), []).append(encabezado)
+
+    resueltas = {}
+    for canonica, definicion in esquema["columnas"].items():
+        fuentes = []
+        for nombre in [canonica, *definicion.get("alias", [])]:
+            for encabezado in por_nombre.get(normalizar_texto(nombre), []):
+                if encabezado not in fuentes:
+                    fuentes.append(encabezado)
+        if fuentes:
+            resueltas[canonica] = fuentes
+
+    faltantes = [
+        canonica for canonica, definicion in esquema["columnas"].items()
+        if definicion.get("requerida") and canonica not in resueltas
+    ]
+    if faltantes:
+        raise ErrorEsquema(nombre_esquema, faltantes, encabezados)
+    return resueltas
+
+def indice_columna(encabezados, nombre_esquema, canonica):
+    """Posición (desde 1, como en Sheets) de la columna canónica en los encabezados, o None"""
+    fuentes = resolver_columnas(encabezados, nombre_esquema).get(canonica)
+    return list(encabezados).index(fuentes[0]) + 1 if fuentes else None
+
+def _texto(serie):
+    if pd.api.types.is_string_dtype(serie):
+        return serie.str.strip()
+    if serie.dtype == object:
+        return serie.map(lambda valor: valor.strip() if isinstance(valor, str) else valor)
+    return serie
+
+def _celdas_vacias(serie):
+    """Celdas de texto vacías o solo con espacios (las celdas vacías de Sheets llegan como "")"""
+    if pd.api.types.is_string_dtype(serie) or serie.dtype == object:
+        return serie.map(lambda valor: isinstance(valor, str) and not valor.strip()).astype(bool)
+    return pd.Series(False, index=serie.index)
+
+def _fechas_flexibles(serie):
+    """ISO (año primero) tal cual; cualquier otro formato con el día primero"""
+    texto = serie.astype(str)
+    es_iso = texto.str.match(r"\d{4}-\d{1,2}-\d{1,2}")
+    fechas = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    if es_iso.any():
+        fechas[es_iso] = pd.to_datetime(texto[es_iso], errors="coerce")
+    if (~es_iso).any():
+        fechas[~es_iso] = pd.to_datetime(texto[~es_iso], errors="coerce", dayfirst=True)
+    return fechas
+
+def _convertir(serie, definicion):
+    tipo = definicion.get("tipo", "texto")
+    if tipo == "numero":
+        return pd.to_numeric(_texto(serie), errors="coerce")
+    if tipo == "fecha":
+        serie = _texto(serie)
+        formato = definicion.get("formato")
+        if formato is None:
+            return _fechas_flexibles(serie)
+        fechas = pd.to_datetime(serie, format=formato, errors="coerce")
+        pendientes = fechas.isna() & serie.notna() & (serie.astype(str) != "")
+        if pendientes.any():
+            fechas[pendientes] = _fechas_flexibles(serie[pendientes])
+        return fechas
+    return _texto(serie)
+
+def aplicar_esquema(df_raw, nombre_esquema):
+    """Resolver columnas y convertir tipos en una sola pasada; lanza ErrorEsquema si faltan requeridas"""
+    esquema = ESQUEMAS[nombre_esquema]
+    descartar = {normalizar_texto(nombre) for nombre in esquema.get("descartar", [])}
+    # Por posición: las hojas pueden traer encabezados repetidos (por ejemplo, vacíos)
+    posiciones = {}
+    for posicion, encabezado in enumerate(df_raw.columns):
+        if normalizar_texto(_limpiar_encabezado(encabezado)) not in descartar:
+            posiciones.setdefault(encabezado, posicion)
+    resueltas = resolver_columnas(list(posiciones), nombre_esquema)
+    canonica_por_fuente = {fuentes[0]: canonica for canonica, fuentes in resueltas.items()}
+    usadas = {fuente for fuentes in resueltas.values() for fuente in fuentes}
+
+    columnas = {}
+    for encabezado, posicion in sorted(posiciones.items(), key=lambda item: item[1]):
+        serie = df_raw.iloc[:, posicion]
+        if encabezado in canonica_por_fuente:
+            canonica = canonica_por_fuente[encabezado]
+            definicion = esquema["columnas"][canonica]
+            serie = _convertir(serie, definicion)
+            # Si la hoja trae varios alias, se completa con el siguiente donde el primero está vacío
+            # (en texto, vacío es "": se pasa a NA para completar y lo que siga vacío vuelve a "")
+            if len(resueltas[canonica]) > 1:
+                vacias = _celdas_vacias(serie)
+                serie = serie.mask(vacias)
+                for alternativa in resueltas[canonica][1:]:
+                    alterna = _convertir(df_raw.iloc[:, posiciones[alternativa]], definicion)
+                    serie = serie.fillna(alterna.mask(_celdas_vacias(alterna)))
+                serie = serie.mask(vacias & serie.isna(), "")
+            if "relleno" in definicion:
+                serie = serie.fillna(definicion["relleno"])
+            columnas[canonica] = serie
+        elif encabezado not in usadas:
+            columnas[_limpiar_encabezado(encabezado)] = _texto(serie)
+
+    for canonica, definicion in esquema["columnas"].items():
+        if canonica not in columnas and "defecto" in definicion:
+            columnas[canonica] = pd.Series(definicion["defecto"], index=df_raw.index)
+
+    return pd.DataFrame(columnas, index=df_raw.index)
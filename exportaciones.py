@@ -0,0 +1,157 @@
+# exportaciones.py
+import functools
+import hashlib
+import importlib.util
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import pandas as pd
+import streamlit as st
+from trazas import span
+
+# Filas que se escriben por bloque en CSV (no se arma todo el archivo como un solo string)
+FILAS_POR_BLOQUE = 50_000
+# Exportaciones generadas que se conservan en disco (las más antiguas se borran)
+MAX_EXPORTACIONES = 16
+# Límite de filas de una hoja de Excel (sin contar el encabezado)
+MAX_FILAS_XLSX = 1_048_575
+
+# 📦 Formatos soportados; "requiere" es la dependencia opcional que los habilita
+FORMATOS = {
+    "csv": {"etiqueta": "CSV", "mime": "text/csv", "requiere": None},
+    "xlsx": {
+        "etiqueta": "Excel (XLSX)",
+        "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "requiere": "openpyxl",
+    },
+    "parquet": {"etiqueta": "Parquet", "mime": "application/vnd.apache.parquet", "requiere": "pyarrow"},
+}
+
+def formato_disponible(formato):
+    requiere = FORMATOS[formato]["requiere"]
+    return requiere is None or importlib.util.find_spec(requiere) is not None
+
+def version_dataframe(df):
+    """Huella del contenido del DataFrame, para cuando el módulo no tiene una versión de datos propia"""
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes()).hexdigest()[:16]
+
+def escribir_csv_por_bloques(df, destino, index=False, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Escribir el CSV en `destino` (binario) bloque a bloque, con BOM para que Excel respete los acentos"""
+    texto = io.TextIOWrapper(destino, encoding="utf-8-sig", newline="", write_through=True)
+    try:
+        for inicio in range(0, max(len(df), 1), filas_por_bloque):
+            df.iloc[inicio:inicio + filas_por_bloque].to_csv(texto, index=index, header=inicio == 0)
+    finally:
+        # Soltar el buffer sin cerrarlo: el llamador sigue usando `destino`
+        texto.detach()
+
+def _parquet(df, destino, index):
+    try:
+        df.to_parquet(destino, index=index)
+    except (TypeError, ValueError):
+        # Columnas object con tipos mezclados (fechas y textos): se exportan como texto
+        destino.seek(0)
+        destino.truncate()
+        columnas_object = {col: str for col in df.columns if df[col].dtype == object}
+        df.astype(columnas_object).to_parquet(destino, index=index)
+
+def generar_archivo(df, formato, destino, index=False):
+    """Escribir la exportación en `destino` (archivo binario abierto), sin armarla entera en memoria"""
+    if formato == "csv":
+        escribir_csv_por_bloques(df, destino, index=index)
+    elif formato == "xlsx":
+        if len(df) > MAX_FILAS_XLSX:
+            raise ValueError(f"Excel admite hasta {MAX_FILAS_XLSX:,} filas; exporta en CSV o Parquet")
+        with pd.ExcelWriter(destino, engine="openpyxl") as writer:
+            df.to_excel(writer, index=index, sheet_name="datos")
+    elif formato == "parquet":
+        _parquet(df, destino, index)
+    else:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+@st.cache_resource
+def obtener_almacen_exportaciones():
+    """Archivos ya generados por (nombre, versión, formato), compartidos por todas las sesiones.
+    Viven en un directorio temporal: en memoria solo se leen cuando alguien pulsa Descargar."""
+    return {'lock': threading.Lock(), 'archivos': OrderedDict(), 'directorio': tempfile.mkdtemp(prefix="exportaciones_")}
+
+def exportacion_en_cache(nombre, version, formato):
+    """Ruta del archivo ya generado (None si no existe)"""
+    almacen = obtener_almacen_exportaciones()
+    with almacen['lock']:
+        clave = (nombre, version, formato)
+        if clave in almacen['archivos']:
+            almacen['archivos'].move_to_end(clave)
+            return almacen['archivos'][clave]
+    return None
+
+def obtener_exportacion(df, nombre, version, formato, index=False):
+    """Ruta de la exportación; se genera una sola vez por versión de datos y formato"""
+    ruta = exportacion_en_cache(nombre, version, formato)
+    if ruta is not None:
+        return ruta
+
+    almacen = obtener_almacen_exportaciones()
+    descriptor, ruta = tempfile.mkstemp(suffix=f".{formato}", dir=almacen['directorio'])
+    try:
+        with span(f"exportar {nombre} {formato}", "io", filas=len(df)), os.fdopen(descriptor, "w+b") as destino:
+            generar_archivo(df, formato, destino, index=index)
+    except BaseException:
+        _borrar(ruta)
+        raise
+
+    with almacen['lock']:
+        anterior = almacen['archivos'].pop((nombre, version, formato), None)
+        almacen['archivos'][(nombre, version, formato)] = ruta
+        while len(almacen['archivos']) > MAX_EXPORTACIONES:
+            _borrar(almacen['archivos'].popitem(last=False)[1])
+    if anterior is not None:
+        _borrar(anterior)
+    return ruta
+
+def _leer_archivo(ruta):
+    with open(ruta, "rb") as f:
+        return f.read()
+
+def boton_exportar(df, nombre, version=None, index=False, clave=None, etiqueta="📥 Descargar"):
+    """Selector de formato + descarga. El archivo se genera solo cuando alguien lo pide
+    (botón "Preparar") y queda en caché hasta que cambia la versión de los datos."""
+    clave = clave or nombre
+    formatos = [formato for formato in FORMATOS if formato_disponible(formato)]
+    if version is None:
+        version = version_dataframe(df)
+
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        formato = st.selectbox(
+            "Formato:", formatos, format_func=lambda f: FORMATOS[f]["etiqueta"], key=f"exportar_formato_{clave}"
+        )
+
+    with col2:
+        ruta = exportacion_en_cache(nombre, version, formato)
+        if ruta is None:
+            if not st.button("⚙️ Preparar descarga", key=f"exportar_preparar_{clave}"):
+                return
+            try:
+                with st.spinner("Generando archivo..."):
+                    ruta = obtener_exportacion(df, nombre, version, formato, index=index)
+            except Exception as e:
+                st.error(f"❌ No se pudo generar la exportación: {e}")
+                return
+
+        st.download_button(
+            label=f"{etiqueta} {FORMATOS[formato]['etiqueta']}",
+            # Se lee del disco solo al pulsar (descarga diferida)
+            data=functools.partial(_leer_archivo, ruta),
+            file_name=f"{nombre}.{formato}",
+            mime=FORMATOS[formato]["mime"],
+            key=f"exportar_descargar_{clave}",
+        )
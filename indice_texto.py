@@ -0,0 +1,106 @@
+# indice_texto.py
+import bisect
+import difflib
+import re
+import unicodedata
+
+PATRON_PALABRAS = re.compile(r"[a-z0-9ñ]+")
+
+# Palabras vacías del español (ya normalizadas: sin acentos) que no aportan a búsquedas ni frecuencias
+PALABRAS_VACIAS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes aqui asi aun bien cada como con contra cual
+cuando de del desde donde dos el ella ellas ellos en entre era eran es esa esas ese eso esos esta estaba
+estan estar estas este esto estos fue fueron ha habia han hasta hay la las le les lo los mas me mi mis
+mucho muy nada ni no nos nosotros o otra otro para pero poco por porque que se ser si sido sin sobre
+solo son su sus tambien te tiene todo todos tu un una uno unos usted ustedes y ya yo
+""".split())
+
+def normalizar_texto(texto):
+    """Minúsculas y sin acentos (conserva la ñ) para comparar sin importar cómo se escribió"""
+    texto = str(texto).lower().replace("ñ", "\x00")
+    texto = unicodedata.normalize("NFKD", texto)
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return texto.replace("\x00", "ñ")
+
+def tokenizar(texto, palabras_vacias=()):
+    """Separar un texto normalizado en palabras, descartando las palabras vacías"""
+    return [t for t in PATRON_PALABRAS.findall(normalizar_texto(texto)) if t not in palabras_vacias]
+
+class IndiceInvertido:
+    """Índice invertido token → documentos, con búsqueda exacta, por prefijo y aproximada"""
+
+    def __init__(self):
+        self._postings = {}
+        self._tokens_por_doc = {}
+        self._vocabulario = None
+
+    def __len__(self):
+        return len(self._tokens_por_doc)
+
+    def __contains__(self, id_doc):
+        return id_doc in self._tokens_por_doc
+
+    def entradas(self):
+        """Pares (token, documento) guardados, para estimar el tamaño del índice"""
+        return sum(len(tokens) for tokens in self._tokens_por_doc.values())
+
+    def agregar(self, id_doc, tokens):
+        """Agregar (o reemplazar) un documento con sus tokens"""
+        if id_doc in self._tokens_por_doc:
+            self.eliminar(id_doc)
+        tokens = frozenset(tokens)
+        self._tokens_por_doc[id_doc] = tokens
+        for token in tokens:
+            if token not in self._postings:
+                self._postings[token] = set()
+                self._vocabulario = None
+            self._postings[token].add(id_doc)
+
+    def eliminar(self, id_doc):
+        """Quitar un documento del índice (si no existe no hace nada)"""
+        for token in self._tokens_por_doc.pop(id_doc, ()):
+            ids = self._postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(id_doc)
+            if not ids:
+                del self._postings[token]
+                self._vocabulario = None
+
+    def vocabulario(self):
+        """Tokens ordenados (se reconstruye solo cuando cambian los tokens del índice)"""
+        if self._vocabulario is None:
+            self._vocabulario = sorted(self._postings)
+        return self._vocabulario
+
+    def tokens_con_prefijo(self, prefijo):
+        """Tokens que empiezan con el prefijo, por búsqueda binaria sobre el vocabulario"""
+        vocabulario = self.vocabulario()
+        inicio = bisect.bisect_left(vocabulario, prefijo)
+        fin = bisect.bisect_left(vocabulario, prefijo + "\uffff")
+        return vocabulario[inicio:fin]
+
+    def tokens_parecidos(self, termino, n=5, corte=0.75):
+        """Tokens parecidos al término (para errores de escritura)"""
+        return difflib.get_close_matches(termino, self.vocabulario(), n=n, cutoff=corte)
+
+    def buscar_termino(self, termino, prefijo=True, aproximado=True):
+        """Documentos que contienen el término; si no hay coincidencias exactas ni por prefijo, busca aproximado"""
+        ids = set(self._postings.get(termino, ()))
+        if prefijo:
+            for token in self.tokens_con_prefijo(termino):
+                ids |= self._postings[token]
+        if not ids and aproximado:
+            for token in self.tokens_parecidos(termino):
+                ids |= self._postings[token]
+        return ids
+
+    def buscar(self, terminos, prefijo=True, aproximado=True):
+        """Documentos que contienen todos los términos (intersección)"""
+        resultado = None
+        for termino in terminos:
+            ids = self.buscar_termino(termino, prefijo=prefijo, aproximado=aproximado)
+            resultado = ids if resultado is None else resultado & ids
+            if not resultado:
+                return set()
+        return resultado if resultado is not None else set(self._tokens_por_doc)
@@ -1,15 +1,345 @@
 # modulo_capacitacion.py
 import streamlit as st
 import pandas as pd
+import os
+import re
+import threading
+import time
 from datetime import datetime
 import plotly.graph_objects as go
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from servicios_google import ejecutar_drive
+from indice_texto import IndiceInvertido, normalizar_texto, tokenizar
+from trazas import span, trazar
+from exportaciones import boton_exportar
 
 
-# Configuración de Google Drive API (si quieres mostrar archivos reales)
+# Configuración de Google Drive API (catálogo real de documentos)
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 
+CARPETA_MIME = "application/vnd.google-apps.folder"
+CAMPOS_ARCHIVO = "id, name, mimeType, modifiedTime, parents, trashed, webViewLink"
+
+# Segundos entre sincronizaciones automáticas del catálogo
+INTERVALO_SINCRONIZACION = 600
+# Resultados de búsqueda que se dibujan (la exportación lleva todos)
+MAX_RESULTADOS_VISIBLES = 200
+COLUMNAS_EXPORTACION_DOCUMENTOS = ["Nombre", "Tipo", "Ubicación", "Fecha", "enlace"]
+
+# Códigos de la nomenclatura: FOR-CAP-MNT-01, REG-CAP-MNT-2024-001, EXP-CAP-MNT-001, SOP-MNT-03...
+PATRON_CODIGO = re.compile(r"\b[a-z]{3}(?:-[a-z0-9]+)+")
+
+# Prefijo del código → tipo de documento
+TIPOS_POR_PREFIJO = {
+    "FOR": "Formato",
+    "REG": "Registro",
+    "EXP": "Expediente",
+    "PER": "Expediente",
+    "HIS": "Expediente",
+    "CER": "Certificación",
+    "PRO": "Programa",
+    "SOP": "SOP",
+    "COM": "Competencia",
+    "PLN": "Plan",
+    "MAN": "Manual",
+    "INF": "Informe",
+}
+
+# Opciones del filtro (plural) → valor de "Tipo" en el catálogo
+FILTROS_TIPO = {
+    "Formatos": "Formato",
+    "Registros": "Registro",
+    "Expedientes": "Expediente",
+    "Certificaciones": "Certificación",
+    "Programas": "Programa",
+}
+
+# Catálogo de ejemplo cuando no hay carpeta de Drive ni carpeta local configurada
+DOCUMENTOS_DEMO = [
+    {"Nombre": "FOR-CAP-MNT-01_Matriz_Competencias_Personal.xlsx", "Ubicación": "FOR-CAP-MNT/", "Fecha": "2024-01-15"},
+    {"Nombre": "REG-CAP-MNT-2024-001_Induccion_Enero_15.docx", "Ubicación": "REG-CAP-MNT/2024/01-Enero/", "Fecha": "2024-01-20"},
+    {"Nombre": "PER-CAP-MNT-001_Ficha_Personal.pdf", "Ubicación": "EXP-CAP-MNT-001_Juan_Perez/", "Fecha": "2024-02-10"},
+    {"Nombre": "HIS-CAP-MNT-001_Historial_Capacitacion.xlsx", "Ubicación": "EXP-CAP-MNT-001_Juan_Perez/", "Fecha": "2024-02-10"},
+    {"Nombre": "CER-CAP-MNT-001-01_Prensa_Hidraulica.pdf", "Ubicación": "EXP-CAP-MNT-001_Juan_Perez/CER-CAP-MNT-001/", "Fecha": "2024-03-05"},
+    {"Nombre": "PRO-CAP-MNT-01_Programa_Induccion.pdf", "Ubicación": "PRO-CAP-MNT/", "Fecha": "2024-01-10"},
+    {"Nombre": "SOP-MNT-03_Procedimiento_Gestion_Competencias.pdf", "Ubicación": "SOPS/SOP-MNT/", "Fecha": "2024-01-05"},
+    {"Nombre": "COM-MNT-01_Matriz_Competencias_General.xlsx", "Ubicación": "MANTTO/COM-MNT/", "Fecha": "2024-01-08"},
+]
+
+def tipo_documento(nombre):
+    """Tipo del documento según el prefijo de su código"""
+    return TIPOS_POR_PREFIJO.get(nombre[:3].upper(), "Otro")
+
+def tokens_documento(doc):
+    """Tokens de búsqueda: códigos completos, años, números y palabras (incluye nombres de empleados)"""
+    texto = normalizar_texto(f"{doc['Ubicación']} {doc['Nombre']}")
+    return set(PATRON_CODIGO.findall(texto)) | set(tokenizar(texto))
+
+def tokens_consulta(consulta):
+    """Tokens de la consulta con la misma nomenclatura que los documentos"""
+    texto = normalizar_texto(consulta)
+    codigos = PATRON_CODIGO.findall(texto)
+    resto = PATRON_CODIGO.sub(" ", texto)
+    return codigos + tokenizar(resto)
+
+class FuenteDocumentosDrive:
+    """Listado recursivo de una carpeta de Drive; los refrescos usan la API de cambios"""
+
+    def __init__(self, servicio, carpeta_raiz):
+        self.servicio = servicio
+        self.carpeta_raiz = carpeta_raiz
+        self._rutas_carpetas = {carpeta_raiz: ""}
+        # Árbol conocido (padre de cada carpeta y documento) para propagar renombres y papeleras
+        self._padres = {}
+        self._nombres_carpetas = {}
+        self._documentos = {}
+
+    def _documento(self, archivo, ruta):
+        return {
+            "id": archivo["id"],
+            "Nombre": archivo["name"],
+            "Ubicación": ruta,
+            "Fecha": archivo.get("modifiedTime", "")[:10],
+            "modificado": archivo.get("modifiedTime", ""),
+            "enlace": archivo.get("webViewLink", ""),
+        }
+
+    def _registrar_carpeta(self, archivo, padre):
+        self._padres[archivo["id"]] = padre
+        self._nombres_carpetas[archivo["id"]] = archivo["name"]
+        self._rutas_carpetas[archivo["id"]] = f"{self._rutas_carpetas[padre]}{archivo['name']}/"
+
+    def _registrar_documento(self, archivo, padre):
+        doc = self._documento(archivo, self._rutas_carpetas[padre])
+        self._padres[doc["id"]] = padre
+        self._documentos[doc["id"]] = doc
+        return doc
+
+    def _recorrer(self, carpeta_inicial):
+        """Documentos de una carpeta ya registrada y de todas sus subcarpetas"""
+        documentos = []
+        pendientes = [carpeta_inicial]
+        while pendientes:
+            carpeta = pendientes.pop()
+            page_token = None
+            while True:
+                respuesta = ejecutar_drive(self.servicio.files().list(
+                    q=f"'{carpeta}' in parents and trashed = false",
+                    fields=f"nextPageToken, files({CAMPOS_ARCHIVO})",
+                    pageSize=1000,
+                    pageToken=page_token,
+                    supportsAllDrives=True,
+                    includeItemsFromAllDrives=True,
+                ))
+                for archivo in respuesta.get("files", []):
+                    if archivo["mimeType"] == CARPETA_MIME:
+                        self._registrar_carpeta(archivo, carpeta)
+                        pendientes.append(archivo["id"])
+                    else:
+                        documentos.append(self._registrar_documento(archivo, carpeta))
+                page_token = respuesta.get("nextPageToken")
+                if not page_token:
+                    break
+        return documentos
+
+    def _descendientes(self, carpeta):
+        """Carpetas y documentos bajo `carpeta`, cada padre antes que sus hijos"""
+        hijos = {}
+        for id_archivo, padre in self._padres.items():
+            hijos.setdefault(padre, []).append(id_archivo)
+        descendientes = []
+        pendientes = [carpeta]
+        while pendientes:
+            for hijo in hijos.get(pendientes.pop(), []):
+                descendientes.append(hijo)
+                pendientes.append(hijo)
+        return descendientes
+
+    def _olvidar(self, id_archivo):
+        """Quitar un archivo, o una carpeta con todo su contenido; devuelve las bajas de documentos"""
+        ids = [id_archivo]
+        if id_archivo in self._rutas_carpetas:
+            ids += self._descendientes(id_archivo)
+        bajas = []
+        for id_actual in ids:
+            self._padres.pop(id_actual, None)
+            self._nombres_carpetas.pop(id_actual, None)
+            if self._rutas_carpetas.pop(id_actual, None) is None:
+                self._documentos.pop(id_actual, None)
+                bajas.append((id_actual, None))
+        return bajas
+
+    def _actualizar_rutas(self, carpeta):
+        """Recalcular la ruta de todo lo que cuelga de una carpeta renombrada o movida"""
+        actualizados = []
+        for id_archivo in self._descendientes(carpeta):
+            ruta_padre = self._rutas_carpetas[self._padres[id_archivo]]
+            if id_archivo in self._rutas_carpetas:
+                self._rutas_carpetas[id_archivo] = f"{ruta_padre}{self._nombres_carpetas[id_archivo]}/"
+            else:
+                doc = dict(self._documentos[id_archivo], **{"Ubicación": ruta_padre})
+                self._documentos[id_archivo] = doc
+                actualizados.append((id_archivo, doc))
+        return actualizados
+
+    def listar_completo(self):
+        """Recorrer todas las subcarpetas; devuelve (documentos, token de cambios)"""
+        token = ejecutar_drive(self.servicio.changes().getStartPageToken(supportsAllDrives=True))["startPageToken"]
+        return self._recorrer(self.carpeta_raiz), token
+
+    def listar_cambios(self, token):
+        """Solo los archivos que cambiaron desde el token; devuelve ([(id, documento o None)], token nuevo).
+        Si cambia una carpeta, también se devuelven los documentos que cuelgan de ella."""
+        cambios = []
+        while True:
+            respuesta = ejecutar_drive(self.servicio.changes().list(
+                pageToken=token,
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({CAMPOS_ARCHIVO}))",
+                includeRemoved=True,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+                pageSize=1000,
+            ))
+            for cambio in respuesta.get("changes", []):
+                archivo = cambio.get("file") or {}
+                padres = archivo.get("parents") or []
+                padre = padres[0] if padres else None
+                eliminado = cambio.get("removed") or archivo.get("trashed")
+                if cambio["fileId"] == self.carpeta_raiz and not eliminado:
+                    # La raíz cuelga de fuera del catálogo: renombrarla no cambia ninguna ruta
+                    continue
+                if eliminado or padre not in self._rutas_carpetas:
+                    cambios += self._olvidar(cambio["fileId"])
+                elif archivo["mimeType"] == CARPETA_MIME:
+                    nueva = archivo["id"] not in self._rutas_carpetas
+                    self._registrar_carpeta(archivo, padre)
+                    if nueva:
+                        # Carpeta creada o traída desde fuera: su contenido no se conocía
+                        cambios += [(doc["id"], doc) for doc in self._recorrer(archivo["id"])]
+                    else:
+                        cambios += self._actualizar_rutas(archivo["id"])
+                else:
+                    cambios.append((archivo["id"], self._registrar_documento(archivo, padre)))
+            if "newStartPageToken" in respuesta:
+                return cambios, respuesta["newStartPageToken"]
+            token = respuesta["nextPageToken"]
+
+class FuenteDocumentosLocal:
+    """Sustituto sin conexión: recorre una carpeta local (o el catálogo de ejemplo si no hay carpeta)"""
+
+    def __init__(self, carpeta_raiz=None):
+        self.carpeta_raiz = carpeta_raiz
+
+    def _listar(self):
+        if not self.carpeta_raiz:
+            return {
+                doc["Nombre"]: dict(doc, id=doc["Nombre"], modificado=doc["Fecha"], enlace="")
+                for doc in DOCUMENTOS_DEMO
+            }
+        documentos = {}
+        for raiz, _, archivos in os.walk(self.carpeta_raiz):
+            ruta = os.path.relpath(raiz, self.carpeta_raiz).replace(os.sep, "/")
+            ruta = "" if ruta == "." else f"{ruta}/"
+            for nombre in archivos:
+                ruta_completa = os.path.join(raiz, nombre)
+                modificado = datetime.fromtimestamp(os.path.getmtime(ruta_completa)).isoformat()
+                documentos[ruta_completa] = {
+                    "id": ruta_completa,
+                    "Nombre": nombre,
+                    "Ubicación": ruta,
+                    "Fecha": modificado[:10],
+                    "modificado": modificado,
+                    "enlace": "",
+                }
+        return documentos
+
+    def listar_completo(self):
+        documentos = self._listar()
+        return list(documentos.values()), {id_doc: doc["modificado"] for id_doc, doc in documentos.items()}
+
+    def listar_cambios(self, token):
+        """Comparar fechas de modificación con el recorrido anterior"""
+        documentos = self._listar()
+        cambios = [(id_doc, None) for id_doc in token if id_doc not in documentos]
+        cambios += [
+            (id_doc, doc) for id_doc, doc in documentos.items()
+            if token.get(id_doc) != doc["modificado"]
+        ]
+        return cambios, {id_doc: doc["modificado"] for id_doc, doc in documentos.items()}
+
+class CatalogoDocumentos:
+    """Documentos del sistema con su índice invertido; se sincroniza de forma incremental"""
+
+    def __init__(self, fuente):
+        self.fuente = fuente
+        self.documentos = {}
+        self.indice = IndiceInvertido()
+        self._token = None
+        self._ultima_sincronizacion = 0.0
+        self._lock = threading.Lock()
+
+    def _indexar(self, doc):
+        doc = dict(doc, Tipo=tipo_documento(doc["Nombre"]))
+        self.documentos[doc["id"]] = doc
+        self.indice.agregar(doc["id"], tokens_documento(doc))
+
+    def _quitar(self, id_doc):
+        self.documentos.pop(id_doc, None)
+        self.indice.eliminar(id_doc)
+
+    def sincronizar(self, forzar=False):
+        """Listado completo la primera vez; después solo se reindexan los archivos que cambiaron"""
+        with self._lock:
+            if not forzar and time.time() - self._ultima_sincronizacion < INTERVALO_SINCRONIZACION:
+                return 0
+            if self._token is None:
+                documentos, self._token = self.fuente.listar_completo()
+                for doc in documentos:
+                    self._indexar(doc)
+                cambios = len(documentos)
+            else:
+                lista_cambios, self._token = self.fuente.listar_cambios(self._token)
+                for id_doc, doc in lista_cambios:
+                    if doc is None:
+                        self._quitar(id_doc)
+                    else:
+                        self._indexar(doc)
+                cambios = len(lista_cambios)
+            self._ultima_sincronizacion = time.time()
+            return cambios
+
+    def buscar(self, consulta, tipo=None, limite=200):
+        """Documentos que coinciden con la consulta (prefijo y aproximada) y el tipo, más recientes primero"""
+        with self._lock:
+            terminos = tokens_consulta(consulta) if consulta else []
+            ids = self.indice.buscar(terminos)
+            resultados = [self.documentos[id_doc] for id_doc in ids]
+        if tipo:
+            resultados = [doc for doc in resultados if doc["Tipo"] == tipo]
+        resultados.sort(key=lambda doc: (doc["modificado"], doc["Nombre"]), reverse=True)
+        return resultados[:limite], len(resultados)
+
+@st.cache_resource(show_spinner=False)
+def obtener_catalogo_documentos():
+    """Catálogo compartido por todas las sesiones (Drive si está configurado, si no la fuente local)"""
+    try:
+        carpeta_drive = st.secrets["gdrive"]["capacitacion_folder_id"]
+    except Exception:
+        carpeta_drive = None
+    
+    if carpeta_drive:
+        creds_dict = dict(st.secrets["gservice_account"])
+        # Secretos guardados en una sola línea traen los saltos de línea de la llave escapados
+        creds_dict["private_key"] = creds_dict["private_key"].replace('\\n', '\n')
+        creds = service_account.Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
+        servicio = build("drive", "v3", credentials=creds, cache_discovery=False)
+        fuente = FuenteDocumentosDrive(servicio, carpeta_drive)
+    else:
+        fuente = FuenteDocumentosLocal(os.environ.get("CAPACITACION_DOCUMENTOS_DIR"))
+    return CatalogoDocumentos(fuente)
+
+@trazar("mostrar_dashboard_capacitacion", "render")
 def mostrar_dashboard_capacitacion():
     """Dashboard principal del módulo de capacitación"""
     
@@ -35,6 +365,7 @@ def mostrar_dashboard_capacitacion():
     with tab4:
         mostrar_acceso_rapido()
 
+@trazar("mostrar_estructura_sistema", "render")
 def mostrar_estructura_sistema():
     """Muestra la estructura jerárquica del sistema"""
     
@@ -145,6 +476,7 @@ def mostrar_estructura_sistema():
             st.markdown("**🏅 Certificaciones:**")
             st.code("CER-CAP-MNT-XXX")
 
+@trazar("mostrar_metricas", "render")
 def mostrar_metricas():
     """Muestra métricas y estadísticas del sistema"""
     
@@ -230,7 +562,9 @@ def mostrar_metricas():
     })
     
     st.dataframe(ultimas_capacitaciones, use_container_width=True, hide_index=True)
+    boton_exportar(ultimas_capacitaciones, "ultimas_capacitaciones", clave="exportar_capacitaciones")
 
+@trazar("mostrar_buscador_documentos", "render")
 def mostrar_buscador_documentos():
     """Buscador de documentos en el sistema"""
     
@@ -240,38 +574,37 @@ def mostrar_buscador_documentos():
     col_search, col_filter = st.columns([3, 1])
     
     with col_search:
-        busqueda = st.text_input("Buscar documentos por nombre, tipo o código:")
+        busqueda = st.text_input("Buscar documentos por nombre, código, año o empleado:")
     
     with col_filter:
-        tipo_documento = st.selectbox(
+        filtro_tipo = st.selectbox(
             "Filtrar por tipo:",
-            ["Todos", "Formatos", "Registros", "Expedientes", "Certificaciones", "Programas"]
+            ["Todos"] + list(FILTROS_TIPO)
         )
+        actualizar = st.button("🔄 Actualizar catálogo", use_container_width=True)
     
-    # Base de datos simulada de documentos
-    documentos = [
-        {"Nombre": "FOR-CAP-MNT-01_Matriz_Competencias_Personal.xlsx", "Tipo": "Formato", "Ubicación": "FOR-CAP-MNT/", "Fecha": "2024-01-15"},
-        {"Nombre": "REG-CAP-MNT-2024-001_Induccion_Enero_15.docx", "Tipo": "Registro", "Ubicación": "REG-CAP-MNT/2024/01-Enero/", "Fecha": "2024-01-20"},
-        {"Nombre": "PER-CAP-MNT-001_Ficha_Personal.pdf", "Tipo": "Expediente", "Ubicación": "EXP-CAP-MNT-001_Juan_Perez/", "Fecha": "2024-02-10"},
-        {"Nombre": "HIS-CAP-MNT-001_Historial_Capacitacion.xlsx", "Tipo": "Expediente", "Ubicación": "EXP-CAP-MNT-001_Juan_Perez/", "Fecha": "2024-02-10"},
-        {"Nombre": "CER-CAP-MNT-001-01_Prensa_Hidraulica.pdf", "Tipo": "Certificación", "Ubicación": "EXP-CAP-MNT-001_Juan_Perez/CER-CAP-MNT-001/", "Fecha": "2024-03-05"},
-        {"Nombre": "PRO-CAP-MNT-01_Programa_Induccion.pdf", "Tipo": "Programa", "Ubicación": "PRO-CAP-MNT/", "Fecha": "2024-01-10"},
-        {"Nombre": "SOP-MNT-03_Procedimiento_Gestion_Competencias.pdf", "Tipo": "SOP", "Ubicación": "SOPS/SOP-MNT/", "Fecha": "2024-01-05"},
-        {"Nombre": "COM-MNT-01_Matriz_Competencias_General.xlsx", "Tipo": "Competencia", "Ubicación": "MANTTO/COM-MNT/", "Fecha": "2024-01-08"},
-    ]
-    
-    # Filtrar documentos
-    if busqueda:
-        documentos_filtrados = [d for d in documentos if busqueda.lower() in d["Nombre"].lower()]
-    else:
-        documentos_filtrados = documentos
+    # Catálogo indexado (sincronización incremental, compartido entre sesiones)
+    catalogo = obtener_catalogo_documentos()
+    try:
+        with span("sincronizar catálogo", "io"):
+            catalogo.sincronizar(forzar=actualizar)
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo sincronizar el catálogo de documentos: {e}")
     
-    if tipo_documento != "Todos":
-        documentos_filtrados = [d for d in documentos_filtrados if d["Tipo"] == tipo_documento]
+    with span("buscar en índice"):
+        encontrados, total_encontrados = catalogo.buscar(busqueda, FILTROS_TIPO.get(filtro_tipo), limite=None)
+    documentos_filtrados = encontrados[:MAX_RESULTADOS_VISIBLES]
     
     # Mostrar resultados
     if documentos_filtrados:
-        st.write(f"**{len(documentos_filtrados)} documentos encontrados:**")
+        st.write(f"**{total_encontrados} documentos encontrados:**")
+        # La descarga incluye todos los resultados, no solo los visibles
+        boton_exportar(
+            pd.DataFrame(encontrados, columns=COLUMNAS_EXPORTACION_DOCUMENTOS),
+            "documentos_capacitacion", clave="exportar_documentos",
+        )
+        if total_encontrados > len(documentos_filtrados):
+            st.caption(f"Mostrando los {len(documentos_filtrados)} más recientes; refina la búsqueda para ver otros.")
         
         for doc in documentos_filtrados:
             with st.expander(f"📄 {doc['Nombre']}"):
@@ -283,12 +616,14 @@ def mostrar_buscador_documentos():
                     st.write(f"**Fecha:** {doc['Fecha']}")
                 
                 with col_action:
-                    # Simulación de enlace (en producción sería el enlace real)
-                    if st.button("🔗 Ver", key=f"ver_{doc['Nombre']}"):
-                        st.info(f"Enlace al documento: https://drive.google.com/file/d/ID_{doc['Nombre']}/view")
+                    if doc['enlace']:
+                        st.link_button("🔗 Ver", doc['enlace'])
+                    elif st.button("🔗 Ver", key=f"ver_{doc['id']}"):
+                        st.info(f"Documento local: {doc['Ubicación']}{doc['Nombre']}")
     else:
         st.warning("No se encontraron documentos con los criterios de búsqueda.")
 
+@trazar("mostrar_acceso_rapido", "render")
 def mostrar_acceso_rapido():
     """Acceso rápido a formularios y herramientas"""
     
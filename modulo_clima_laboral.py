@@ -1,19 +1,25 @@
 import streamlit as st
-import gspread
+from servicios_google import autorizar_gspread, leer_hojas_incrementales
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
 from datetime import datetime
 from oauth2client.service_account import ServiceAccountCredentials
+from trazas import Fases, trazar
+from exportaciones import boton_exportar
+import config_pandas  # noqa: F401 (Copy-on-Write en pandas < 3)
 
+@trazar("mostrar_dashboard_clima_laboral", "render")
 def mostrar_dashboard_clima_laboral():
     # --- CONFIGURACIÓN STREAMLIT ---
     st.header("👥 Dashboard de Clima Laboral")
     st.caption("Datos actualizados desde Google Sheets")
     
+    fase = Fases()
     try:
         # ✅ AUTENTICACIÓN (MISMA QUE EN OEE)
+        fase("autenticación google", "io")
         scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
         
         service_account_info = {
@@ -28,20 +34,25 @@ def mostrar_dashboard_clima_laboral():
         }
         
         creds = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, scope)
-        gc = gspread.authorize(creds)
+        gc = autorizar_gspread(creds)
     
         sheet_id = st.secrets["gsheets"]["clima_laboral_sheet_id"]
-        sh = gc.open_by_key(sheet_id)
         
         # Leer las cuatro pestañas
-        ventas_b = pd.DataFrame(sh.worksheet("Ventas").get_all_records())
-        produccion_b = pd.DataFrame(sh.worksheet("Produccion").get_all_records())
-        ventas_c = pd.DataFrame(sh.worksheet("Ventas_c").get_all_records())
-        produccion_c = pd.DataFrame(sh.worksheet("Produccion_c").get_all_records())
+        fase("leer pestañas de encuesta", "io")
+        # Respuestas de formulario: solo se descargan las filas nuevas desde la lectura anterior
+        pestañas = leer_hojas_incrementales(
+            gc, sheet_id, ["Ventas", "Produccion", "Ventas_c", "Produccion_c"], registros=True
+        )
+        ventas_b = pd.DataFrame(pestañas["Ventas"].datos)
+        produccion_b = pd.DataFrame(pestañas["Produccion"].datos)
+        ventas_c = pd.DataFrame(pestañas["Ventas_c"].datos)
+        produccion_c = pd.DataFrame(pestañas["Produccion_c"].datos)
         
         st.success(f"✅ Datos cargados correctamente. Ventas B: {len(ventas_b)} registros")
         
         # --- PROCESAMIENTO DE DATOS ---
+        fase("calcular métricas por sección", "compute")
         # Diccionario de mapeo
         mapeo_preguntas = {
             "Mi trabajo es interesante y significativo": "Funciones laborales",
@@ -144,8 +155,9 @@ def mostrar_dashboard_clima_laboral():
                 st.sidebar.success(f"✅ Última actualización: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             
             # --- GRÁFICO COMPARATIVO ---
+            fase("gráfico comparativo", "render")
             st.header("Comparación entre Empresas B y C")
-            comparativo_empresas = datos[["Promedio Empresa B", "Promedio Empresa C"]].copy()
+            comparativo_empresas = datos[["Promedio Empresa B", "Promedio Empresa C"]]
             
             fig1, ax1 = plt.subplots(figsize=(12, 6))
             comparativo_empresas.plot(kind='bar', ax=ax1)
@@ -158,6 +170,7 @@ def mostrar_dashboard_clima_laboral():
             st.pyplot(fig1)
             
             # --- GRÁFICO DE PROMEDIOS ---
+            fase("gráfico de promedios", "render")
             st.header("Promedio General por Sección")
             
             fig2, ax2 = plt.subplots(figsize=(14, 7))
@@ -184,6 +197,7 @@ def mostrar_dashboard_clima_laboral():
             st.pyplot(fig2)
 
             # --- GRÁFICO CON DESVIACIÓN ESTÁNDAR ---
+            fase("gráfico con desviación", "render")
             st.header("Promedio General con Desviación Estándar")
             
             std_of_averages_per_section = datos[['Ventas B', 'Producción B', 'Ventas C', 'Producción C']].std(axis=1)
@@ -216,6 +230,7 @@ def mostrar_dashboard_clima_laboral():
             st.pyplot(fig3)
 
             # --- GRÁFICO DE PORCENTAJE ---
+            fase("gráfico de porcentaje", "render")
             st.header("Porcentaje de Satisfacción")
             
             promedio_total_porcentaje = (datos["Promedio General"] - 1) / 4 * 100
@@ -245,6 +260,7 @@ def mostrar_dashboard_clima_laboral():
             st.pyplot(fig4)
 
             # --- HEATMAP ---
+            fase("heatmap", "render")
             st.header("Mapa de Calor por Departamento")
             
             heatmap_data = datos[['Ventas B', 'Producción B', 'Ventas C', 'Producción C']]
@@ -258,6 +274,7 @@ def mostrar_dashboard_clima_laboral():
             st.pyplot(fig5)
 
             # --- SEMÁFORO ---
+            fase("semáforo", "render")
             st.header("Semáforo de Clima Laboral")
             
             umbrales = {
@@ -308,6 +325,7 @@ def mostrar_dashboard_clima_laboral():
             st.pyplot(fig6)
 
             # --- ESTADÍSTICAS ---
+            fase("estadísticas y tabla", "render")
             st.header("Estadísticas Resumen")
             
             col1, col2, col3 = st.columns(3)
@@ -323,21 +341,19 @@ def mostrar_dashboard_clima_laboral():
                 columnas_numericas = [col for col in datos.columns if col != 'ultima_actualizacion']
                 st.dataframe(datos.style.format({col: "{:.2f}" for col in columnas_numericas}))
 
-                # Botón de descarga
-                csv = datos.to_csv(index=True)
-                st.download_button(
-                    label="📥 Descargar CSV",
-                    data=csv,
-                    file_name="clima_laboral.csv",
-                    mime="text/csv"
-                )
+                # Descarga (el archivo se genera solo al pedirlo)
+                boton_exportar(datos, "clima_laboral", index=True)
         
         else:
             st.error("No se pudieron cargar los datos. Verifica la conexión.")
+        
+        fase.terminar()
             
     except Exception as e:
+        fase.terminar()
         st.error(f"Error al obtener datos: {e}")
 
-# Ejecutar la función
-mostrar_dashboard_clima_laboral()
+# Ejecutar la función (solo al correr este archivo directamente, no al importarlo)
+if __name__ == "__main__":
+    mostrar_dashboard_clima_laboral()
 
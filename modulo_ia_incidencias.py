@@ -0,0 +1,232 @@
+# modulo_ia_incidencias.py
+import threading
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from trazas import span, trazar
+
+# Días de planta (días con al menos un reporte) que forman la línea base de cada día
+VENTANA_DIAS = 20
+# Días con dato dentro de la ventana para que la línea base cuente
+MIN_DIAS_BASE = 5
+# Umbral por defecto del z robusto (Iglewicz-Hoaglin)
+UMBRAL_Z = 3.5
+# MAD → desviación estándar equivalente en datos normales
+FACTOR_MAD = 1.4826
+# Piso de la escala como fracción de la mediana (evita z infinitos con series muy constantes)
+PISO_RELATIVO = 0.05
+# Un operador está activo si reportó al menos MIN_REPORTES_ACTIVO de los últimos DIAS_ACTIVIDAD días de planta
+DIAS_ACTIVIDAD = 10
+MIN_REPORTES_ACTIVO = 3
+# Filas previas que necesita un día para que su resultado sea igual al del cálculo completo:
+# mediana de VENTANA días previos + MAD de desvíos que a su vez usan otra ventana
+CONTEXTO_DIAS = max(2 * VENTANA_DIAS + 1, DIAS_ACTIVIDAD + 1)
+
+METRICAS_PRODUCCION = {'TOTAL_PUNTADAS': "Puntadas", 'CANTIDAD': "Piezas"}
+METRICAS_OEE = {'OEE': "OEE", 'cantidad_producida': "Unidades"}
+
+def rollup_produccion(df_calculado):
+    """Pivote ancho día × (métrica, operador); NaN = el operador no reportó ese día"""
+    base = df_calculado.assign(FECHA=pd.to_datetime(df_calculado['FECHA'], errors='coerce').dt.normalize())
+    base = base.dropna(subset=['FECHA'])
+    base[list(METRICAS_PRODUCCION)] = base[list(METRICAS_PRODUCCION)].apply(pd.to_numeric, errors='coerce')
+    pivote = base.pivot_table(index='FECHA', columns='OPERADOR', values=list(METRICAS_PRODUCCION), aggfunc='sum')
+    pivote.columns.names = ['METRICA', 'ENTIDAD']
+    return pivote.sort_index(axis=0).sort_index(axis=1)
+
+def rollup_oee(df_oee):
+    """Pivote ancho día × (métrica, máquina) con el OEE medio y las unidades del día"""
+    base = df_oee.dropna(subset=['fecha_inic']).assign(FECHA=lambda d: d['fecha_inic'].dt.normalize())
+    pivote = pd.concat({
+        'OEE': base.pivot_table(index='FECHA', columns='maquina', values='OEE', aggfunc='mean'),
+        'cantidad_producida': base.pivot_table(index='FECHA', columns='maquina', values='cantidad_producida', aggfunc='sum'),
+    }, axis=1)
+    pivote.columns.names = ['METRICA', 'ENTIDAD']
+    return pivote.sort_index(axis=0).sort_index(axis=1)
+
+def puntuar(pivote):
+    """Línea base robusta de cada día con los días previos (shift(1)): mediana, escala MAD y z"""
+    previo = pivote.shift(1)
+    mediana = previo.rolling(VENTANA_DIAS, min_periods=MIN_DIAS_BASE).median()
+    # MAD de los desvíos de los días previos respecto a su propia línea base
+    mad = (pivote - mediana).abs().shift(1).rolling(VENTANA_DIAS, min_periods=MIN_DIAS_BASE).median()
+    escala = (FACTOR_MAD * mad).clip(lower=PISO_RELATIVO * mediana.abs())
+    z = ((pivote - mediana) / escala).replace([np.inf, -np.inf], np.nan)
+
+    reportes = pivote.notna().astype(float).shift(1).rolling(DIAS_ACTIVIDAD, min_periods=1).sum()
+    sin_reporte = pivote.isna() & (reportes >= MIN_REPORTES_ACTIVO)
+    return {'mediana': mediana, 'escala': escala, 'z': z, 'sin_reporte': sin_reporte}
+
+class DetectorIncidencias:
+    """Resultados de `puntuar` que se extienden solo con los días nuevos.
+
+    El último día guardado se recalcula siempre (puede seguir recibiendo reportes). Si cambian
+    días anteriores o aparecen operadores/máquinas nuevos, se recalcula todo el historial.
+    """
+
+    def __init__(self):
+        self.pivote = None
+        self.resultado = None
+        self.ultima_actualizacion = None
+        self._lock = threading.Lock()
+
+    def _es_continuacion(self, pivote):
+        if self.pivote is None or len(self.pivote) == 0 or not pivote.columns.equals(self.pivote.columns):
+            return False
+        estables = len(self.pivote) - 1
+        return len(pivote) > estables and pivote.iloc[:estables].equals(self.pivote.iloc[:estables])
+
+    def actualizar(self, pivote):
+        """Poner los resultados al día con `pivote`; devuelve (pivote, resultado, (modo, días recalculados))"""
+        with self._lock:
+            if self.pivote is not None and pivote.equals(self.pivote):
+                self.ultima_actualizacion = ("sin cambios", 0)
+            elif self._es_continuacion(pivote):
+                desde = len(self.pivote) - 1
+                parcial = puntuar(pivote.iloc[max(desde - CONTEXTO_DIAS, 0):])
+                self.resultado = {
+                    nombre: pd.concat([self.resultado[nombre].iloc[:desde], parcial[nombre].loc[pivote.index[desde]:]])
+                    for nombre in parcial
+                }
+                self.pivote = pivote
+                self.ultima_actualizacion = ("incremental", len(pivote) - desde)
+            else:
+                self.resultado = puntuar(pivote)
+                self.pivote = pivote
+                self.ultima_actualizacion = ("completo", len(pivote))
+            return self.pivote, self.resultado, self.ultima_actualizacion
+
+@st.cache_resource
+def obtener_detector(nombre):
+    """Un detector por fuente ('produccion', 'oee') compartido por todas las sesiones"""
+    return DetectorIncidencias()
+
+def _largo(tabla, nombre):
+    largo = tabla.stack(['METRICA', 'ENTIDAD'])
+    return largo.rename(nombre)
+
+def listar_incidencias(pivote, resultado, umbral, solo_caidas=(), metrica_reportes=None):
+    """Tabla larga de incidencias: valores fuera de |z| > umbral y días sin reporte de operadores activos"""
+    z = _largo(resultado['z'], 'Z').dropna()
+    fuera = z[(z.abs() > umbral) & ~((z > 0) & z.index.get_level_values('METRICA').isin(solo_caidas))]
+    filas = pd.concat([fuera, _largo(pivote, 'VALOR'), _largo(resultado['mediana'], 'BASE')], axis=1, join='inner')
+    filas['TIPO'] = np.where(filas['Z'] > 0, "⬆️ Alto", "⬇️ Bajo")
+
+    if metrica_reportes is not None:
+        # Todas las métricas de un operador faltan el mismo día: se cuenta una sola vez
+        faltan = _largo(resultado['sin_reporte'][[metrica_reportes]], 'FALTA')
+        faltan = faltan[faltan]
+        faltantes = pd.DataFrame({'Z': np.nan, 'VALOR': np.nan, 'TIPO': "📭 Sin reporte"}, index=faltan.index)
+        faltantes['BASE'] = _largo(resultado['mediana'], 'BASE').reindex(faltan.index)
+        filas = pd.concat([filas, faltantes])
+
+    filas = filas.reset_index()
+    return filas.sort_values(['FECHA', 'Z'], ascending=[False, False], key=lambda c: c.abs() if c.name == 'Z' else c)
+
+def _mostrar_tabla(incidencias, etiquetas, columna_entidad):
+    tabla = incidencias.assign(
+        FECHA=incidencias['FECHA'].dt.date,
+        METRICA=incidencias['METRICA'].map(etiquetas),
+    ).rename(columns={
+        'FECHA': 'Fecha', 'ENTIDAD': columna_entidad, 'METRICA': 'Métrica', 'TIPO': 'Tipo',
+        'VALOR': 'Valor', 'BASE': 'Línea base', 'Z': 'z robusto',
+    })
+    st.dataframe(
+        tabla[['Fecha', columna_entidad, 'Métrica', 'Tipo', 'Valor', 'Línea base', 'z robusto']].round(2),
+        use_container_width=True, hide_index=True
+    )
+
+def _grafico_entidad(pivote, resultado, metrica, entidad, umbral, titulo):
+    """Serie diaria con su banda de normalidad (mediana ± umbral × escala)"""
+    valor = pivote[(metrica, entidad)].dropna()
+    mediana = resultado['mediana'][(metrica, entidad)].reindex(valor.index)
+    escala = resultado['escala'][(metrica, entidad)].reindex(valor.index)
+    fuera = resultado['z'][(metrica, entidad)].reindex(valor.index).abs() > umbral
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=list(valor.index) + list(valor.index[::-1]),
+        y=list(mediana + umbral * escala) + list((mediana - umbral * escala).clip(lower=0)[::-1]),
+        fill='toself', fillcolor='rgba(100, 100, 255, 0.15)', line=dict(width=0),
+        name='Rango normal', hoverinfo='skip'
+    ))
+    fig.add_trace(go.Scatter(x=valor.index, y=valor, mode='lines+markers', name=titulo))
+    fig.add_trace(go.Scatter(
+        x=valor.index[fuera], y=valor[fuera], mode='markers', name='Incidencia',
+        marker=dict(color='red', size=10, symbol='x')
+    ))
+    fig.update_layout(title=f"{titulo} - {entidad}", xaxis_title="Fecha", yaxis_title=titulo)
+    st.plotly_chart(fig, use_container_width=True)
+
+def _seccion(nombre, pivote, etiquetas, columna_entidad, umbral, dias, solo_caidas=(), metrica_reportes=None):
+    with span(f"detectar incidencias {nombre}"):
+        pivote, resultado, (modo, recalculados) = obtener_detector(nombre).actualizar(pivote)
+        incidencias = listar_incidencias(pivote, resultado, umbral, solo_caidas, metrica_reportes)
+
+    desde = pivote.index.max() - pd.Timedelta(days=dias) if len(pivote) else None
+    recientes = incidencias[incidencias['FECHA'] > desde] if desde is not None else incidencias
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Incidencias", len(recientes))
+    with col2:
+        st.metric(f"{columna_entidad}s afectados", recientes['ENTIDAD'].nunique())
+    with col3:
+        st.metric("Sin reporte", int((recientes['TIPO'] == "📭 Sin reporte").sum()))
+
+    if recientes.empty:
+        st.success(f"✅ Sin incidencias en los últimos {dias} días.")
+    else:
+        _mostrar_tabla(recientes, etiquetas, columna_entidad)
+
+    entidades = list(pivote.columns.get_level_values('ENTIDAD').unique())
+    if entidades:
+        col4, col5 = st.columns(2)
+        with col4:
+            entidad = st.selectbox(f"{columna_entidad}:", entidades, key=f"incidencias_entidad_{nombre}")
+        with col5:
+            metrica = st.selectbox(
+                "Métrica:", list(etiquetas), format_func=etiquetas.get, key=f"incidencias_metrica_{nombre}"
+            )
+        _grafico_entidad(pivote, resultado, metrica, entidad, umbral, etiquetas[metrica])
+
+    st.caption(f"Línea base: {VENTANA_DIAS} días previos · cálculo {modo} ({recalculados} días) · {len(pivote)} días en historial")
+
+@trazar("mostrar_incidencias", "render")
+def mostrar_incidencias(df_produccion, df_calculado):
+    """Días anómalos por operador (puntadas, piezas, reportes faltantes) y por máquina (OEE)"""
+    if df_calculado is None or df_calculado.empty or 'TOTAL_PUNTADAS' not in df_calculado.columns:
+        st.info("ℹ️ No hay puntadas calculadas para analizar.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        umbral = st.slider("Umbral (z robusto):", min_value=2.0, max_value=6.0, value=UMBRAL_Z, step=0.5)
+    with col2:
+        dias = st.selectbox("Revisar últimos:", [7, 15, 30, 90, 365], index=2, format_func=lambda d: f"{d} días")
+    with col3:
+        incluir_oee = st.checkbox("Incluir OEE por máquina", value=False)
+
+    st.subheader("👷 Operadores")
+    _seccion(
+        "produccion", rollup_produccion(df_calculado), METRICAS_PRODUCCION, "Operador", umbral, dias,
+        metrica_reportes='TOTAL_PUNTADAS'
+    )
+
+    if incluir_oee:
+        st.subheader("🏭 Máquinas (OEE)")
+        try:
+            from modulo_oee import cargar_datos_oee
+            df_oee = cargar_datos_oee()
+        except Exception as e:
+            st.warning(f"⚠️ No se pudieron cargar los datos de OEE: {e}")
+        else:
+            _seccion(
+                "oee", rollup_oee(df_oee), METRICAS_OEE, "Máquina", umbral, dias,
+                solo_caidas=('OEE',)
+            )
+
+def integrar_en_produccion():
+    """Registro del plugin para plugin_manager"""
+    return {'nombre': "Detección de Incidencias", 'icono': "🚨", 'funcion': mostrar_incidencias}
@@ -0,0 +1,244 @@
+# modulo_ia_predicciones.py
+import hashlib
+import importlib.util
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from trazas import span, trazar
+
+# Días observados mínimos para ajustar Prophet; con menos se usa el promedio por día de la semana
+MIN_DIAS_PROPHET = 30
+# Días mínimos para intentar cualquier pronóstico
+MIN_DIAS_PRONOSTICO = 5
+# Semanas recientes que usa el modelo de respaldo
+SEMANAS_RESPALDO = 8
+# Nivel de los intervalos (80%): z = 1.2816
+INTERVALO = 0.8
+Z_INTERVALO = 1.2816
+
+# Horizonte con el que se ajusta y guarda cada serie (el slider solo recorta)
+HORIZONTE_MAXIMO = 30
+# Segundos que una sesión espera el ajuste que ya está haciendo otra
+TIEMPO_MAXIMO_AJUSTE_SEG = 600
+
+CLAVE_TOTAL = "🏭 Total planta"
+
+def prophet_disponible():
+    """Prophet es opcional: si no está instalado se usa el modelo de respaldo"""
+    return importlib.util.find_spec("prophet") is not None
+
+def series_diarias(df_calculado):
+    """{serie: DataFrame(ds, y)} con las puntadas diarias de cada operador y del total"""
+    diario = df_calculado.assign(ds=pd.to_datetime(df_calculado['FECHA'], errors='coerce')).dropna(subset=['ds'])
+    diario = diario.groupby(['OPERADOR', 'ds'], as_index=False)['TOTAL_PUNTADAS'].sum()
+
+    series = {CLAVE_TOTAL: diario.groupby('ds', as_index=False)['TOTAL_PUNTADAS'].sum()}
+    for operador, grupo in diario.groupby('OPERADOR'):
+        series[operador] = grupo[['ds', 'TOTAL_PUNTADAS']]
+    return {clave: serie.rename(columns={'TOTAL_PUNTADAS': 'y'}).reset_index(drop=True) for clave, serie in series.items()}
+
+def huella_serie(serie):
+    """Huella del historial: cambia solo si cambian las fechas o los valores de esa serie"""
+    return hashlib.sha1(pd.util.hash_pandas_object(serie, index=False).values.tobytes()).hexdigest()
+
+def _fechas_futuras(historia, horizonte):
+    """Siguientes `horizonte` días cuyo día de la semana tiene producción en el historial"""
+    dias_laborables = set(historia['ds'].dt.dayofweek)
+    candidatas = pd.date_range(historia['ds'].max() + pd.Timedelta(days=1), periods=horizonte * 7, freq='D')
+    return candidatas[candidatas.dayofweek.isin(dias_laborables)][:horizonte]
+
+def _pronostico_semanal(historia, futuras):
+    """Respaldo: media y desviación por día de la semana de las últimas semanas"""
+    reciente = historia[historia['ds'] > historia['ds'].max() - pd.Timedelta(weeks=SEMANAS_RESPALDO)]
+    por_dia = reciente.groupby(reciente['ds'].dt.dayofweek)['y'].agg(['mean', 'std']).fillna(0)
+    media = por_dia['mean'].reindex(futuras.dayofweek, fill_value=0).to_numpy()
+    desviacion = por_dia['std'].reindex(futuras.dayofweek, fill_value=0).to_numpy()
+    return pd.DataFrame({
+        'ds': futuras,
+        'yhat': media,
+        'yhat_lower': (media - Z_INTERVALO * desviacion).clip(min=0),
+        'yhat_upper': media + Z_INTERVALO * desviacion,
+    })
+
+def ajustar_pronostico(historia, horizonte, usar_prophet):
+    """Ajustar y pronosticar una serie (se ejecuta en un proceso del pool)"""
+    inicio = time.perf_counter()
+    futuras = _fechas_futuras(historia, horizonte)
+    modelo_usado = "Promedio por día de la semana"
+    pronostico = None
+
+    if usar_prophet and len(historia) >= MIN_DIAS_PROPHET:
+        try:
+            logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+            from prophet import Prophet
+            modelo = Prophet(
+                weekly_seasonality=True,
+                yearly_seasonality=len(historia) >= 365,
+                daily_seasonality=False,
+                interval_width=INTERVALO,
+            )
+            modelo.fit(historia)
+            pronostico = modelo.predict(pd.DataFrame({'ds': futuras}))[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+            pronostico[['yhat', 'yhat_lower', 'yhat_upper']] = pronostico[['yhat', 'yhat_lower', 'yhat_upper']].clip(lower=0)
+            modelo_usado = "Prophet"
+        except Exception:
+            pronostico = None
+
+    if pronostico is None:
+        pronostico = _pronostico_semanal(historia, futuras)
+
+    return {'pronostico': pronostico, 'modelo': modelo_usado, 'segundos': time.perf_counter() - inicio}
+
+@st.cache_resource
+def obtener_almacen_modelos():
+    """Pronósticos del proceso por serie (a HORIZONTE_MAXIMO días); una serie se reajusta solo si
+    cambia su huella. 'en_curso' marca los ajustes que alguna sesión ya está haciendo."""
+    return {'lock': threading.Lock(), 'series': {}, 'en_curso': {}}
+
+def _ajustar_series(series, claves, usar_prophet):
+    """Ajustar las series indicadas en paralelo (o en este proceso si el pool no está disponible)"""
+    resultados = {}
+    if len(claves) > 1:
+        try:
+            # "spawn": hacer fork desde el servidor multihilo de Streamlit puede heredar locks tomados
+            # por otros hilos (tornado, logging) y dejar al hijo bloqueado
+            with ProcessPoolExecutor(
+                max_workers=min(len(claves), os.cpu_count() or 1), mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                futuros = {
+                    clave: pool.submit(ajustar_pronostico, series[clave], HORIZONTE_MAXIMO, usar_prophet)
+                    for clave in claves
+                }
+                resultados = {clave: futuro.result() for clave, futuro in futuros.items()}
+        except Exception:
+            # Sin procesos disponibles (o el pool falló): ajustar en este proceso
+            resultados = {}
+    for clave in claves:
+        if clave not in resultados:
+            resultados[clave] = ajustar_pronostico(series[clave], HORIZONTE_MAXIMO, usar_prophet)
+    return resultados
+
+def pronosticar_series(series, horizonte):
+    """Pronósticos de todas las series recortados a `horizonte`, ajustando solo las que cambiaron"""
+    almacen = obtener_almacen_modelos()
+    usar_prophet = prophet_disponible()
+    huellas = {clave: huella_serie(serie) for clave, serie in series.items()}
+
+    # Bajo el lock solo se reparten los ajustes: cada serie pendiente la ajusta una sola sesión
+    # y las demás esperan su evento sin bloquear al resto del proceso
+    with almacen['lock']:
+        propias, ajenas = [], []
+        for clave, serie in series.items():
+            if len(serie) < MIN_DIAS_PRONOSTICO:
+                # Sin historia suficiente no se muestra un pronóstico viejo
+                almacen['series'].pop(clave, None)
+                continue
+            if almacen['series'].get(clave, {}).get('huella') == huellas[clave]:
+                continue
+            vuelo = almacen['en_curso'].get((clave, huellas[clave]))
+            if vuelo is None:
+                almacen['en_curso'][(clave, huellas[clave])] = threading.Event()
+                propias.append(clave)
+            else:
+                ajenas.append(vuelo)
+
+    try:
+        if propias:
+            with span(f"ajustar {len(propias)} modelos"):
+                resultados = _ajustar_series(series, propias, usar_prophet)
+            with almacen['lock']:
+                for clave, resultado in resultados.items():
+                    almacen['series'][clave] = {'huella': huellas[clave], **resultado}
+    finally:
+        with almacen['lock']:
+            for clave in propias:
+                almacen['en_curso'].pop((clave, huellas[clave])).set()
+
+    for vuelo in ajenas:
+        vuelo.wait(TIEMPO_MAXIMO_AJUSTE_SEG)
+
+    with almacen['lock']:
+        # Olvidar operadores que ya no aparecen en los datos
+        for clave in set(almacen['series']) - set(series):
+            del almacen['series'][clave]
+        ajustadas = {clave: almacen['series'][clave] for clave in series if clave in almacen['series']}
+
+    # El pronóstico guardado cubre HORIZONTE_MAXIMO días: cambiar el horizonte solo lo recorta
+    return {
+        clave: dict(resultado, pronostico=resultado['pronostico'].head(horizonte))
+        for clave, resultado in ajustadas.items()
+    }, propias
+
+@trazar("mostrar_predicciones", "render")
+def mostrar_predicciones(df_produccion, df_calculado):
+    """Pronóstico de puntadas diarias por operador y total"""
+    if df_calculado is None or df_calculado.empty or 'TOTAL_PUNTADAS' not in df_calculado.columns:
+        st.info("ℹ️ No hay puntadas calculadas para pronosticar.")
+        return
+
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        horizonte = st.slider("Días a pronosticar:", min_value=7, max_value=HORIZONTE_MAXIMO, value=14, step=1)
+
+    with span("series diarias"):
+        series = series_diarias(df_calculado)
+
+    with st.spinner("Ajustando modelos de pronóstico..."):
+        pronosticos, reajustadas = pronosticar_series(series, horizonte)
+
+    if not pronosticos:
+        st.info(f"ℹ️ Se necesitan al menos {MIN_DIAS_PRONOSTICO} días con producción para pronosticar.")
+        return
+
+    with col2:
+        clave = st.selectbox("Serie:", list(pronosticos))
+
+    resultado = pronosticos[clave]
+    historia = series[clave]
+    pronostico = resultado['pronostico']
+
+    # Métricas del pronóstico
+    col3, col4, col5 = st.columns(3)
+    with col3:
+        st.metric("Puntadas pronosticadas", f"{pronostico['yhat'].sum():,.0f}")
+    with col4:
+        st.metric("Promedio diario pronosticado", f"{pronostico['yhat'].mean():,.0f}")
+    with col5:
+        st.metric("Promedio diario histórico", f"{historia['y'].mean():,.0f}")
+
+    # Gráfico: historial reciente + pronóstico con intervalo
+    historia_reciente = historia[historia['ds'] > historia['ds'].max() - pd.Timedelta(days=90)]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=historia_reciente['ds'], y=historia_reciente['y'], mode='lines+markers', name='Histórico'))
+    fig.add_trace(go.Scatter(
+        x=list(pronostico['ds']) + list(pronostico['ds'][::-1]),
+        y=list(pronostico['yhat_upper']) + list(pronostico['yhat_lower'][::-1]),
+        fill='toself', fillcolor='rgba(0, 128, 0, 0.15)', line=dict(width=0),
+        name=f'Intervalo {INTERVALO:.0%}', hoverinfo='skip'
+    ))
+    fig.add_trace(go.Scatter(x=pronostico['ds'], y=pronostico['yhat'], mode='lines+markers', name='Pronóstico', line=dict(color='green')))
+    fig.update_layout(title=f"Puntadas diarias - {clave}", xaxis_title="Fecha", yaxis_title="Puntadas")
+    st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("📋 Ver pronóstico", expanded=False):
+        tabla = pronostico.rename(columns={
+            'ds': 'Fecha', 'yhat': 'Pronóstico', 'yhat_lower': 'Mínimo', 'yhat_upper': 'Máximo'
+        })
+        tabla['Fecha'] = tabla['Fecha'].dt.date
+        st.dataframe(tabla.round(0), use_container_width=True, hide_index=True)
+
+    estado = f"{len(reajustadas)} serie(s) reajustadas" if reajustadas else "todas las series desde caché"
+    st.caption(
+        f"Modelo: {resultado['modelo']} · ajuste {resultado['segundos']:.1f} s · {estado}"
+        + ("" if prophet_disponible() else " · Prophet no está instalado")
+    )
+
+def integrar_en_produccion():
+    """Registro del plugin para plugin_manager"""
+    return {'nombre': "Predicciones de Producción", 'icono': "📈", 'funcion': mostrar_predicciones}
@@ -1,63 +1,72 @@
-import gspread
+from servicios_google import autorizar_gspread, leer_hoja
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import streamlit as st
 from oauth2client.service_account import ServiceAccountCredentials
+from esquemas import aplicar_esquema
+from exportaciones import boton_exportar, version_dataframe
+from tabla_paginada import mostrar_tabla_paginada
+from series_tiempo import agrupar_por_periodo, reducir_puntos, selector_frecuencia
+from trazas import Fases, trazar
 
+# Segundos que se reutilizan los datos de OEE entre reruns y entre módulos
+TTL_DATOS_OEE = 300
+
+@st.cache_data(ttl=TTL_DATOS_OEE, show_spinner=False)
+def cargar_datos_oee():
+    """Registros de la pestaña Produccion con disponibilidad, rendimiento, calidad y OEE por fila"""
+    # ✅ AUTENTICACIÓN
+    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+    
+    service_account_info = {
+        "type": st.secrets["gservice_account"]["type"],
+        "project_id": st.secrets["gservice_account"]["project_id"],
+        "private_key_id": st.secrets["gservice_account"]["private_key_id"],
+        "private_key": st.secrets["gservice_account"]["private_key"],
+        "client_email": st.secrets["gservice_account"]["client_email"],
+        "client_id": st.secrets["gservice_account"]["client_id"],
+        "auth_uri": st.secrets["gservice_account"]["auth_uri"],
+        "token_uri": st.secrets["gservice_account"]["token_uri"]
+    }
+    
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, scope)
+    gc = autorizar_gspread(creds)
+    
+    # ✅ CARGAR DATOS
+    sheet_id = st.secrets["gsheets"]["oee_sheet_id"]
+    data = leer_hoja(gc, sheet_id, "Produccion")
+    
+    # ✅ COLUMNAS Y TIPOS SEGÚN EL ESQUEMA (numéricas, fecha_inic con el día primero)
+    df_raw = aplicar_esquema(pd.DataFrame(data[1:], columns=data[0]), "oee_produccion")
+    
+    # ✅ CÁLCULOS OEE
+    df_raw["tiempo_operativo_min"] = (
+        df_raw["tiempo_planificado_min"]
+        - df_raw["tiempo_paro_planeado_min"]
+        - df_raw["tiempo_paro_no_planeado_min"]
+    )
+    
+    df_raw["availability"] = df_raw["tiempo_operativo_min"] / df_raw["tiempo_planificado_min"]
+    
+    df_raw["performance"] = (
+        (df_raw["cantidad_producida"] * df_raw["tiempo_ciclo_ideal_unit_seg"])
+        / (df_raw["tiempo_operativo_min"] * 60)
+    )
+    
+    df_raw["quality"] = df_raw["unidades_buenas"] / df_raw["cantidad_producida"]
+    df_raw["OEE"] = df_raw["availability"] * df_raw["performance"] * df_raw["quality"]
+    return df_raw
+
+@trazar("mostrar_dashboard_oee", "render")
 def mostrar_dashboard_oee():
+    fase = Fases()
     try:
-        # ✅ AUTENTICACIÓN
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        
-        service_account_info = {
-            "type": st.secrets["gservice_account"]["type"],
-            "project_id": st.secrets["gservice_account"]["project_id"],
-            "private_key_id": st.secrets["gservice_account"]["private_key_id"],
-            "private_key": st.secrets["gservice_account"]["private_key"],
-            "client_email": st.secrets["gservice_account"]["client_email"],
-            "client_id": st.secrets["gservice_account"]["client_id"],
-            "auth_uri": st.secrets["gservice_account"]["auth_uri"],
-            "token_uri": st.secrets["gservice_account"]["token_uri"]
-        }
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, scope)
-        gc = gspread.authorize(creds)
-        
-        # ✅ CARGAR DATOS
-        sheet_id = st.secrets["gsheets"]["oee_sheet_id"]
-        worksheet = gc.open_by_key(sheet_id).worksheet("Produccion")
-        data = worksheet.get_all_values()
-        df_raw = pd.DataFrame(data[1:], columns=data[0])
-        
-        # ✅ CONVERTIR COLUMNAS NUMÉRICAS
-        columnas_numericas = [
-            "cantidad_producida", "unidades_defectuosas", "unidades_buenas",
-            "tiempo_planificado_min", "tiempo_paro_planeado_min",
-            "tiempo_paro_no_planeado_min", "run_time_min", "tiempo_ciclo_ideal_unit_seg"
-        ]
-        
-        for col in columnas_numericas:
-            if col in df_raw.columns:
-                df_raw[col] = pd.to_numeric(df_raw[col], errors="coerce")
-        
-        # ✅ CÁLCULOS OEE
-        df_raw["tiempo_operativo_min"] = (
-            df_raw["tiempo_planificado_min"]
-            - df_raw["tiempo_paro_planeado_min"]
-            - df_raw["tiempo_paro_no_planeado_min"]
-        )
-        
-        df_raw["availability"] = df_raw["tiempo_operativo_min"] / df_raw["tiempo_planificado_min"]
-        
-        df_raw["performance"] = (
-            (df_raw["cantidad_producida"] * df_raw["tiempo_ciclo_ideal_unit_seg"])
-            / (df_raw["tiempo_operativo_min"] * 60)
-        )
-        
-        df_raw["quality"] = df_raw["unidades_buenas"] / df_raw["cantidad_producida"]
-        df_raw["OEE"] = df_raw["availability"] * df_raw["performance"] * df_raw["quality"]
+        # ✅ CARGAR DATOS Y CALCULAR OEE (compartido con el plugin de incidencias)
+        fase("cargar datos OEE", "io")
+        df_raw = cargar_datos_oee()
         
+        fase("agrupar OEE", "compute")
         # ✅ OEE POR MÁQUINA
         oee_por_maquina = df_raw.groupby("maquina")[["availability","performance","quality","OEE"]].mean()
         
@@ -65,6 +74,7 @@ def mostrar_dashboard_oee():
         oee_por_pedido = df_raw.groupby("codigo_pedido")[["availability","performance","quality","OEE"]].mean()
         
        # ✅ MOSTRAR RESULTADOS PRINCIPALES
+        fase("resumen y tablas", "render")
         st.header("🏭 Dashboard OEE")
         
       # ✅ RESUMEN ESTADÍSTICO AL INICIO
@@ -99,6 +109,7 @@ def mostrar_dashboard_oee():
         st.dataframe(oee_por_pedido.style.format("{:.2%}"))
         
         # ✅ GRÁFICO OEE POR MÁQUINA
+        fase("gráficos por máquina y pedido", "render")
         st.subheader("📈 OEE por Máquina")
         fig1, ax1 = plt.subplots(figsize=(10, 6))
         oee_por_maquina["OEE"].plot(kind="bar", ax=ax1, color='skyblue')
@@ -121,16 +132,21 @@ def mostrar_dashboard_oee():
         st.pyplot(fig2)
         
         # ✅ EVOLUCIÓN TEMPORAL DEL OEE
+        fase("evolución temporal", "render")
         st.subheader("📅 Evolución del OEE en el Tiempo")
         
         # Verificar y convertir fecha
         if 'fecha_inic' in df_raw.columns:
-            df_raw["fecha_inic"] = pd.to_datetime(df_raw["fecha_inic"], errors="coerce", dayfirst=True)
-            oee_tiempo = df_raw.groupby("fecha_inic")["OEE"].mean().sort_index()
+            # Día, semana o mes según el rango de fechas, y como mucho MAX_PUNTOS puntos (LTTB)
+            frecuencia, periodo = selector_frecuencia(df_raw["fecha_inic"], "evolucion_oee")
+            oee_tiempo = agrupar_por_periodo(df_raw, "fecha_inic", {"OEE": "mean"}, frecuencia)
+            oee_tiempo = reducir_puntos(oee_tiempo, "Fecha", "OEE").set_index("Fecha")["OEE"]
             
             fig3, ax3 = plt.subplots(figsize=(12, 6))
-            oee_tiempo.plot(marker="o", ax=ax3, color='red', linewidth=2, markersize=6)
-            ax3.set_title("Evolución del OEE en el tiempo")
+            oee_tiempo.plot(
+                marker="o" if len(oee_tiempo) <= 120 else None, ax=ax3, color='red', linewidth=2, markersize=6
+            )
+            ax3.set_title(f"Evolución del OEE en el tiempo (por {periodo.lower()})")
             ax3.set_ylabel("OEE")
             ax3.set_xlabel("Fecha")
             ax3.grid(True, alpha=0.3)
@@ -140,6 +156,7 @@ def mostrar_dashboard_oee():
             st.warning("No se encontró la columna 'fecha_inic' para la evolución temporal")
         
         # ✅ RADAR CHART - COMPONENTES POR MÁQUINA
+        fase("componentes por máquina", "render")
         st.subheader("🎯 Radar Chart - Componentes OEE por Máquina")
         
         if len(oee_por_maquina) > 0:
@@ -205,23 +222,23 @@ def mostrar_dashboard_oee():
         
         
         # ✅ DATOS CRUDOS (opcional)
+        fase("datos crudos", "render")
         with st.expander("📋 Ver Datos Crudos"):
-            st.dataframe(df_raw)
+            # Solo viaja al navegador la página visible
+            version_oee = version_dataframe(df_raw)
+            mostrar_tabla_paginada(df_raw, "datos_oee", version=version_oee)
             
-            # Botón de descarga
-            csv = df_raw.to_csv(index=False)
-            st.download_button(
-                label="📥 Descargar Datos CSV",
-                data=csv,
-                file_name="datos_oee.csv",
-                mime="text/csv"
-            )
+            # Descarga (el archivo se genera solo al pedirlo)
+            boton_exportar(df_raw, "datos_oee", version=version_oee, etiqueta="📥 Descargar Datos")
         
+        fase.terminar()
         st.success("Dashboard OEE cargado correctamente ✅")
         
     except Exception as e:
+        fase.terminar()
         st.error(f"Error en OEE: {e}")
         st.info("Verifica que las columnas en tu Google Sheets coincidan con los nombres esperados")
 
-# Ejecutar la función
-mostrar_dashboard_oee()
+# Ejecutar la función (solo al correr este archivo directamente, no al importarlo)
+if __name__ == "__main__":
+    mostrar_dashboard_oee()
@@ -1,8 +1,22 @@
 import streamlit as st
+import heapq
+import itertools
+import numpy as np
 import pandas as pd
 import gspread
+from servicios_google import CARGAS, autorizar_gspread, ejecutar_drive
+import csv
+import os
+import threading
+from collections import deque
 from google.oauth2.service_account import Credentials
+from googleapiclient.discovery import build
 from datetime import datetime
+from typing import NamedTuple
+from coordinacion import Arrendamiento
+from esquemas import aplicar_esquema, indice_columna
+from exportaciones import boton_exportar
+from trazas import span, trazar
 
 # Configuración para Google Sheets
 SCOPE = [
@@ -10,121 +24,414 @@ SCOPE = [
     "https://www.googleapis.com/auth/drive"
 ]
 
+# Estados de producción que ya no requieren la promoción automática a "En Espera"
+ESTADOS_PRODUCCION_AVANZADOS = ['En Espera', 'En Proceso', 'Completado', 'Entregado']
+
+# 🤖 Promoción automática Aprobado → En Espera (un solo conciliador en segundo plano)
+INTERVALO_CONCILIACION_SEG = 60
+# Celdas por llamada de escritura
+TAMANO_LOTE_ESCRITURA = 200
+# Cambios recientes que se conservan para mostrarlos en el tablero
+MAX_CAMBIOS_REGISTRADOS = 200
+# Lease entre procesos: solo un proceso del servidor promueve a la vez
+NOMBRE_ARRENDAMIENTO_PROMOCION = "promocion_ordenes"
+
+class FuenteOrdenesSheets:
+    """Hoja OrdenesBordado en Google Sheets; la revisión se consulta a Drive (solo metadatos)"""
+    
+    def __init__(self, sheet, drive, sheet_id):
+        self.sheet = sheet
+        self.drive = drive
+        self.id = sheet_id
+        # El cliente de googleapiclient (httplib2) no es seguro entre hilos
+        self._lock_drive = threading.Lock()
+    
+    def obtener_revision(self):
+        """Marcador de revisión del archivo: versión + modifiedTime de Drive"""
+        with self._lock_drive:
+            meta = ejecutar_drive(self.drive.files().get(fileId=self.id, fields="version,modifiedTime"))
+        return f"{meta.get('version', '')}-{meta.get('modifiedTime', '')}"
+    
+    def leer_valores(self):
+        return CARGAS.cargar((self.id, self.sheet.title, "valores"), self.sheet.get_all_values)
+    
+    def actualizar_celdas(self, celdas):
+        """Escribir una lista de (fila, columna, valor) en una sola llamada"""
+        self.sheet.batch_update(
+            [{'range': gspread.utils.rowcol_to_a1(fila, columna), 'values': [[valor]]} for fila, columna, valor in celdas],
+            value_input_option='USER_ENTERED'
+        )
+
+class FuenteOrdenesLocal:
+    """Sustituto sin conexión: un CSV local con la misma estructura que la hoja OrdenesBordado"""
+    
+    def __init__(self, ruta_csv):
+        self.ruta = ruta_csv
+        self.id = os.path.abspath(ruta_csv)
+    
+    def obtener_revision(self):
+        """La fecha de modificación y el tamaño del archivo hacen de marcador de revisión"""
+        info = os.stat(self.ruta)
+        return f"{info.st_mtime_ns}-{info.st_size}"
+    
+    def leer_valores(self):
+        with open(self.ruta, newline='', encoding='utf-8') as f:
+            return [fila for fila in csv.reader(f)]
+    
+    def actualizar_celdas(self, celdas):
+        """Escribir una lista de (fila, columna, valor), con índices 1-based como en Sheets"""
+        valores = self.leer_valores()
+        for fila, columna, valor in celdas:
+            valores[fila - 1][columna - 1] = valor
+        with open(self.ruta, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(valores)
+
+@st.cache_resource(show_spinner=False)
+def abrir_fuente_ordenes():
+    """Abrir la fuente de órdenes una vez por proceso (CSV local si ORDENES_BORDADO_CSV está definido)"""
+    ruta_local = os.environ.get("ORDENES_BORDADO_CSV")
+    if ruta_local:
+        return FuenteOrdenesLocal(ruta_local)
+    
+    creds_dict = {
+        "type": st.secrets["gservice_account"]["type"],
+        "project_id": st.secrets["gservice_account"]["project_id"],
+        "private_key_id": st.secrets["gservice_account"]["private_key_id"],
+        "private_key": st.secrets["gservice_account"]["private_key"].replace('\\n', '\n'),
+        "client_email": st.secrets["gservice_account"]["client_email"],
+        "client_id": st.secrets["gservice_account"]["client_id"],
+        "auth_uri": st.secrets["gservice_account"]["auth_uri"],
+        "token_uri": st.secrets["gservice_account"]["token_uri"]
+    }
+    
+    creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPE)
+    client = autorizar_gspread(creds)
+    
+    sheet_id = st.secrets["gsheets"]["ordenes_bordado_sheet_id"]
+    spreadsheet = client.open_by_key(sheet_id)
+    sheet = spreadsheet.worksheet("OrdenesBordado")
+    drive = build("drive", "v3", credentials=creds, cache_discovery=False)
+    
+    return FuenteOrdenesSheets(sheet, drive, sheet_id)
+
 def conectar_google_sheets():
-    """Conectar con Google Sheets usando tus credenciales existentes"""
+    """Conectar con la fuente de órdenes (la conexión se reutiliza entre vistas)"""
     try:
-        creds_dict = {
-            "type": st.secrets["gservice_account"]["type"],
-            "project_id": st.secrets["gservice_account"]["project_id"],
-            "private_key_id": st.secrets["gservice_account"]["private_key_id"],
-            "private_key": st.secrets["gservice_account"]["private_key"].replace('\\n', '\n'),
-            "client_email": st.secrets["gservice_account"]["client_email"],
-            "client_id": st.secrets["gservice_account"]["client_id"],
-            "auth_uri": st.secrets["gservice_account"]["auth_uri"],
-            "token_uri": st.secrets["gservice_account"]["token_uri"]
-        }
-        
-        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPE)
-        client = gspread.authorize(creds)
-        
-        sheet_id = st.secrets["gsheets"]["ordenes_bordado_sheet_id"]
-        spreadsheet = client.open_by_key(sheet_id)
-        sheet = spreadsheet.worksheet("OrdenesBordado")
-        
-        return sheet
+        return abrir_fuente_ordenes()
         
     except Exception as e:
         st.error(f"❌ Error conectando con Google Sheets: {e}")
         return None
 
-def obtener_ordenes_con_actualizacion(sheet):
-    """Obtener órdenes y actualizar automáticamente si es necesario"""
-    try:
-        data = sheet.get_all_records()
-        if not data:
-            return pd.DataFrame()
-        
-        df = pd.DataFrame(data)
-        
-        # Verificar que las columnas necesarias existen
-        if 'Estado Producción' not in df.columns:
-            df['Estado Producción'] = 'Pendiente Aprobación'
-        if 'Estado Aprobación' not in df.columns:
-            df['Estado Aprobación'] = 'Pendiente'
-        
-        # ENCONTRAR LA COLUMNA DE ESTADO PRODUCCIÓN
-        headers = sheet.row_values(1)
-        try:
-            col_produccion_index = headers.index('Estado Producción') + 1
-        except ValueError:
-            # Si no encuentra el nombre exacto, buscar similar
-            for i, header in enumerate(headers):
-                if 'producción' in header.lower() or 'produccion' in header.lower():
-                    col_produccion_index = i + 1
-                    break
-            else:
-                col_produccion_index = None
-        
-        # VERIFICAR Y ACTUALIZAR ORDENES APROBADAS
-        actualizaciones_realizadas = []
-        
-        for i, row in enumerate(data, start=2):
-            numero_orden = str(row.get('Número Orden', '')).strip()
-            aprobacion = str(row.get('Estado Aprobación', '')).strip()
-            produccion = str(row.get('Estado Producción', '')).strip()
-            
-            # LOGICA: Si está aprobado Y producción no está en estado avanzado
-            if (aprobacion == 'Aprobado' and 
-                produccion not in ['En Espera', 'En Proceso', 'Completado', 'Entregado'] and
-                col_produccion_index is not None):
-                
-                # Actualizar a "En Espera"
-                sheet.update_cell(i, col_produccion_index, 'En Espera')
-                actualizaciones_realizadas.append(numero_orden)
-        
-        # Si hubo actualizaciones, recargar datos
-        if actualizaciones_realizadas:
-            st.session_state['ultimas_actualizaciones'] = actualizaciones_realizadas
-            data = sheet.get_all_records()
-            df = pd.DataFrame(data)
+@st.cache_data(show_spinner=False, max_entries=4)
+def leer_valores_ordenes(id_fuente, revision, _fuente):
+    """Descargar la hoja completa; solo se ejecuta cuando cambia la revisión"""
+    return _fuente.leer_valores()
+
+def ordenes_por_promover(df):
+    """Máscara de órdenes aprobadas cuyo estado de producción no es avanzado (van a "En Espera")"""
+    aprobacion = df['Estado Aprobación'].astype(str).str.strip()
+    produccion = df['Estado Producción'].astype(str).str.strip()
+    return (aprobacion == 'Aprobado') & ~produccion.isin(ESTADOS_PRODUCCION_AVANZADOS)
+
+class ConciliadorOrdenes:
+    """Hilo único por proceso que promueve las órdenes aprobadas a "En Espera".
+
+    Corre cada INTERVALO_CONCILIACION_SEG (o cuando alguien lo pide), solo descarga la hoja si
+    cambió su revisión, escribe por lotes y guarda un registro de lo que cambió. Las vistas
+    del tablero solo leen.
+    """
+
+    def __init__(self, fuente, intervalo=INTERVALO_CONCILIACION_SEG):
+        self.fuente = fuente
+        self.intervalo = intervalo
+        self.cambios = deque(maxlen=MAX_CAMBIOS_REGISTRADOS)
+        self.ejecuciones = 0
+        self.ultima_ejecucion = None
+        self.ultimos_promovidos = []
+        self.ultimo_error = None
+        self._revision_revisada = None
+        self._despertar = threading.Event()
+        self._detenido = threading.Event()
+        self._lock = threading.Lock()
+        self._lock_cambios = threading.Lock()
+        self._hilo = threading.Thread(target=self._bucle, name="conciliador-ordenes", daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        """Terminar el hilo al acabar la vuelta en curso (si la hay)"""
+        self._detenido.set()
+        self._despertar.set()
+
+    def solicitar(self):
+        """Pedir una conciliación ahora (sin esperar a que termine)"""
+        self._despertar.set()
+
+    def _bucle(self):
+        while not self._detenido.is_set():
+            try:
+                self.conciliar()
+            except Exception as e:
+                self.ultimo_error = f"{datetime.now():%H:%M:%S} {e}"
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+
+    def conciliar(self):
+        """Promover lo pendiente; devuelve los números de orden que se cambiaron"""
+        with self._lock:
+            revision = self.fuente.obtener_revision()
+            if revision == self._revision_revisada:
+                return []
+            with Arrendamiento(NOMBRE_ARRENDAMIENTO_PROMOCION) as adquirido:
+                if not adquirido:
+                    # Otro proceso está promoviendo; se vuelve a revisar en la próxima vuelta
+                    return []
+                with span("conciliar OrdenesBordado", "io"):
+                    promovidos = self._promover(self.fuente.leer_valores())
+            # Mientras la revisión no cambie no hay nada nuevo que revisar
+            self._revision_revisada = revision
+            self.ejecuciones += 1
+            self.ultima_ejecucion = datetime.now()
+            self.ultimos_promovidos = promovidos
+            self.ultimo_error = None
+            return promovidos
+
+    def _promover(self, data):
+        if len(data) < 2:
+            return []
+        headers = data[0]
+        # COLUMNA DE ESTADO PRODUCCIÓN EN LA HOJA (None si la hoja no la tiene)
+        col_produccion_index = indice_columna(headers, "ordenes_bordado", "Estado Producción")
+        if col_produccion_index is None:
+            return []
         
-        # CREAR ESTADO KANBAN
-        df['Estado_Kanban'] = df.apply(crear_estado_kanban, axis=1)
+        df = aplicar_esquema(pd.DataFrame(data[1:], columns=headers), "ordenes_bordado")
+        por_promover = ordenes_por_promover(df)
+        if not por_promover.any():
+            return []
         
-        return df
+        # Fila en la hoja (fila 1 = encabezados)
+        filas = [posicion + 2 for posicion in df.index[por_promover]]
+        numeros = (
+            df.loc[por_promover, 'Número Orden'].astype(str).str.strip().tolist()
+            if 'Número Orden' in df.columns else [''] * len(filas)
+        )
+        promovidos = []
+        for inicio in range(0, len(filas), TAMANO_LOTE_ESCRITURA):
+            lote = filas[inicio:inicio + TAMANO_LOTE_ESCRITURA]
+            self.fuente.actualizar_celdas([(fila, col_produccion_index, 'En Espera') for fila in lote])
+            momento = datetime.now()
+            with self._lock_cambios:
+                for fila, numero in zip(lote, numeros[inicio:inicio + TAMANO_LOTE_ESCRITURA]):
+                    self.cambios.appendleft({
+                        'Momento': momento, 'Número Orden': numero, 'Fila': fila,
+                        'Antes': df.at[fila - 2, 'Estado Producción'], 'Después': 'En Espera',
+                    })
+                    promovidos.append(numero)
+        return promovidos
+
+    def registro_cambios(self):
+        """Copia del registro de cambios, más recientes primero"""
+        with self._lock_cambios:
+            return list(self.cambios)
+
+# Conciliador vivo por fuente, fuera de cache_resource: si la caché se vacía (o cambia el código)
+# la fábrica vuelve a correr y hay que detener el hilo anterior para no tener dos promoviendo
+_conciliadores = {}
+_lock_conciliadores = threading.Lock()
+
+@st.cache_resource(show_spinner=False)
+def obtener_conciliador(id_fuente, _fuente):
+    """Conciliador único por proceso para la fuente de órdenes (arranca su hilo al crearse)"""
+    with _lock_conciliadores:
+        anterior = _conciliadores.get(id_fuente)
+        if anterior is not None:
+            # El arrendamiento de promoción evita que ambos escriban si el anterior está a mitad de vuelta
+            anterior.detener()
+        _conciliadores[id_fuente] = ConciliadorOrdenes(_fuente).iniciar()
+        return _conciliadores[id_fuente]
+
+class OrdenesPreparadas(NamedTuple):
+    """Órdenes de una revisión de la hoja con sus índices por fecha compromiso (solo lectura)"""
+    df: pd.DataFrame
+    claves_fecha: np.ndarray   # Fecha Compromiso en ns por posición (SIN_FECHA si no tiene)
+    por_estado: dict           # estado Kanban → posiciones ordenadas por fecha compromiso (sin fecha al final)
+
+# Clave de orden de las órdenes sin fecha compromiso (van al final)
+SIN_FECHA = np.iinfo(np.int64).max
+
+def preparar_ordenes(df):
+    """Estado Kanban e índice por estado ordenado por Fecha Compromiso, una vez por revisión"""
+    # CREAR ESTADO KANBAN (las aprobadas aún sin promover ya se muestran "En Espera")
+    with span("crear_estado_kanban"):
+        df['Estado_Kanban'] = crear_estado_kanban(df)
+    
+    with span("indexar fechas compromiso"):
+        if 'Fecha Compromiso' in df.columns:
+            fechas = df['Fecha Compromiso']
+            claves = fechas.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+            claves[fechas.isna().to_numpy()] = SIN_FECHA
+        else:
+            claves = np.full(len(df), SIN_FECHA, dtype=np.int64)
+        orden = np.argsort(claves, kind='stable')
+        codigos = df['Estado_Kanban'].cat.codes.to_numpy()[orden]
+        por_estado = {estado: orden[codigos == i] for i, estado in enumerate(ESTADOS_KANBAN)}
+    
+    return OrdenesPreparadas(df, claves, por_estado)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def obtener_ordenes_preparadas(id_fuente, revision, _fuente):
+    """Descargar, convertir e indexar las órdenes; solo se ejecuta cuando cambia la revisión"""
+    with span("leer OrdenesBordado", "io"):
+        data = leer_valores_ordenes(id_fuente, revision, _fuente)
+    if len(data) < 2:
+        return None
+    
+    # Columnas según el esquema (alias, estados por defecto y Fecha Compromiso con el día primero)
+    df = aplicar_esquema(pd.DataFrame(data[1:], columns=data[0]), "ordenes_bordado")
+    return preparar_ordenes(df)
+
+def obtener_ordenes(fuente):
+    """Obtener órdenes (solo si cambió la revisión); solo lectura, la promoción la hace el conciliador"""
+    try:
+        # Una llamada de metadatos; la descarga completa solo ocurre con una revisión nueva
+        with span("revisión OrdenesBordado", "io"):
+            revision = fuente.obtener_revision()
+        return obtener_ordenes_preparadas(fuente.id, revision, fuente), revision
         
     except Exception as e:
-        st.error(f"❌ Error obteniendo/actualizando órdenes: {e}")
-        return pd.DataFrame()
+        st.error(f"❌ Error obteniendo órdenes: {e}")
+        return None, None
+
+# Orden del flujo en el Kanban (5 estados)
+ESTADOS_KANBAN = [
+    'Pendiente Aprobación',
+    'En Espera',
+    'En Proceso',
+    'Completado',
+    'Entregado'
+]
 
-def crear_estado_kanban(row):
-    """Crear estado del Kanban según la lógica especificada"""
-    aprobacion = str(row.get('Estado Aprobación', '')).strip()
-    produccion = str(row.get('Estado Producción', '')).strip()
+# Tabla de reglas: Estado Producción de una orden APROBADA → Estado Kanban.
+# Cualquier otro valor de producción en una orden aprobada cae en 'En Espera';
+# cualquier orden no aprobada queda en 'Pendiente Aprobación'.
+REGLAS_ESTADO_PRODUCCION = {
+    'En Espera': 'En Espera',
+    'En Proceso': 'En Proceso',
+    'Completado': 'Completado',
+    'Entregado': 'Entregado',
+}
+
+def crear_estado_kanban(df):
+    """Crear el estado del Kanban para todas las órdenes de una vez (columna categórica)"""
+    aprobacion = df['Estado Aprobación'].astype(str).str.strip()
+    produccion = df['Estado Producción'].astype(str).str.strip()
     
     # LÓGICA:
-    # 1. Si estado aprobación es "Pendiente" → Estado Kanban = "Pendiente Aprobación"
-    if aprobacion == 'Pendiente':
-        return 'Pendiente Aprobación'
-    
-    # 2. Si estado aprobación es "Aprobado" → proceder a ver estado producción
-    elif aprobacion == 'Aprobado':
-        # Ahora sí revisamos el estado de producción
-        if produccion == 'En Espera':
-            return 'En Espera'
-        elif produccion == 'En Proceso':
-            return 'En Proceso'
-        elif produccion == 'Completado':
-            return 'Completado'
-        elif produccion == 'Entregado':
-            return 'Entregado'
-        else:
-            # Si está aprobado pero no tiene estado de producción definido
-            return 'En Espera'
+    # 1. Si estado aprobación es "Aprobado" → el estado producción decide (por defecto "En Espera")
+    # 2. Cualquier otro valor ("Pendiente", vacío, etc.) → "Pendiente Aprobación"
+    estado = produccion.map(REGLAS_ESTADO_PRODUCCION).fillna('En Espera')
+    estado = estado.where(aprobacion == 'Aprobado', 'Pendiente Aprobación')
+    
+    return pd.Categorical(estado, categories=ESTADOS_KANBAN)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def obtener_opciones_filtros(version, _df_ordenes):
+    """Listas de vendedores y clientes, calculadas una vez por versión de datos"""
+    return {
+        'vendedores': ["Todos"] + sorted(_df_ordenes['Vendedor'].dropna().unique()),
+        'clientes': ["Todos"] + sorted(_df_ordenes['Cliente'].dropna().unique()),
+    }
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def preparar_tablero(version, estado_filtro, vendedor_filtro, cliente_filtro, _ordenes):
+    """Filtrar una vez y tomar cada estado de su índice ya ordenado por fecha compromiso,
+    por versión de datos y filtros"""
+    df = _ordenes.df
+    mask = np.ones(len(df), dtype=bool)
+    if vendedor_filtro != "Todos":
+        mask &= (df['Vendedor'] == vendedor_filtro).to_numpy()
+    if cliente_filtro != "Todos":
+        mask &= (df['Cliente'] == cliente_filtro).to_numpy()
+    
+    # Grupos por estado en el orden de entrega (los estados fuera del filtro quedan vacíos)
+    grupos = {}
+    for estado in ESTADOS_KANBAN:
+        posiciones = _ordenes.por_estado[estado]
+        if estado_filtro != "Todos" and estado != estado_filtro:
+            posiciones = posiciones[:0]
+        grupos[estado] = df.iloc[posiciones[mask[posiciones]]]
+    
+    conteos = {estado: len(grupo) for estado, grupo in grupos.items()}
+    return {
+        'total': sum(conteos.values()),
+        'conteos': conteos,
+        'grupos': grupos,
+    }
+
+# Estados con trabajo pendiente (entran en la vista de próximas entregas)
+ESTADOS_ACTIVOS = ['Pendiente Aprobación', 'En Espera', 'En Proceso']
+# Días hacia adelante que cuentan como "vence pronto"
+DIAS_POR_VENCER = 7
+
+def proximas_entregas(ordenes, n, estados=ESTADOS_ACTIVOS):
+    """Las `n` órdenes activas con fecha compromiso más cercana (las vencidas primero).
+
+    Cada estado ya está ordenado por fecha: heapq.merge los mezcla y solo se recorren
+    las primeras `n`, sin ordenar todas las órdenes en cada vista.
+    """
+    claves = ordenes.claves_fecha
+    flujos = [((claves[p], p) for p in ordenes.por_estado[estado]) for estado in estados]
+    primeras = itertools.islice(
+        itertools.takewhile(lambda par: par[0] != SIN_FECHA, heapq.merge(*flujos)), n
+    )
+    return ordenes.df.iloc[[posicion for _, posicion in primeras]]
+
+def contar_por_fecha(ordenes, limite, estados=ESTADOS_ACTIVOS):
+    """Órdenes activas con fecha compromiso anterior a `limite` (búsqueda binaria por estado)"""
+    limite = pd.Timestamp(limite).as_unit('ns').value
+    return int(sum(
+        np.searchsorted(ordenes.claves_fecha[ordenes.por_estado[estado]], limite) for estado in estados
+    ))
+
+def formatear_fecha(fecha, vacio='No especificada'):
+    return fecha.strftime('%d/%m/%Y') if pd.notna(fecha) else vacio
+
+@trazar("mostrar_proximas_entregas", "render")
+def mostrar_proximas_entregas(ordenes):
+    """Vencidas y próximas entregas de todas las órdenes activas (sin importar los filtros)"""
+    st.subheader("🚨 Entregas Vencidas y Próximas")
     
-    # 3. Si hay otros valores
-    else:
-        return 'Pendiente Aprobación'
+    hoy = pd.Timestamp.now().normalize()
+    vencidas = contar_por_fecha(ordenes, hoy)
+    por_vencer = contar_por_fecha(ordenes, hoy + pd.Timedelta(days=DIAS_POR_VENCER + 1)) - vencidas
+    
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        st.metric("Vencidas", vencidas)
+    with col2:
+        st.metric(f"Vencen en {DIAS_POR_VENCER} días", por_vencer)
+    with col3:
+        n = st.selectbox("Mostrar las próximas:", [10, 20, 50], key="proximas_entregas_n")
+    
+    proximas = proximas_entregas(ordenes, n)
+    if proximas.empty:
+        st.info("No hay órdenes activas con fecha compromiso.")
+        return
+    
+    dias = (proximas['Fecha Compromiso'] - hoy).dt.days
+    columnas = [c for c in ['Número Orden', 'Cliente', 'Vendedor', 'Estado_Kanban'] if c in proximas.columns]
+    vista = proximas[columnas].assign(**{
+        'Fecha Compromiso': proximas['Fecha Compromiso'].map(formatear_fecha),
+        'Situación': [
+            f"🔴 Vencida hace {-d} día(s)" if d < 0 else ("🟠 Vence hoy" if d == 0 else f"🟢 Faltan {d} día(s)")
+            for d in dias
+        ],
+    })
+    st.dataframe(vista, use_container_width=True, hide_index=True)
 
 def get_color_estado_kanban(estado):
     """Devuelve colores para cada estado del KANBAN"""
@@ -174,7 +481,7 @@ def crear_tarjeta_streamlit(orden):
             st.caption(f"👤 **Vendedor:** {orden.get('Vendedor', 'No especificado')}")
             st.caption(f"🎨 **Diseño:** {orden.get('Nombre del Diseño', 'Sin nombre')}")
         with col_info2:
-            st.caption(f"📅 **Entrega:** {orden.get('Fecha Compromiso', 'No especificada')}")
+            st.caption(f"📅 **Entrega:** {formatear_fecha(orden.get('Fecha Compromiso'))}")
         
         # Prendas y cantidad
         prendas_info = f"{orden.get('Cantidad Total', '0')} unidades - {orden.get('Prendas', 'No especificadas')}"
@@ -187,47 +494,48 @@ def crear_tarjeta_streamlit(orden):
         
         st.markdown("---")
 
-def mostrar_kanban_visual(df_filtrado):
-    """Muestra el tablero Kanban"""
-    st.subheader("🎯 Tablero Kanban de Producción")
-    
-    # Mostrar actualizaciones recientes si las hay
-    if 'ultimas_actualizaciones' in st.session_state and st.session_state['ultimas_actualizaciones']:
-        actualizaciones = st.session_state['ultimas_actualizaciones']
-        if len(actualizaciones) > 0:
-            st.success(f"✅ Se actualizaron {len(actualizaciones)} órdenes a 'En Espera': {', '.join(actualizaciones[:3])}{'...' if len(actualizaciones) > 3 else ''}")
-            # Limpiar después de mostrar
-            st.session_state['ultimas_actualizaciones'] = []
+def mostrar_promocion_automatica(conciliador):
+    """Aviso de la última promoción y registro de cambios del conciliador (solo lectura)"""
+    # Cada sesión ve el aviso de una ejecución una sola vez
+    actualizaciones = conciliador.ultimos_promovidos
+    if actualizaciones and st.session_state.get('conciliacion_vista') != conciliador.ejecuciones:
+        st.session_state['conciliacion_vista'] = conciliador.ejecuciones
+        st.success(f"✅ Se actualizaron {len(actualizaciones)} órdenes a 'En Espera': {', '.join(actualizaciones[:3])}{'...' if len(actualizaciones) > 3 else ''}")
     
     # Información sobre el flujo automático
     with st.expander("ℹ️ Flujo Automático", expanded=False):
-        st.info("""
+        st.info(f"""
         **Actualización automática:**
         
         Cuando una orden tiene **Estado Aprobación = "Aprobado"** y 
         **Estado Producción** no es uno de los estados avanzados 
         (En Proceso, Completado, Entregado), se actualiza automáticamente a **"En Espera"**.
         
-        Esto sucede cada vez que cargas o actualizas el tablero.
+        Un proceso en segundo plano lo revisa cada {conciliador.intervalo} segundos
+        (y al presionar "Actualizar Datos"); mientras tanto el tablero ya la muestra en "En Espera".
         """)
-    
-    # Definir el orden del flujo en el Kanban (5 estados)
-    estados_kanban = [
-        'Pendiente Aprobación',
-        'En Espera',
-        'En Proceso',
-        'Completado',
-        'Entregado'
-    ]
+        if conciliador.ultima_ejecucion is not None:
+            st.caption(f"Última revisión: {conciliador.ultima_ejecucion.strftime('%d/%m/%Y %H:%M:%S')}")
+        if conciliador.ultimo_error:
+            st.warning(f"⚠️ Última revisión con error: {conciliador.ultimo_error}")
+        cambios = conciliador.registro_cambios()
+        if cambios:
+            st.write("**📝 Cambios recientes:**")
+            st.dataframe(pd.DataFrame(cambios), use_container_width=True, hide_index=True)
+
+@trazar("mostrar_kanban_visual", "render")
+def mostrar_kanban_visual(tablero):
+    """Muestra el tablero Kanban a partir de los conteos y grupos ya preparados"""
+    st.subheader("🎯 Tablero Kanban de Producción")
     
     # Estadísticas rápidas - 5 columnas
     st.write("### 📊 Resumen por Estado")
     col1, col2, col3, col4, col5 = st.columns(5)
     
     stats_cols = [col1, col2, col3, col4, col5]
-    for i, estado in enumerate(estados_kanban):
+    for i, estado in enumerate(ESTADOS_KANBAN):
         with stats_cols[i]:
-            count = len(df_filtrado[df_filtrado['Estado_Kanban'] == estado])
+            count = tablero['conteos'][estado]
             color_estado = get_color_estado_kanban(estado)
             st.markdown(f"""
             <div style="text-align: center; padding: 10px; background-color: white; 
@@ -243,34 +551,29 @@ def mostrar_kanban_visual(df_filtrado):
     # Crear 5 columnas del Kanban
     columns = st.columns(5)
     
-    for i, estado in enumerate(estados_kanban):
+    for i, estado in enumerate(ESTADOS_KANBAN):
         with columns[i]:
             color_estado = get_color_estado_kanban(estado)
             
             # Header de la columna
             st.markdown(
                 f"<div style='background-color: {color_estado['color']}; color: white; padding: 12px; border-radius: 8px; text-align: center; margin-bottom: 15px; font-weight: bold; font-size: 16px;'>"
-                f"{color_estado['icon']} {estado} ({len(df_filtrado[df_filtrado['Estado_Kanban'] == estado])})"
+                f"{color_estado['icon']} {estado} ({tablero['conteos'][estado]})"
                 f"</div>", 
                 unsafe_allow_html=True
             )
             
             # Órdenes en este estado
-            ordenes_estado = df_filtrado[df_filtrado['Estado_Kanban'] == estado]
+            ordenes_estado = tablero['grupos'][estado]
             
             if ordenes_estado.empty:
                 st.info("No hay órdenes")
             else:
-                # Ordenar por fecha de compromiso
-                if 'Fecha Compromiso' in ordenes_estado.columns:
-                    try:
-                        ordenes_estado = ordenes_estado.sort_values('Fecha Compromiso', na_position='last')
-                    except:
-                        pass
-                
+                # Ya vienen ordenadas por fecha compromiso (índice por estado)
                 for _, orden in ordenes_estado.iterrows():
                     crear_tarjeta_streamlit(orden)
 
+@trazar("mostrar_dashboard_ordenes", "render")
 def mostrar_dashboard_ordenes():
     """Dashboard principal de gestión de órdenes SOLO CON KANBAN"""
     
@@ -284,18 +587,21 @@ def mostrar_dashboard_ordenes():
             st.error("❌ Sheet ID no configurado")
     
     # Conectar a Google Sheets
-    sheet = conectar_google_sheets()
-    if sheet is None:
+    fuente = conectar_google_sheets()
+    if fuente is None:
         st.error("❌ No se pudo conectar a Google Sheets")
         return
     
-    # Cargar órdenes CON ACTUALIZACIÓN AUTOMÁTICA
-    with st.spinner("🔄 Cargando y verificando órdenes..."):
-        df_ordenes = obtener_ordenes_con_actualizacion(sheet)
+    # La promoción Aprobado → En Espera la hace el conciliador en segundo plano; aquí solo se lee
+    conciliador = obtener_conciliador(fuente.id, fuente)
     
-    if df_ordenes.empty:
+    with st.spinner("🔄 Cargando órdenes..."):
+        ordenes, revision = obtener_ordenes(fuente)
+    
+    if ordenes is None or ordenes.df.empty:
         st.info("📭 No hay órdenes registradas aún.")
         return
+    df_ordenes = ordenes.df
     
     # Mostrar información de las columnas para debug (opcional)
     with st.expander("🔍 Ver estructura de datos", expanded=False):
@@ -308,45 +614,46 @@ def mostrar_dashboard_ordenes():
         aprobados = df_ordenes[df_ordenes['Estado Aprobación'] == 'Aprobado']
         st.write(f"**Órdenes aprobadas:** {len(aprobados)}")
     
+    # Versión de los datos: la revisión de la hoja; las vistas derivadas se reutilizan mientras no cambie
+    version_datos = f"{fuente.id}:{revision}"
+    opciones = obtener_opciones_filtros(version_datos, df_ordenes)
+
+    with st.expander("📥 Exportar órdenes", expanded=False):
+        boton_exportar(df_ordenes, "ordenes_bordado", version=version_datos)
+    
     # Filtros globales
     st.subheader("🎛️ Filtros")
     col1, col2, col3 = st.columns(3)
     
     with col1:
         # Filtro por estado del Kanban
-        estados_kanban = ["Todos"] + ['Pendiente Aprobación', 'En Espera', 'En Proceso', 'Completado', 'Entregado']
+        estados_kanban = ["Todos"] + ESTADOS_KANBAN
         estado_filtro = st.selectbox("Por Estado:", estados_kanban, key="filtro_estado_kanban")
     
     with col2:
-        vendedores = ["Todos"] + sorted(df_ordenes['Vendedor'].dropna().unique())
-        vendedor_filtro = st.selectbox("Por Vendedor:", vendedores, key="filtro_vendedor")
+        vendedor_filtro = st.selectbox("Por Vendedor:", opciones['vendedores'], key="filtro_vendedor")
     
     with col3:
-        clientes = ["Todos"] + sorted(df_ordenes['Cliente'].dropna().unique())
-        cliente_filtro = st.selectbox("Por Cliente:", clientes, key="filtro_cliente")
+        cliente_filtro = st.selectbox("Por Cliente:", opciones['clientes'], key="filtro_cliente")
     
-    # Aplicar filtros
-    df_filtrado = df_ordenes.copy()
-    if estado_filtro != "Todos":
-        df_filtrado = df_filtrado[df_filtrado['Estado_Kanban'] == estado_filtro]
-    if vendedor_filtro != "Todos":
-        df_filtrado = df_filtrado[df_filtrado['Vendedor'] == vendedor_filtro]
-    if cliente_filtro != "Todos":
-        df_filtrado = df_filtrado[df_filtrado['Cliente'] == cliente_filtro]
+    # Aplicar filtros y agrupar por estado (reutilizado mientras no cambien datos ni filtros)
+    with span("preparar_tablero"):
+        tablero = preparar_tablero(version_datos, estado_filtro, vendedor_filtro, cliente_filtro, ordenes)
     
     # Mostrar Kanban
-    mostrar_kanban_visual(df_filtrado)
+    mostrar_promocion_automatica(conciliador)
+    mostrar_proximas_entregas(ordenes)
+    mostrar_kanban_visual(tablero)
     
     # Botones de acción
     st.markdown("---")
     col_btn1, col_btn2 = st.columns([3, 1])
     
     with col_btn1:
-        st.info(f"📊 Mostrando {len(df_filtrado)} de {len(df_ordenes)} órdenes")
+        st.info(f"📊 Mostrando {tablero['total']} de {len(df_ordenes)} órdenes")
     
     with col_btn2:
         if st.button("🔄 Actualizar Datos", use_container_width=True):
-            # Limpiar cache y recargar
-            if 'ultimas_actualizaciones' in st.session_state:
-                del st.session_state['ultimas_actualizaciones']
+            # Pedir una revisión al conciliador y recargar
+            conciliador.solicitar()
             st.rerun()
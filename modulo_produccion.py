@@ -1,50 +1,34 @@
-import gspread
+from servicios_google import autorizar_gspread, leer_hoja, leer_hoja_incremental
+from coordinacion import ejecutar_una_vez
+from esquemas import ErrorEsquema, aplicar_esquema
+from exportaciones import boton_exportar, version_dataframe
+from tabla_paginada import mostrar_tabla_paginada
+from series_tiempo import agrupar_por_periodo, reducir_puntos, selector_frecuencia
+import hashlib
+import json
 import pandas as pd
-import matplotlib.pyplot as plt
 import plotly.express as px
 import numpy as np
 import streamlit as st
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
 from datetime import timedelta
+from typing import NamedTuple
+from trazas import span, trazar
+
+# Segundos que los datos cargados se comparten entre sesiones antes de volver a leer Sheets
+TTL_DATOS_PRODUCCION = 300
 
 # ✅ FUNCIONES DE LIMPIEZA Y CÁLCULO (Backend)
+@trazar("limpiar_dataframe")
 def limpiar_dataframe(df_raw):
-    """Limpiar y procesar el dataframe"""
-    df = df_raw.copy()
-    
-    # Eliminar columna de correo electrónico que no interesa
-    if "Dirección de correo electrónico" in df.columns:
-        df = df.drop("Dirección de correo electrónico", axis=1)
-    
-    # Limpiar espacios en nombres de columnas y valores
-    df.columns = df.columns.str.strip()
-    for col in df.columns:
-        if df[col].dtype == 'object':
-            df[col] = df[col].str.strip()
-    
-    # Convertir Marca temporal a datetime
-    if "Marca temporal" in df.columns:
-        df["Marca temporal"] = pd.to_datetime(df["Marca temporal"], format='%d/%m/%Y %H:%M:%S', errors='coerce')
-    
-    # Convertir CANTIDAD a numérico
-    if "CANTIDAD" in df.columns:
-        df["CANTIDAD"] = pd.to_numeric(df["CANTIDAD"], errors='coerce')
-    
-    # Convertir PUNTADAS a numérico
-    if "PUNTADAS" in df.columns:
-        df["PUNTADAS"] = pd.to_numeric(df["PUNTADAS"], errors='coerce')
-        df["PUNTADAS"] = df["PUNTADAS"].fillna(0)
-    
-    # Convertir MULTIPLOS a numérico (si existe)
-    if "MULTIPLOS" in df.columns:
-        df["MULTIPLOS"] = pd.to_numeric(df["MULTIPLOS"], errors='coerce')
-    
-    return df
+    """Limpiar y procesar el dataframe (columnas y tipos según el esquema de reporte_de_trabajo)"""
+    return aplicar_esquema(df_raw, "reporte_de_trabajo")
 
+@trazar("aplicar_filtros", "render")
 def aplicar_filtros(df):
     """Aplicar filtros interactivos"""
-    df_filtrado = df.copy()
+    df_filtrado = df
     
     st.sidebar.header("🔍 Filtros")
     
@@ -85,6 +69,7 @@ def aplicar_filtros(df):
     st.sidebar.info(f"📊 Registros filtrados: {len(df_filtrado)}")
     return df_filtrado
 
+@trazar("calcular_puntadas_automaticamente")
 def calcular_puntadas_automaticamente(df):
     """Calcular automáticamente las puntadas cuando se cargan los datos"""
     
@@ -103,8 +88,7 @@ def calcular_puntadas_automaticamente(df):
     
     resultados = []
     
-    df_con_fecha = df.copy()
-    df_con_fecha['Fecha'] = df_con_fecha['Marca temporal'].dt.date
+    df_con_fecha = df.assign(Fecha=df['Marca temporal'].dt.date)
     
     # Agrupar por operador y fecha
     grupos = df_con_fecha.groupby(['OPERADOR', 'Fecha'])
@@ -119,20 +103,11 @@ def calcular_puntadas_automaticamente(df):
             piezas = fila["CANTIDAD"]
             puntadas_base = fila["PUNTADAS"]
             
-            # Tomar cabezas de la columna del sheets si existe
-            cabezas = None
-            posibles_nombres_columnas = ["CABEZAS", "NO_DE_CABEZAS", "NUMERO_CABEZAS", "NO CABEZAS"]
-            
-            for nombre_columna in posibles_nombres_columnas:
-                if nombre_columna in fila and not pd.isna(fila[nombre_columna]):
-                    try:
-                        cabezas = float(fila[nombre_columna])
-                        break
-                    except (ValueError, TypeError):
-                        continue
+            # Tomar cabezas de la columna del sheets (el esquema ya resolvió sus alias)
+            cabezas = fila.get("CABEZAS")
             
-            # Si no se encontró en columnas, usar configuración manual como respaldo
-            if cabezas is None:
+            # Si no viene en la hoja, usar configuración manual como respaldo
+            if pd.isna(cabezas):
                 cabezas = CONFIG_MAQUINAS.get(operador, CABEZAS_POR_DEFECTO)
             
             # Calcular múltiplos
@@ -169,263 +144,369 @@ def calcular_puntadas_automaticamente(df):
     
     return pd.DataFrame(resultados)
 
-# ✅ FUNCIONES DE GUARDADO EN SHEETS
-def guardar_calculos_en_sheets(df_calculado):
-    """Guardar los cálculos en una nueva hoja de Google Sheets"""
+# ✅ CONEXIÓN CON GOOGLE SHEETS
+SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+# Clave de coordinación: un solo escritor por versión de datos (dashboard o procesar_produccion.py)
+CLAVE_MATERIALIZACION = "materializar_produccion"
+
+def conectar_produccion(secretos=None):
+    """Autorizar con la cuenta de servicio; devuelve (gc, sheet_id). Sin `secretos` usa st.secrets"""
+    secretos = st.secrets if secretos is None else secretos
+    
+    service_account_info = {
+        "type": secretos["gservice_account"]["type"],
+        "project_id": secretos["gservice_account"]["project_id"],
+        "private_key_id": secretos["gservice_account"]["private_key_id"],
+        "private_key": secretos["gservice_account"]["private_key"],
+        "client_email": secretos["gservice_account"]["client_email"],
+        "client_id": secretos["gservice_account"]["client_id"],
+        "auth_uri": secretos["gservice_account"]["auth_uri"],
+        "token_uri": secretos["gservice_account"]["token_uri"]
+    }
+    
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, SCOPE)
+    return autorizar_gspread(creds), secretos["gsheets"]["produccion_sheet_id"]
+
+def modo_solo_lectura():
+    """El dashboard no escribe en Sheets cuando los cálculos los materializa procesar_produccion.py"""
     try:
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        
-        service_account_info = {
-            "type": st.secrets["gservice_account"]["type"],
-            "project_id": st.secrets["gservice_account"]["project_id"],
-            "private_key_id": st.secrets["gservice_account"]["private_key_id"],
-            "private_key": st.secrets["gservice_account"]["private_key"],
-            "client_email": st.secrets["gservice_account"]["client_email"],
-            "client_id": st.secrets["gservice_account"]["client_id"],
-            "auth_uri": st.secrets["gservice_account"]["auth_uri"],
-            "token_uri": st.secrets["gservice_account"]["token_uri"]
-        }
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, scope)
-        gc = gspread.authorize(creds)
-        
-        sheet_id = st.secrets["gsheets"]["produccion_sheet_id"]
-        spreadsheet = gc.open_by_key(sheet_id)
-        
-        # Intentar acceder a la hoja de cálculos, o crearla si no existe
-        try:
-            worksheet = spreadsheet.worksheet("puntadas_calculadas")
-        except:
-            worksheet = spreadsheet.add_worksheet(title="puntadas_calculadas", rows="1000", cols="20")
-        
-        # Limpiar la hoja existente
-        worksheet.clear()
-        
-        # CONVERTIR FECHAS A STRING ANTES DE GUARDAR
-        df_para_guardar = df_calculado.copy()
-        
-        # Convertir columnas de fecha a string
-        date_columns = ['FECHA', 'FECHA_CALCULO']
-        for col in date_columns:
-            if col in df_para_guardar.columns:
-                df_para_guardar[col] = df_para_guardar[col].astype(str)
-        
-        # Convertir DataFrame a lista de listas
-        datos_para_guardar = [df_para_guardar.columns.tolist()] + df_para_guardar.values.tolist()
-        
-        # Escribir todos los datos
-        worksheet.update('A1', datos_para_guardar)
-        
-        return True
-    except Exception as e:
-        st.error(f"❌ Error al guardar cálculos: {str(e)}")
+        return bool(st.secrets["produccion"]["modo_solo_lectura"])
+    except Exception:
         return False
 
-def crear_hoja_resumen_ejecutivo():
-    """Crear la hoja de resumen ejecutivo si no existe"""
+# ✅ FUNCIONES DE GUARDADO EN SHEETS (lanzan la excepción si algo falla)
+@trazar("escribir puntadas_calculadas", "io")
+def guardar_calculos_en_sheets(df_calculado, spreadsheet):
+    """Guardar los cálculos en una nueva hoja de Google Sheets"""
+    # Intentar acceder a la hoja de cálculos, o crearla si no existe
     try:
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        
-        service_account_info = {
-            "type": st.secrets["gservice_account"]["type"],
-            "project_id": st.secrets["gservice_account"]["project_id"],
-            "private_key_id": st.secrets["gservice_account"]["private_key_id"],
-            "private_key": st.secrets["gservice_account"]["private_key"],
-            "client_email": st.secrets["gservice_account"]["client_email"],
-            "client_id": st.secrets["gservice_account"]["client_id"],
-            "auth_uri": st.secrets["gservice_account"]["auth_uri"],
-            "token_uri": st.secrets["gservice_account"]["token_uri"]
-        }
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, scope)
-        gc = gspread.authorize(creds)
-        
-        sheet_id = st.secrets["gsheets"]["produccion_sheet_id"]
-        spreadsheet = gc.open_by_key(sheet_id)
-        
-        # Intentar acceder a la hoja de resumen ejecutivo, o crearla si no existe
-        try:
-            worksheet = spreadsheet.worksheet("resumen_ejecutivo")
-        except:
-            worksheet = spreadsheet.add_worksheet(title="resumen_ejecutivo", rows="1000", cols="10")
-            
-            # Crear encabezados
-            encabezados = [
-                "FECHA", 
-                "OPERADOR", 
-                "TOTAL_PUNTADAS", 
-                "COMISION", 
-                "BONIFICACION", 
-                "COMISION_TOTAL",
-                "FECHA_ACTUALIZACION",
-                "ACTUALIZADO_POR"
-            ]
-            worksheet.update('A1', [encabezados])
-        
-        return True
-    except Exception as e:
-        st.error(f"❌ Error al crear hoja de resumen ejecutivo: {str(e)}")
-        return False
+        worksheet = spreadsheet.worksheet("puntadas_calculadas")
+    except Exception:
+        worksheet = spreadsheet.add_worksheet(title="puntadas_calculadas", rows="1000", cols="20")
+    
+    # Limpiar la hoja existente
+    worksheet.clear()
+    
+    # CONVERTIR FECHAS A STRING ANTES DE GUARDAR
+    date_columns = ['FECHA', 'FECHA_CALCULO']
+    df_para_guardar = df_calculado.astype({col: str for col in date_columns if col in df_calculado.columns})
+    
+    # Convertir DataFrame a lista de listas
+    datos_para_guardar = [df_para_guardar.columns.tolist()] + df_para_guardar.values.tolist()
+    
+    # Escribir todos los datos
+    worksheet.update('A1', datos_para_guardar)
 
-def guardar_resumen_ejecutivo(df_calculado):
-    """Guardar resumen ejecutivo automáticamente en Google Sheets"""
+def crear_hoja_resumen_ejecutivo(spreadsheet):
+    """Devolver la hoja de resumen ejecutivo, creándola si no existe"""
     try:
-        if df_calculado.empty:
-            return False
-            
-        # Crear hoja si no existe
-        crear_hoja_resumen_ejecutivo()
-        
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        
-        service_account_info = {
-            "type": st.secrets["gservice_account"]["type"],
-            "project_id": st.secrets["gservice_account"]["project_id"],
-            "private_key_id": st.secrets["gservice_account"]["private_key_id"],
-            "private_key": st.secrets["gservice_account"]["private_key"],
-            "client_email": st.secrets["gservice_account"]["client_email"],
-            "client_id": st.secrets["gservice_account"]["client_id"],
-            "auth_uri": st.secrets["gservice_account"]["auth_uri"],
-            "token_uri": st.secrets["gservice_account"]["token_uri"]
+        return spreadsheet.worksheet("resumen_ejecutivo")
+    except Exception:
+        worksheet = spreadsheet.add_worksheet(title="resumen_ejecutivo", rows="1000", cols="10")
+        
+        # Crear encabezados
+        encabezados = [
+            "FECHA", 
+            "OPERADOR", 
+            "TOTAL_PUNTADAS", 
+            "COMISION", 
+            "BONIFICACION", 
+            "COMISION_TOTAL",
+            "FECHA_ACTUALIZACION",
+            "ACTUALIZADO_POR"
+        ]
+        worksheet.update('A1', [encabezados])
+        return worksheet
+
+@trazar("escribir resumen_ejecutivo", "io")
+def guardar_resumen_ejecutivo(df_calculado, spreadsheet):
+    """Guardar resumen ejecutivo en Google Sheets"""
+    if df_calculado.empty:
+        return
+    
+    worksheet = crear_hoja_resumen_ejecutivo(spreadsheet)
+    
+    # Obtener datos existentes (si la lectura falla no se escribe: se duplicarían filas)
+    datos_existentes = worksheet.get_all_values()
+    if len(datos_existentes) > 1:
+        df_existente = pd.DataFrame(datos_existentes[1:], columns=datos_existentes[0])
+    else:
+        df_existente = pd.DataFrame()
+    
+    # Calcular resumen por operador y fecha
+    resumen = df_calculado.groupby(['OPERADOR', 'FECHA']).agg({
+        'TOTAL_PUNTADAS': 'sum'
+    }).reset_index()
+    
+    # Upsert por clave (OPERADOR, FECHA): los existentes solo actualizan TOTAL_PUNTADAS,
+    # así que repetir la escritura con los mismos datos no cambia nada
+    filas_existentes = {}
+    columna_total = None
+    if not df_existente.empty and {'OPERADOR', 'FECHA', 'TOTAL_PUNTADAS'} <= set(df_existente.columns):
+        columna_total = chr(ord('A') + list(df_existente.columns).index('TOTAL_PUNTADAS'))
+        # Mismas conversiones que al leer: ISO tal cual y cualquier otro formato con el día primero
+        # (si la hoja no trae las columnas del esquema, ErrorEsquema evita escribir duplicados)
+        existente = aplicar_esquema(df_existente, "resumen_ejecutivo")
+        for posicion, (operador, fecha, total) in enumerate(
+            zip(existente['OPERADOR'], existente['FECHA'].dt.date, existente['TOTAL_PUNTADAS'])
+        ):
+            # +2: encabezados en la fila 1 y filas de Sheets desde 1
+            filas_existentes.setdefault((operador, fecha), []).append((posicion + 2, total))
+    
+    nuevos_registros = []
+    actualizaciones = []
+    for operador, fecha, total_puntadas in resumen[['OPERADOR', 'FECHA', 'TOTAL_PUNTADAS']].itertuples(index=False):
+        existentes = filas_existentes.get((operador, fecha))
+        if existentes is None:
+            nuevos_registros.append([
+                str(fecha),
+                operador,
+                total_puntadas,
+                "",  # COMISION (vacío para que lo llene el encargado)
+                "",  # BONIFICACION (vacío)
+                "",  # COMISION_TOTAL (vacío)
+                "",  # FECHA_ACTUALIZACION (vacío)
+                ""   # ACTUALIZADO_POR (vacío)
+            ])
+        else:
+            for fila, total_existente in existentes:
+                if total_existente != total_puntadas:
+                    actualizaciones.append({'range': f'{columna_total}{fila}', 'values': [[total_puntadas]]})
+    
+    # Una sola escritura por tipo de cambio; RAW para que la FECHA quede como el texto ISO
+    # con el que se compara (USER_ENTERED la convertiría al formato de fecha de la hoja)
+    if actualizaciones:
+        worksheet.batch_update(actualizaciones, value_input_option='RAW')
+    if nuevos_registros:
+        worksheet.append_rows(nuevos_registros, value_input_option='RAW')
+
+def materializar_calculos(df_calculado, gc, sheet_id):
+    """Escribir puntadas_calculadas y resumen_ejecutivo"""
+    spreadsheet = gc.open_by_key(sheet_id)
+    guardar_calculos_en_sheets(df_calculado, spreadsheet)
+    guardar_resumen_ejecutivo(df_calculado, spreadsheet)
+
+# ✅ CARGA Y CÁLCULO (compartido por el dashboard y procesar_produccion.py)
+def cargar_y_calcular_produccion(gc, sheet_id):
+    """Leer reporte_de_trabajo, limpiar y calcular; devuelve (df, df_calculado, versión de los datos)"""
+    # Destino de Google Forms: solo se descargan las filas nuevas (y la hoja completa de vez en cuando)
+    with span("leer reporte_de_trabajo", "io") as registro_span:
+        lectura = leer_hoja_incremental(gc, sheet_id, "reporte_de_trabajo")
+        registro_span.update(filas_nuevas=lectura.nuevas, lectura_completa=lectura.completa)
+    data = lectura.datos
+    df_raw = pd.DataFrame(data[1:], columns=data[0])
+    version_datos = hashlib.sha1(json.dumps(data, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+    
+    # LIMPIAR DATOS
+    df = limpiar_dataframe(df_raw)
+    
+    # CALCULAR PUNTADAS AUTOMÁTICAMENTE
+    df_calculado = calcular_puntadas_automaticamente(df)
+    
+    return df, df_calculado, version_datos
+
+def deduplicar_resumen(df_resumen):
+    """Una fila por (OPERADOR, FECHA), prefiriendo la que ya tiene comisión capturada"""
+    if df_resumen.empty or not {'OPERADOR', 'FECHA'} <= set(df_resumen.columns):
+        return df_resumen
+    con_comision = df_resumen['COMISION_TOTAL'].notna() if 'COMISION_TOTAL' in df_resumen.columns else False
+    return (
+        df_resumen.assign(_con_comision=con_comision)
+        .sort_values('_con_comision', ascending=False, kind='stable')
+        .drop_duplicates(subset=['OPERADOR', 'FECHA'], keep='first')
+        .sort_index()
+        .drop(columns='_con_comision')
+    )
+
+def leer_resumen_ejecutivo(gc, sheet_id):
+    """Leer resumen_ejecutivo con tipos numéricos y una fila por (OPERADOR, FECHA)"""
+    with span("leer resumen_ejecutivo", "io"):
+        datos_resumen = leer_hoja(gc, sheet_id, "resumen_ejecutivo")
+    
+    if len(datos_resumen) <= 1:
+        return pd.DataFrame()
+    
+    df_resumen = aplicar_esquema(pd.DataFrame(datos_resumen[1:], columns=datos_resumen[0]), "resumen_ejecutivo")
+    
+    return deduplicar_resumen(df_resumen)
+
+def periodo_quincenal(fechas):
+    """Fecha de corte de la quincena FIJA (días 10 y 25) de cada fecha, vectorizado:
+    días 1-10 → día 10 del mes, 11-25 → día 25, 26 en adelante → día 10 del mes siguiente"""
+    fechas = pd.to_datetime(fechas, errors='coerce')
+    dia = fechas.dt.day
+    mes = fechas.dt.to_period('M')
+    inicio_mes = mes.dt.to_timestamp()
+    inicio_mes_siguiente = (mes + 1).dt.to_timestamp()
+    corte = inicio_mes + pd.Timedelta(days=24)
+    corte = corte.where(dia > 10, inicio_mes + pd.Timedelta(days=9))
+    corte = corte.where(dia <= 25, inicio_mes_siguiente + pd.Timedelta(days=9))
+    return corte
+
+def construir_tabla_comisiones(df_calculado, df_resumen):
+    """Tabla (OPERADOR, PERIODO_DT) con puntadas calculadas y comisiones de todos los operadores.
+
+    Un groupby por fuente y un merge; EN_CALCULOS / EN_RESUMEN indican de qué lado hay datos.
+    """
+    columnas_comision = ['COMISION', 'BONIFICACION', 'COMISION_TOTAL']
+    
+    if df_calculado is not None and not df_calculado.empty:
+        puntadas = (
+            df_calculado.assign(PERIODO_DT=periodo_quincenal(df_calculado['FECHA']))
+            .groupby(['OPERADOR', 'PERIODO_DT'])['TOTAL_PUNTADAS'].sum()
+            .rename('PUNTADAS_CALCULADAS')
+            .reset_index()
+        )
+    else:
+        puntadas = pd.DataFrame({
+            'OPERADOR': pd.Series(dtype=object),
+            'PERIODO_DT': pd.Series(dtype='datetime64[ns]'),
+            'PUNTADAS_CALCULADAS': pd.Series(dtype=float),
+        })
+    
+    if df_resumen is not None and not df_resumen.empty:
+        comisiones = (
+            df_resumen.dropna(subset=['FECHA'])
+            .assign(PERIODO_DT=lambda d: periodo_quincenal(d['FECHA']))
+            .groupby(['OPERADOR', 'PERIODO_DT'])[columnas_comision].sum()
+            .reset_index()
+        )
+    else:
+        comisiones = pd.DataFrame({
+            'OPERADOR': pd.Series(dtype=object),
+            'PERIODO_DT': pd.Series(dtype='datetime64[ns]'),
+            **{columna: pd.Series(dtype=float) for columna in columnas_comision},
+        })
+    
+    tabla = puntadas.merge(comisiones, on=['OPERADOR', 'PERIODO_DT'], how='outer', indicator=True)
+    tabla['EN_CALCULOS'] = tabla['_merge'] != 'right_only'
+    tabla['EN_RESUMEN'] = tabla['_merge'] != 'left_only'
+    tabla['PERIODO'] = tabla['PERIODO_DT'].dt.strftime('%d/%m/%Y')
+    
+    # Más reciente primero dentro de cada operador
+    return (
+        tabla.drop(columns='_merge')
+        .sort_values(['OPERADOR', 'PERIODO_DT'], ascending=[True, False])
+        .set_index(['OPERADOR', 'PERIODO_DT'])
+    )
+
+def comisiones_de_operador(tabla_comisiones, operador):
+    """Filas de un operador en la tabla precalculada (búsqueda por índice)"""
+    if tabla_comisiones is None or operador not in tabla_comisiones.index.get_level_values(0):
+        return pd.DataFrame(columns=['PERIODO', 'PUNTADAS_CALCULADAS', 'COMISION', 'BONIFICACION',
+                                     'COMISION_TOTAL', 'EN_CALCULOS', 'EN_RESUMEN'])
+    return tabla_comisiones.xs(operador, level='OPERADOR')
+
+# Columnas del detalle de puntadas que ve cada operador
+COLUMNAS_DETALLE_OPERADOR = ['FECHA', 'PEDIDO', 'TIPO_PRENDA', 'DISEÑO', 'CANTIDAD',
+                             'PUNTADAS_BASE', 'CABEZAS', 'TOTAL_PUNTADAS']
+
+class VistaOperador(NamedTuple):
+    """Consulta de un operador ya resuelta: métricas, comisiones por quincena y detalle"""
+    total_pedidos: int
+    total_puntadas: float
+    promedio_puntadas: float
+    comisiones: pd.DataFrame   # sus filas de la tabla de comisiones, más reciente primero
+    detalle: pd.DataFrame      # sus pedidos con las columnas de COLUMNAS_DETALLE_OPERADOR
+
+class VistasOperadores(NamedTuple):
+    """Vistas materializadas de todos los operadores para una versión de datos"""
+    por_operador: dict         # {operador: VistaOperador}
+    hay_comisiones: bool       # si el resumen ejecutivo trae comisiones de alguien
+
+def construir_vistas_operadores(df_calculado, tabla_comisiones):
+    """Precalcular la consulta de cada operador con un groupby por fuente, para que la página
+    de un operador solo lea su entrada y no filtre los DataFrames completos en cada rerun"""
+    hay_comisiones = tabla_comisiones is not None and bool(tabla_comisiones['EN_RESUMEN'].any())
+    if df_calculado is None or df_calculado.empty:
+        return VistasOperadores({}, hay_comisiones)
+    
+    columnas = [col for col in COLUMNAS_DETALLE_OPERADOR if col in df_calculado.columns]
+    columnas = columnas or [col for col in df_calculado.columns if col != 'OPERADOR']
+    grupos = df_calculado.groupby('OPERADOR', sort=True)
+    totales = grupos['TOTAL_PUNTADAS'].agg(['sum', 'size'])
+    
+    comisiones = {}
+    if tabla_comisiones is not None:
+        comisiones = {
+            operador: filas.droplevel('OPERADOR')
+            for operador, filas in tabla_comisiones.groupby(level='OPERADOR', sort=False)
         }
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, scope)
-        gc = gspread.authorize(creds)
-        
-        sheet_id = st.secrets["gsheets"]["produccion_sheet_id"]
-        spreadsheet = gc.open_by_key(sheet_id)
-        worksheet = spreadsheet.worksheet("resumen_ejecutivo")
-        
-        # Obtener datos existentes
+    sin_comisiones = comisiones_de_operador(None, None)
+    
+    por_operador = {}
+    for operador, detalle in grupos[columnas]:
+        total_puntadas, total_pedidos = totales.loc[operador, 'sum'], int(totales.loc[operador, 'size'])
+        por_operador[operador] = VistaOperador(
+            total_pedidos,
+            total_puntadas,
+            total_puntadas / total_pedidos if total_pedidos > 0 else 0,
+            comisiones.get(operador, sin_comisiones),
+            detalle,
+        )
+    return VistasOperadores(por_operador, hay_comisiones)
+
+class DatosProduccion(NamedTuple):
+    """Datos cargados y calculados, compartidos (solo lectura) por todas las sesiones"""
+    df: pd.DataFrame
+    df_calculado: pd.DataFrame
+    df_resumen: pd.DataFrame
+    tabla_comisiones: pd.DataFrame
+    vistas_operadores: VistasOperadores
+    version: str
+    cargado_en: datetime
+
+@st.cache_resource(ttl=TTL_DATOS_PRODUCCION, show_spinner="Cargando datos de producción...")
+def obtener_datos_produccion():
+    """Cargar y calcular una sola vez por proceso; si falla se lanza la excepción y no se guarda en caché"""
+    with span("autenticación google", "io"):
+        gc, sheet_id = conectar_produccion()
+    
+    df, df_calculado, version_datos = cargar_y_calcular_produccion(gc, sheet_id)
+    
+    # ✅ GUARDAR CÁLCULOS EN SHEETS (si hay datos y no estamos en modo solo lectura): un solo
+    # escritor por versión de datos, las demás sesiones y procesos pasan directo a leer
+    if not df_calculado.empty and not modo_solo_lectura():
         try:
-            datos_existentes = worksheet.get_all_values()
-            if len(datos_existentes) > 1:
-                df_existente = pd.DataFrame(datos_existentes[1:], columns=datos_existentes[0])
-            else:
-                df_existente = pd.DataFrame()
-        except:
-            df_existente = pd.DataFrame()
-        
-        # Calcular resumen por operador y fecha
-        resumen = df_calculado.groupby(['OPERADOR', 'FECHA']).agg({
-            'TOTAL_PUNTADAS': 'sum'
-        }).reset_index()
-        
-        # Preparar datos para guardar
-        nuevos_registros = []
-        for _, fila in resumen.iterrows():
-            operador = fila['OPERADOR']
-            fecha = fila['FECHA']
-            total_puntadas = fila['TOTAL_PUNTADAS']
-            
-            # Verificar si ya existe este registro
-            existe = False
-            if not df_existente.empty:
-                mask = (df_existente['OPERADOR'] == operador) & (df_existente['FECHA'] == str(fecha))
-                existe = not df_existente[mask].empty
-            
-            # Solo agregar si no existe
-            if not existe:
-                nuevos_registros.append([
-                    str(fecha),
-                    operador,
-                    total_puntadas,
-                    "",  # COMISION (vacío para que lo llene el encargado)
-                    "",  # BONIFICACION (vacío)
-                    "",  # COMISION_TOTAL (vacío)
-                    "",  # FECHA_ACTUALIZACION (vacío)
-                    ""   # ACTUALIZADO_POR (vacío)
-                ])
-        
-        # Agregar nuevos registros
-        if nuevos_registros:
-            # Encontrar la última fila con datos
-            if datos_existentes:
-                ultima_fila = len(datos_existentes) + 1
-            else:
-                ultima_fila = 2  # Después de los encabezados
-            
-            # Escribir nuevos registros
-            worksheet.update(f'A{ultima_fila}', nuevos_registros)
-        
-        return True
-    except Exception as e:
-        st.error(f"❌ Error al guardar resumen ejecutivo: {str(e)}")
-        return False
+            ejecutar_una_vez(
+                CLAVE_MATERIALIZACION, version_datos, lambda: materializar_calculos(df_calculado, gc, sheet_id)
+            )
+        except Exception as e:
+            st.sidebar.warning(f"⚠️ No se pudieron guardar los cálculos: {e}")
+    
+    # CARGAR RESUMEN EJECUTIVO
+    try:
+        df_resumen = leer_resumen_ejecutivo(gc, sheet_id)
+    except ErrorEsquema as e:
+        st.warning(f"⚠️ {e}")
+        df_resumen = pd.DataFrame()
+    except Exception:
+        df_resumen = pd.DataFrame()
+    
+    # TABLA DE COMISIONES DE TODOS LOS OPERADORES (una vez por versión de datos)
+    with span("construir_tabla_comisiones"):
+        tabla_comisiones = construir_tabla_comisiones(df_calculado, df_resumen)
+    
+    # VISTA DE CADA OPERADOR (la página de consulta solo lee la entrada del elegido)
+    with span("construir_vistas_operadores"):
+        vistas_operadores = construir_vistas_operadores(df_calculado, tabla_comisiones)
+    
+    return DatosProduccion(
+        df, df_calculado, df_resumen, tabla_comisiones, vistas_operadores, version_datos, datetime.now()
+    )
 
 def cargar_y_calcular_datos():
-    """Cargar y calcular datos desde Google Sheets"""
+    """Cargar y calcular datos desde Google Sheets (desde la caché compartida del proceso)"""
     try:
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        
-        service_account_info = {
-            "type": st.secrets["gservice_account"]["type"],
-            "project_id": st.secrets["gservice_account"]["project_id"],
-            "private_key_id": st.secrets["gservice_account"]["private_key_id"],
-            "private_key": st.secrets["gservice_account"]["private_key"],
-            "client_email": st.secrets["gservice_account"]["client_email"],
-            "client_id": st.secrets["gservice_account"]["client_id"],
-            "auth_uri": st.secrets["gservice_account"]["auth_uri"],
-            "token_uri": st.secrets["gservice_account"]["token_uri"]
-        }
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, scope)
-        gc = gspread.authorize(creds)
-        
-        # CARGAR DATOS DE PRODUCCIÓN
-        sheet_id = st.secrets["gsheets"]["produccion_sheet_id"]
-        worksheet = gc.open_by_key(sheet_id).worksheet("reporte_de_trabajo")
-        data = worksheet.get_all_values()
-        df_raw = pd.DataFrame(data[1:], columns=data[0])
-        
-        # LIMPIAR DATOS
-        df = limpiar_dataframe(df_raw)
-        
-        # CALCULAR PUNTADAS AUTOMÁTICAMENTE
-        df_calculado = calcular_puntadas_automaticamente(df)
-        
-        # ✅ GUARDAR CÁLCULOS EN SHEETS (si hay datos)
-        if not df_calculado.empty:
-            try:
-                guardar_calculos_en_sheets(df_calculado)
-                # ✅ GUARDAR RESUMEN EJECUTIVO AUTOMÁTICAMENTE
-                guardar_resumen_ejecutivo(df_calculado)
-            except Exception as e:
-                st.sidebar.warning(f"⚠️ No se pudieron guardar los cálculos: {e}")
-        
-        # CARGAR RESUMEN EJECUTIVO
-        try:
-            worksheet_resumen = gc.open_by_key(sheet_id).worksheet("resumen_ejecutivo")
-            datos_resumen = worksheet_resumen.get_all_values()
-            
-            if len(datos_resumen) > 1:
-                df_resumen = pd.DataFrame(datos_resumen[1:], columns=datos_resumen[0])
-                
-                # Convertir tipos de datos
-                if 'TOTAL_PUNTADAS' in df_resumen.columns:
-                    df_resumen['TOTAL_PUNTADAS'] = pd.to_numeric(df_resumen['TOTAL_PUNTADAS'], errors='coerce')
-                if 'COMISION_TOTAL' in df_resumen.columns:
-                    df_resumen['COMISION_TOTAL'] = pd.to_numeric(df_resumen['COMISION_TOTAL'], errors='coerce')
-                if 'BONIFICACION' in df_resumen.columns:
-                    df_resumen['BONIFICACION'] = pd.to_numeric(df_resumen['BONIFICACION'], errors='coerce')
-                if 'COMISION' in df_resumen.columns:
-                    df_resumen['COMISION'] = pd.to_numeric(df_resumen['COMISION'], errors='coerce')
-                
-                # Convertir fecha
-                if 'FECHA' in df_resumen.columns:
-                    df_resumen['FECHA'] = pd.to_datetime(df_resumen['FECHA'], errors='coerce')
-                    
-            else:
-                df_resumen = pd.DataFrame()
-        except:
-            df_resumen = pd.DataFrame()
-        
-        return df, df_calculado, df_resumen
-        
+        return obtener_datos_produccion()
     except Exception as e:
         st.error(f"❌ Error al cargar los datos: {str(e)}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+        return DatosProduccion(
+            pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), None, VistasOperadores({}, False), "", datetime.now()
+        )
 
+@trazar("mostrar_analisis_puntadas_completo", "render")
 def mostrar_analisis_puntadas_completo(df, df_calculado=None):
     """Análisis completo de puntadas con todos los gráficos"""
     
@@ -488,6 +569,7 @@ def mostrar_analisis_puntadas_completo(df, df_calculado=None):
                 st.write("**🎨 Top Diseños:**")
                 st.dataframe(top_diseños, use_container_width=True)
 
+@trazar("mostrar_tendencias_completas", "render")
 def mostrar_tendencias_completas(df, df_calculado=None):
     """Tendencias temporales completas con todos los gráficos"""
     
@@ -496,34 +578,32 @@ def mostrar_tendencias_completas(df, df_calculado=None):
         return
     
     try:
-        df_temporal = df.copy()
-        df_temporal['Fecha'] = df_temporal['Marca temporal'].dt.date
+        # Día, semana o mes según el rango visible (o lo que elija el usuario)
+        frecuencia, periodo = selector_frecuencia(df['Marca temporal'], "tendencias_produccion")
         
-        tendencias = df_temporal.groupby('Fecha').agg({
-            '#DE PEDIDO': 'count',
-            'CANTIDAD': 'sum' if 'CANTIDAD' in df.columns else None,
-            'PUNTADAS': 'sum' if 'PUNTADAS' in df.columns else None
-        }).reset_index()
+        agregaciones = {'#DE PEDIDO': 'count'}
+        for columna in ('CANTIDAD', 'PUNTADAS'):
+            if columna in df.columns:
+                agregaciones[columna] = 'sum'
+        tendencias = agrupar_por_periodo(df, 'Marca temporal', agregaciones, frecuencia)
         
         # ✅ AGREGAR TENDENCIAS DE CÁLCULOS SI ESTÁN DISPONIBLES
         if df_calculado is not None and not df_calculado.empty and "TOTAL_PUNTADAS" in df_calculado.columns:
-            df_calc_temporal = df_calculado.copy()
-            if 'FECHA' in df_calc_temporal.columns:
-                if df_calc_temporal['FECHA'].dtype == 'object':
-                    df_calc_temporal['FECHA'] = pd.to_datetime(df_calc_temporal['FECHA']).dt.date
-                
-                tendencias_calc = df_calc_temporal.groupby('FECHA')['TOTAL_PUNTADAS'].sum().reset_index()
-                tendencias_calc.columns = ['Fecha', 'TOTAL_PUNTADAS']
+            if 'FECHA' in df_calculado.columns:
+                tendencias_calc = agrupar_por_periodo(df_calculado, 'FECHA', {'TOTAL_PUNTADAS': 'sum'}, frecuencia)
                 tendencias = tendencias.merge(tendencias_calc, on='Fecha', how='left')
         
+        # Con muchos puntos los marcadores solo estorban
+        marcadores = len(tendencias) <= 120
+        
         if len(tendencias) > 1:
-            # Gráfico de pedidos por día
+            # Gráfico de pedidos por período
             fig1 = px.line(
-                tendencias, 
+                reducir_puntos(tendencias, 'Fecha', '#DE PEDIDO'), 
                 x='Fecha', 
                 y='#DE PEDIDO',
-                title="📦 Evolución de Pedidos por Día",
-                markers=True
+                title=f"📦 Evolución de Pedidos por {periodo}",
+                markers=marcadores
             )
             st.plotly_chart(fig1, use_container_width=True)
             
@@ -531,37 +611,38 @@ def mostrar_tendencias_completas(df, df_calculado=None):
             col1, col2 = st.columns(2)
             
             with col1:
-                # Gráfico de puntadas base por día
+                # Gráfico de puntadas base por período
                 if "PUNTADAS" in df.columns:
                     fig2 = px.line(
-                        tendencias, 
+                        reducir_puntos(tendencias, 'Fecha', 'PUNTADAS'), 
                         x='Fecha', 
                         y='PUNTADAS',
-                        title="🪡 Evolución de Puntadas Base por Día",
-                        markers=True,
+                        title=f"🪡 Evolución de Puntadas Base por {periodo}",
+                        markers=marcadores,
                         color_discrete_sequence=['red']
                     )
                     st.plotly_chart(fig2, use_container_width=True)
             
             with col2:
-                # Gráfico de puntadas calculadas por día
+                # Gráfico de puntadas calculadas por período
                 if "TOTAL_PUNTADAS" in tendencias.columns and not tendencias["TOTAL_PUNTADAS"].isna().all():
                     fig3 = px.line(
-                        tendencias, 
+                        reducir_puntos(tendencias, 'Fecha', 'TOTAL_PUNTADAS'), 
                         x='Fecha', 
                         y='TOTAL_PUNTADAS',
-                        title="🧵 Evolución de Puntadas Calculadas por Día",
-                        markers=True,
+                        title=f"🧵 Evolución de Puntadas Calculadas por {periodo}",
+                        markers=marcadores,
                         color_discrete_sequence=['green']
                     )
                     st.plotly_chart(fig3, use_container_width=True)
                     
         else:
-            st.info("Se necesitan datos de más de un día para mostrar tendencias.")
+            st.info(f"Se necesitan datos de al menos dos períodos ({periodo.lower()}) para mostrar tendencias.")
             
     except Exception as e:
         st.error(f"Error al generar tendencias: {str(e)}")
 
+@trazar("mostrar_analisis_operadores_completo", "render")
 def mostrar_analisis_operadores_completo(df_filtrado, df_calculado):
     """Análisis completo de operadores"""
     try:
@@ -654,148 +735,56 @@ def mostrar_analisis_operadores_completo(df_filtrado, df_calculado):
     except Exception as e:
         st.error(f"Error en análisis de operadores: {str(e)}")
 
-def agrupar_comisiones_por_periodo(df_comisiones):
-    """Agrupar comisiones por períodos quincenales FIJOS (días 10 y 25 de cada mes)"""
-    try:
-        if df_comisiones.empty:
-            return pd.DataFrame()
-        
-        # Asegurarse de que FECHA es datetime
-        if df_comisiones['FECHA'].dtype == 'object':
-            df_comisiones['FECHA'] = pd.to_datetime(df_comisiones['FECHA'], errors='coerce')
-        
-        # Eliminar filas con fechas inválidas
-        df_comisiones = df_comisiones.dropna(subset=['FECHA'])
-        
-        # Función para determinar el período FIJANDO días 10 y 25 como cortes
-        def obtener_periodo_fijo(fecha):
-            dia = fecha.day
-            mes = fecha.month
-            año = fecha.year
-            
-            if 11 <= dia <= 25:
-                return f"25/{mes:02d}/{año}"
-            elif dia >= 26:
-                mes_siguiente = mes + 1 if mes < 12 else 1
-                año_siguiente = año if mes < 12 else año + 1
-                return f"10/{mes_siguiente:02d}/{año_siguiente}"
-            else:
-                return f"10/{mes:02d}/{año}"
-        
-        # Aplicar la función para crear columna de período
-        df_comisiones['PERIODO'] = df_comisiones['FECHA'].apply(obtener_periodo_fijo)
-        
-        # Agrupar por período y calcular totales
-        columnas_suma = ['COMISION', 'BONIFICACION', 'COMISION_TOTAL']
-        columnas_existentes = [col for col in columnas_suma if col in df_comisiones.columns]
-        
-        if columnas_existentes:
-            df_agrupado = df_comisiones.groupby('PERIODO', as_index=False)[columnas_existentes].sum()
-            
-            # Ordenar por período (convertir a datetime para ordenar correctamente)
-            df_agrupado['PERIODO_DT'] = pd.to_datetime(df_agrupado['PERIODO'], format='%d/%m/%Y')
-            df_agrupado = df_agrupado.sort_values('PERIODO_DT', ascending=False)
-            df_agrupado = df_agrupado.drop('PERIODO_DT', axis=1)
-            
-            return df_agrupado
-        else:
-            return pd.DataFrame()
-            
-    except Exception as e:
-        st.error(f"Error al agrupar comisiones por período: {str(e)}")
-        return pd.DataFrame()
-        
-def comparar_puntadas_reales_vs_calculadas(df_calculado, df_resumen, operador_seleccionado):
+def comparar_puntadas_reales_vs_calculadas(comisiones_operador):
     """Comparar puntadas reales (comisiones) vs puntadas calculadas para análisis"""
     
-    if df_calculado is None or df_calculado.empty:
+    # Solo si hay comisiones del operador y puntadas calculadas
+    if comisiones_operador.empty or not comisiones_operador['EN_RESUMEN'].any():
         return
-    
-    # Filtrar datos del operador en cálculos
-    df_operador_calc = df_calculado[df_calculado["OPERADOR"] == operador_seleccionado].copy()
-    
-    if df_operador_calc.empty:
+    if not comisiones_operador['EN_CALCULOS'].any():
         return
     
-    # Aplicar misma lógica de períodos a las puntadas calculadas
-    def obtener_periodo_fijo(fecha):
-        dia = fecha.day
-        mes = fecha.month
-        año = fecha.year
-        
-        if 11 <= dia <= 25:
-            return f"25/{mes:02d}/{año}"
-        elif dia >= 26:
-            mes_siguiente = mes + 1 if mes < 12 else 1
-            año_siguiente = año if mes < 12 else año + 1
-            return f"10/{mes_siguiente:02d}/{año_siguiente}"
-        else:
-            return f"10/{mes:02d}/{año}"
+    df_comparativa = comisiones_operador[
+        ['PERIODO', 'PUNTADAS_CALCULADAS', 'COMISION', 'BONIFICACION', 'COMISION_TOTAL']
+    ]
+    
+    st.subheader("📊 Comparativa: Puntadas vs Comisiones")
+    st.info("""
+    **Análisis de eficiencia:**
+    - Compara tus **puntadas calculadas** vs **comisiones recibidas**
+    - Ayuda a identificar si el sistema actual es adecuado
+    - Base para posibles ajustes en el sistema de comisiones
+    """)
+    
+    # Crear tabla comparativa con las columnas numéricas formateadas (df_comparativa queda numérico)
+    df_display = df_comparativa.assign(
+        PUNTADAS_CALCULADAS=df_comparativa['PUNTADAS_CALCULADAS'].apply(
+            lambda x: f"{x:,.0f}" if pd.notna(x) else "N/A"
+        ),
+        COMISION_TOTAL=df_comparativa['COMISION_TOTAL'].apply(
+            lambda x: f"${x:,.2f}" if pd.notna(x) else "N/A"
+        ),
+    )
     
-    # Agrupar puntadas calculadas por período
-    df_operador_calc['PERIODO'] = df_operador_calc['FECHA'].apply(obtener_periodo_fijo)
-    puntadas_por_periodo = df_operador_calc.groupby('PERIODO')['TOTAL_PUNTADAS'].sum().reset_index()
-    puntadas_por_periodo.columns = ['PERIODO', 'PUNTADAS_CALCULADAS']
+    st.dataframe(df_display, use_container_width=True, hide_index=True)
     
-    # Si hay comisiones, mostrar comparativa
-    if df_resumen is not None and not df_resumen.empty and 'OPERADOR' in df_resumen.columns:
-        df_comisiones_operador = df_resumen[df_resumen['OPERADOR'] == operador_seleccionado].copy()
-        
-        if not df_comisiones_operador.empty:
-            # Agrupar comisiones por período
-            df_comisiones_agrupadas = agrupar_comisiones_por_periodo(df_comisiones_operador)
-            
-            if not df_comisiones_agrupadas.empty:
-                # Combinar puntadas calculadas con comisiones
-                df_comparativa = pd.merge(
-                    puntadas_por_periodo, 
-                    df_comisiones_agrupadas, 
-                    on='PERIODO', 
-                    how='outer'
-                )
-                
-                # Solo mostrar si hay datos para comparar
-                if not df_comparativa.empty:
-                    st.subheader("📊 Comparativa: Puntadas vs Comisiones")
-                    st.info("""
-                    **Análisis de eficiencia:**
-                    - Compara tus **puntadas calculadas** vs **comisiones recibidas**
-                    - Ayuda a identificar si el sistema actual es adecuado
-                    - Base para posibles ajustes en el sistema de comisiones
-                    """)
-                    
-                    # Crear tabla comparativa
-                    df_display = df_comparativa.copy()
-                    
-                    # Formatear columnas numéricas
-                    if 'PUNTADAS_CALCULADAS' in df_display.columns:
-                        df_display['PUNTADAS_CALCULADAS'] = df_display['PUNTADAS_CALCULADAS'].apply(
-                            lambda x: f"{x:,.0f}" if pd.notna(x) else "N/A"
-                        )
-                    
-                    if 'COMISION_TOTAL' in df_display.columns:
-                        df_display['COMISION_TOTAL'] = df_display['COMISION_TOTAL'].apply(
-                            lambda x: f"${x:,.2f}" if pd.notna(x) else "N/A"
-                        )
-                    
-                    st.dataframe(df_display, use_container_width=True)
-                    
-                    # Análisis simple
-                    periodos_con_datos = df_comparativa.dropna().shape[0]
-                    if periodos_con_datos > 0:
-                        st.success(f"✅ {periodos_con_datos} período(s) con datos completos para análisis")
-                    else:
-                        st.info("ℹ️ No hay períodos superpuestos para comparar aún")
+    # Análisis simple
+    periodos_con_datos = df_comparativa.dropna().shape[0]
+    if periodos_con_datos > 0:
+        st.success(f"✅ {periodos_con_datos} período(s) con datos completos para análisis")
+    else:
+        st.info("ℹ️ No hay períodos superpuestos para comparar aún")
 
-def mostrar_consultas_operadores_compacto(df_calculado, df_resumen):
-    """Interfaz compacta para consulta de operadores - SOLO AGRUPACIÓN"""
+@trazar("mostrar_consultas_operadores_compacto", "render")
+def mostrar_consultas_operadores_compacto(vistas_operadores):
+    """Interfaz compacta para consulta de operadores - lee solo la vista precalculada del operador"""
     
-    if df_calculado is None or df_calculado.empty:
+    if not vistas_operadores.por_operador:
         st.info("ℹ️ No hay cálculos disponibles. Los cálculos se generan automáticamente.")
         return
     
-    # Selección de operador
-    operadores = sorted(df_calculado["OPERADOR"].unique())
+    # Selección de operador (las vistas ya están ordenadas por nombre)
+    operadores = list(vistas_operadores.por_operador)
     
     if not operadores:
         st.info("No hay operadores con cálculos disponibles.")
@@ -811,97 +800,78 @@ def mostrar_consultas_operadores_compacto(df_calculado, df_resumen):
         st.info("👆 **Por favor, selecciona tu nombre de la lista para ver tus puntadas y comisiones**")
         return
     
-    # Filtrar datos del operador
-    df_operador = df_calculado[df_calculado["OPERADOR"] == operador_seleccionado].copy()
-    
-    if df_operador.empty:
-        st.warning("No hay datos para los filtros seleccionados")
-        return
+    # Vista del operador (sin filtrar los DataFrames completos)
+    vista = vistas_operadores.por_operador[operador_seleccionado]
     
     # 1. RESUMEN DE PUNTADAS
     st.subheader(f"📊 Resumen de {operador_seleccionado}")
     
-    total_puntadas = df_operador["TOTAL_PUNTADAS"].sum()
-    total_pedidos = len(df_operador)
-    promedio_puntadas = total_puntadas / total_pedidos if total_pedidos > 0 else 0
-    
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Pedidos", total_pedidos)
+        st.metric("Total Pedidos", vista.total_pedidos)
     with col2:
-        st.metric("Total Puntadas", f"{total_puntadas:,.0f}")
+        st.metric("Total Puntadas", f"{vista.total_puntadas:,.0f}")
     with col3:
-        st.metric("Promedio por Pedido", f"{promedio_puntadas:,.0f}")
+        st.metric("Promedio por Pedido", f"{vista.promedio_puntadas:,.0f}")
 
     # 2. COMISIONES POR PERÍODOS (SOLO AGRUPACIÓN)
     st.subheader(f"💰 Comisiones por Períodos de {operador_seleccionado}")
     
-    if df_resumen is not None and not df_resumen.empty and 'OPERADOR' in df_resumen.columns:
-        df_comisiones_operador = df_resumen[df_resumen['OPERADOR'] == operador_seleccionado].copy()
+    comisiones_operador = vista.comisiones
+    
+    if vistas_operadores.hay_comisiones:
+        df_comisiones_agrupadas = comisiones_operador[comisiones_operador['EN_RESUMEN']]
         
-        if not df_comisiones_operador.empty:
-            df_comisiones_agrupadas = agrupar_comisiones_por_periodo(df_comisiones_operador)
+        if not df_comisiones_agrupadas.empty:
+            # Mostrar métricas de comisiones agrupadas
+            col4, col5, col6 = st.columns(3)
+            
+            with col4:
+                total_comision = df_comisiones_agrupadas['COMISION_TOTAL'].sum()
+                st.metric("Total Acumulado", f"${total_comision:,.2f}")
+            
+            with col5:
+                periodos_count = len(df_comisiones_agrupadas)
+                st.metric("Períodos Pagados", periodos_count)
+            
+            with col6:
+                promedio_por_periodo = df_comisiones_agrupadas['COMISION_TOTAL'].mean()
+                st.metric("Promedio por Período", f"${promedio_por_periodo:,.2f}")
+            
+            # Mostrar tabla de períodos
+            st.write("**🗓️ Desglose por Períodos Quincenales:**")
+            
+            df_display = df_comisiones_agrupadas[['PERIODO', 'COMISION', 'BONIFICACION', 'COMISION_TOTAL']]
+            df_display['COMISION'] = df_display['COMISION'].apply(lambda x: f"${x:,.2f}")
+            df_display['BONIFICACION'] = df_display['BONIFICACION'].apply(lambda x: f"${x:,.2f}")
+            df_display['COMISION_TOTAL'] = df_display['COMISION_TOTAL'].apply(lambda x: f"${x:,.2f}")
+            
+            st.dataframe(df_display, use_container_width=True, hide_index=True)
+            
+            # Gráfico de comisiones por período
+            st.write("**📈 Evolución de Comisiones:**")
+            fig = px.bar(
+                df_comisiones_agrupadas,
+                x='PERIODO',
+                y='COMISION_TOTAL',
+                title=f"Comisiones por Período - {operador_seleccionado}",
+                labels={'COMISION_TOTAL': 'Comisión Total', 'PERIODO': 'Período'}
+            )
+            st.plotly_chart(fig, use_container_width=True)
             
-            if not df_comisiones_agrupadas.empty:
-                # Mostrar métricas de comisiones agrupadas
-                col4, col5, col6 = st.columns(3)
-                
-                with col4:
-                    total_comision = df_comisiones_agrupadas['COMISION_TOTAL'].sum()
-                    st.metric("Total Acumulado", f"${total_comision:,.2f}")
-                
-                with col5:
-                    periodos_count = len(df_comisiones_agrupadas)
-                    st.metric("Períodos Pagados", periodos_count)
-                
-                with col6:
-                    promedio_por_periodo = df_comisiones_agrupadas['COMISION_TOTAL'].mean()
-                    st.metric("Promedio por Período", f"${promedio_por_periodo:,.2f}")
-                
-                # Mostrar tabla de períodos
-                st.write("**🗓️ Desglose por Períodos Quincenales:**")
-                
-                df_display = df_comisiones_agrupadas.copy()
-                df_display['COMISION'] = df_display['COMISION'].apply(lambda x: f"${x:,.2f}")
-                df_display['BONIFICACION'] = df_display['BONIFICACION'].apply(lambda x: f"${x:,.2f}")
-                df_display['COMISION_TOTAL'] = df_display['COMISION_TOTAL'].apply(lambda x: f"${x:,.2f}")
-                
-                st.dataframe(df_display, use_container_width=True)
-                
-                # Gráfico de comisiones por período
-                st.write("**📈 Evolución de Comisiones:**")
-                fig = px.bar(
-                    df_comisiones_agrupadas,
-                    x='PERIODO',
-                    y='COMISION_TOTAL',
-                    title=f"Comisiones por Período - {operador_seleccionado}",
-                    labels={'COMISION_TOTAL': 'Comisión Total', 'PERIODO': 'Período'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                
-            else:
-                st.info("No hay comisiones agrupadas por períodos.")
         else:
             st.info(f"No hay registros de comisiones para {operador_seleccionado}.")
     else:
         st.info("No hay datos de comisiones disponibles en el resumen ejecutivo.")
 
     # 3. COMPARATIVA PUNTADAS VS COMISIONES (ANÁLISIS)
-    comparar_puntadas_reales_vs_calculadas(df_calculado, df_resumen, operador_seleccionado)
+    comparar_puntadas_reales_vs_calculadas(comisiones_operador)
 
     # 4. DETALLE DE PUNTADAS (se mantiene igual)
     st.subheader(f"🪡 Detalle de Puntadas por Pedido")
     
     with st.expander("📊 Ver mis puntadas detalladas", expanded=False):
-        columnas_a_mostrar = ['FECHA', 'PEDIDO', 'TIPO_PRENDA', 'DISEÑO', 'CANTIDAD', 
-                             'PUNTADAS_BASE', 'CABEZAS', 'TOTAL_PUNTADAS']
-        
-        columnas_existentes = [col for col in columnas_a_mostrar if col in df_operador.columns]
-        
-        if columnas_existentes:
-            st.dataframe(df_operador[columnas_existentes], use_container_width=True)
-        else:
-            st.dataframe(df_operador, use_container_width=True)
+        st.dataframe(vista.detalle, use_container_width=True)
 
 # ✅ FUNCIÓN PRINCIPAL QUE EXPORTA EL MÓDULO (CON PARÁMETROS)
 def mostrar_dashboard_produccion(df=None, df_calculado=None):
@@ -911,16 +881,20 @@ def mostrar_dashboard_produccion(df=None, df_calculado=None):
         st.sidebar.header("🔄 Actualizar Datos")
         if st.sidebar.button("🔄 Actualizar Datos en Tiempo Real", use_container_width=True):
             st.cache_data.clear()
+            obtener_datos_produccion.clear()
             st.rerun()
         
-        # Si no se pasan datos, cargarlos
-        if df is None:
-            df, df_calculado, df_resumen = cargar_y_calcular_datos()
-        else:
-            # Si se pasan datos, cargar solo el resumen
-            _, _, df_resumen = cargar_y_calcular_datos()
-        
-        st.sidebar.info(f"Última actualización: {datetime.now().strftime('%H:%M:%S')}")
+        # Si no se pasan datos, cargarlos (los DataFrames son compartidos: no modificarlos en sitio)
+        with span("cargar_y_calcular_datos", "io"):
+            datos = cargar_y_calcular_datos()
+            if df is None:
+                df, df_calculado = datos.df, datos.df_calculado
+            # Si se pasan datos, usar solo el resumen
+            df_resumen = datos.df_resumen
+        
+        st.sidebar.info(f"Última actualización: {datos.cargado_en.strftime('%H:%M:%S')}")
+        if modo_solo_lectura():
+            st.sidebar.caption("🔒 Solo lectura: los cálculos los escribe el proceso programado")
         st.sidebar.info(f"📊 Registros: {len(df)}")
         if df_calculado is not None and not df_calculado.empty:
             st.sidebar.success(f"🧵 Cálculos: {len(df_calculado)}")
@@ -986,23 +960,40 @@ def mostrar_dashboard_produccion(df=None, df_calculado=None):
             
             with tab_data:
                 with st.expander("📊 Ver datos detallados de producción", expanded=False):
-                    st.dataframe(df_filtrado, use_container_width=True, height=400)
+                    # Solo viaja al navegador la página visible
+                    version_filtrado = version_dataframe(df_filtrado)
+                    with span("tabla datos detallados", "render"):
+                        mostrar_tabla_paginada(df_filtrado, "datos_produccion", version=version_filtrado)
+                    boton_exportar(df_filtrado, "datos_produccion", version=version_filtrado)
+
+                if df_calculado is not None and not df_calculado.empty:
+                    with st.expander("📥 Exportar puntadas calculadas", expanded=False):
+                        boton_exportar(
+                            df_calculado, "puntadas_calculadas",
+                            version=datos.version if df_calculado is datos.df_calculado else None
+                        )
         
         with tab2:
             st.info("🔍 **Consulta tus puntadas calculadas automáticamente y tus comisiones**")
-            mostrar_consultas_operadores_compacto(df_calculado, df_resumen)
+            if df_calculado is datos.df_calculado:
+                vistas_operadores = datos.vistas_operadores
+            else:
+                # Cálculos recibidos por parámetro: armar sus vistas en este rerun
+                vistas_operadores = construir_vistas_operadores(df_calculado, datos.tabla_comisiones)
+            mostrar_consultas_operadores_compacto(vistas_operadores)
+        
+        with tab3:
+            mostrar_plugins_ia(df_filtrado, df_calculado)
         
     except Exception as e:
         st.error(f"❌ Error al cargar los datos: {str(e)}")
         st.info("⚠️ Verifica que la hoja de cálculo esté accesible y la estructura sea correcta")
 
-        with tab3:
-            mostrar_ia_produccion(df_filtrado, df_calculado)
-
 # AL FINAL de modulo_produccion.py - SOLO ESTO:
 
+@trazar("mostrar_plugins_ia", "render")
 def mostrar_plugins_ia(df_produccion, df_calculado):
-    """Función para mostrar plugins de IA"""
+    """Función para mostrar plugins de IA (el registro de plugins se comparte en el proceso)"""
     try:
         from plugin_manager import PluginManager
         manager = PluginManager()
@@ -1,19 +1,330 @@
+import threading
 import streamlit as st
-import gspread
+from servicios_google import autorizar_gspread, leer_hojas_incrementales
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
-import seaborn as sns
 from datetime import datetime
 from oauth2client.service_account import ServiceAccountCredentials
+from esquemas import aplicar_esquema
+from exportaciones import boton_exportar
+from indice_texto import PALABRAS_VACIAS, PATRON_PALABRAS, IndiceInvertido, normalizar_texto, tokenizar
+from trazas import Fases, span, trazar
+
+# 📊 Métricas del agregado (Marca × día × métrica → suma, conteo, si)
+# Promedios: suma / conteo de respuestas con valor
+METRICAS_PROMEDIO = ['Atencion_Cliente', 'Satisfaccion_General', 'Tiempo_Entrega']
+# Tasas: respuestas "sí" (o con comentario) / total de respuestas
+METRICAS_SI_NO = ['Recomendacion', 'Calidad_Trabajo', 'Comentarios']
+CAMPOS_AGREGADO = ['suma', 'conteo', 'si']
+
+# 🔴 FUNCIÓN PARA LIMPIAR VALORES SÍ/NO
+VALORES_SI = ['sí', 'si', 's', 'yes', 'y']
+VALORES_NO = ['no', 'n']
+
+def limpiar_si_no(serie):
+    """'sí'/'no' normalizados; otros textos quedan en minúsculas y los nulos como están"""
+    texto = serie.astype(str).str.strip().str.lower()
+    texto = texto.mask(texto.isin(VALORES_SI), 'sí').mask(texto.isin(VALORES_NO), 'no')
+    return texto.where(serie.notna(), serie)
+
+def limpiar_respuestas(df, marca):
+    """Marca, valores Sí/No y comentarios normalizados de las respuestas de un formulario"""
+    # Marca temporal y columnas numéricas ya vienen convertidas por el esquema
+    df = df.assign(Marca=marca)
+    if 'Calidad_Trabajo' in df.columns:
+        df['Calidad_Trabajo'] = limpiar_si_no(df['Calidad_Trabajo'])
+    df['Recomendacion'] = limpiar_si_no(df['Recomendacion'])
+    df['Comentarios'] = df['Comentarios'].astype(str).str.strip().replace({'nan': '', 'None': ''})
+    return df
+
+def agregar_respuestas(df, marca):
+    """Celdas (Marca, Dia, Metrica) → suma, conteo, si de un bloque de respuestas de una marca"""
+    columnas = {('Respuestas', 'conteo'): np.ones(len(df))}
+    for metrica in METRICAS_PROMEDIO:
+        if metrica in df.columns:
+            valores = pd.to_numeric(df[metrica], errors='coerce')
+            columnas[(metrica, 'suma')] = valores.fillna(0)
+            columnas[(metrica, 'conteo')] = valores.notna()
+    for metrica in METRICAS_SI_NO:
+        if metrica in df.columns:
+            columnas[(metrica, 'si')] = df[metrica] != '' if metrica == 'Comentarios' else df[metrica] == 'sí'
+    
+    # Las respuestas sin fecha quedan en su propia celda (cuentan sin filtro de fechas)
+    dias = df['Marca temporal'].dt.normalize().rename('Dia')
+    por_dia = pd.DataFrame(columnas, index=df.index).astype(float).groupby(dias, dropna=False).sum()
+    por_dia.columns.names = ['Metrica', None]
+    celdas = por_dia.stack('Metrica').reindex(columns=CAMPOS_AGREGADO, fill_value=0).fillna(0)
+    return pd.concat({marca: celdas}, names=['Marca'])
+
+def es_lectura_vieja(fuente, reconciliada_en, filas):
+    """Si una lectura no es más nueva que la ya procesada `fuente` = (reconciliada_en, filas):
+    otra sesión puede llegar con una copia anterior de la pestaña"""
+    return fuente is not None and (
+        reconciliada_en < fuente[0] or (reconciliada_en == fuente[0] and filas <= fuente[1])
+    )
+
+def filas_pendientes(fuentes, marca, df, reconciliada_en):
+    """Primera fila de `df` aún no procesada, o None si la marca debe reconstruirse
+    (primera vez o la pestaña se volvió a descargar completa). Con una copia más vieja que
+    la ya procesada no hay nada pendiente: se conserva lo que hay en vez de retroceder."""
+    fuente = fuentes.get(marca)
+    if es_lectura_vieja(fuente, reconciliada_en, len(df)):
+        return fuente[1]
+    fuentes[marca] = (reconciliada_en, len(df))
+    if fuente is None or fuente[0] != reconciliada_en:
+        return None
+    return fuente[1]
+
+class RespuestasPreparadas:
+    """Respuestas de cada marca con el esquema y la limpieza ya aplicados, compartidas entre sesiones.
+
+    En cada lectura solo se convierten las filas nuevas; el índice es la posición de la respuesta
+    en su pestaña. Si la pestaña se volvió a descargar completa, la marca se prepara de nuevo.
+    """
+
+    def __init__(self):
+        self._marcas = {}  # marca → (reconciliada_en, filas, DataFrame)
+        self._lock = threading.Lock()
+
+    def obtener(self, marca, esquema, lectura):
+        """(DataFrame de la marca, reconciliada_en de la lectura que lo produjo)"""
+        with self._lock:
+            previa = self._marcas.get(marca)
+            filas = len(lectura.datos)
+            if es_lectura_vieja(previa[:2] if previa else None, lectura.reconciliada_en, filas):
+                return previa[2], previa[0]
+            desde = previa[1] if previa is not None and previa[0] == lectura.reconciliada_en else 0
+            with span(f"preparar respuestas {marca}", filas=filas - desde):
+                nuevas = aplicar_esquema(pd.DataFrame(lectura.datos[desde:]), esquema)
+                nuevas = limpiar_respuestas(nuevas.set_axis(pd.RangeIndex(desde, filas)), marca)
+            df = pd.concat([previa[2], nuevas]) if desde else nuevas
+            self._marcas[marca] = (lectura.reconciliada_en, filas, df)
+            return df, lectura.reconciliada_en
+
+@st.cache_resource
+def obtener_respuestas_preparadas():
+    """Respuestas preparadas únicas por proceso"""
+    return RespuestasPreparadas()
+
+class AgregadoSatisfaccion:
+    """Tabla (Marca, Dia, Metrica) → suma, conteo, si mantenida con las respuestas que llegan.
+
+    Los formularios solo crecen: cada actualización agrega únicamente las filas nuevas de la
+    marca; si la pestaña se volvió a descargar completa (ediciones) la marca se reconstruye.
+    """
+
+    def __init__(self):
+        self.tabla = agregar_respuestas(
+            pd.DataFrame({'Marca temporal': pd.Series(dtype='datetime64[ns]')}), ''
+        ).iloc[0:0]
+        self._fuentes = {}  # marca → (reconciliada_en, filas ya agregadas)
+        self._lock = threading.Lock()
+
+    def actualizar(self, marca, df, reconciliada_en):
+        with self._lock:
+            desde = filas_pendientes(self._fuentes, marca, df, reconciliada_en)
+            if desde is None:
+                with span(f"agregar satisfacción {marca}", filas=len(df)):
+                    resto = self.tabla.drop(marca, level='Marca', errors='ignore')
+                    self.tabla = pd.concat([resto, agregar_respuestas(df, marca)]).sort_index()
+            elif len(df) > desde:
+                with span(f"agregar satisfacción {marca}", filas=len(df) - desde):
+                    self.tabla = self.tabla.add(agregar_respuestas(df.iloc[desde:], marca), fill_value=0)
+            return self.tabla
+
+@st.cache_resource
+def obtener_agregado_satisfaccion():
+    """Agregado único por proceso, compartido por todas las sesiones"""
+    return AgregadoSatisfaccion()
+
+# 💬 Feed de comentarios
+COLUMNAS_COMENTARIO = ['Marca', 'Marca temporal', 'Atencion_Cliente', 'Satisfaccion_General',
+                       'Tiempo_Entrega', 'Calidad_Trabajo', 'Recomendacion', 'Comentarios']
+COMENTARIOS_POR_PAGINA = [5, 10, 20, 50]
+
+def tokens_comentarios(comentarios):
+    """Palabras distintas de cada comentario (sin acentos ni palabras vacías), de forma vectorizada"""
+    textos = comentarios.astype(str).str.lower().reset_index(drop=True)
+    # Solo los textos con acentos pasan por la normalización completa
+    con_acentos = ~textos.map(str.isascii)
+    textos[con_acentos] = textos[con_acentos].map(normalizar_texto)
+    palabras = textos.str.findall(PATRON_PALABRAS).explode().dropna()
+    palabras = palabras[~palabras.isin(PALABRAS_VACIAS)]
+    pares = pd.DataFrame({'posicion': palabras.index, 'palabra': palabras.to_numpy()}).drop_duplicates()
+    listas = pares.groupby('posicion')['palabra'].agg(list).reindex(range(len(comentarios)))
+    return pd.Series([l if isinstance(l, list) else [] for l in listas], index=comentarios.index, dtype=object)
+
+class FeedComentarios:
+    """Comentarios de clientes con índice invertido de sus palabras, compartido entre sesiones.
+
+    Igual que el agregado, solo se indexan los comentarios de las respuestas nuevas; una marca
+    se reindexa completa cuando su pestaña se volvió a descargar entera.
+    """
+
+    def __init__(self):
+        self.comentarios = pd.DataFrame(
+            columns=COLUMNAS_COMENTARIO + ['Palabras'],
+            index=pd.MultiIndex.from_arrays([[], []], names=['id_marca', 'id_fila'])
+        )
+        self.indice = IndiceInvertido()
+        self._fuentes = {}  # marca → (reconciliada_en, filas ya indexadas)
+        self._lock = threading.Lock()
+
+    def _indexar(self, marca, df, desde):
+        nuevos = df.iloc[desde:]
+        nuevos = nuevos[nuevos['Comentarios'] != ''].reindex(columns=COLUMNAS_COMENTARIO)
+        # Id estable: (marca, fila de la respuesta en su pestaña)
+        nuevos.index = pd.MultiIndex.from_arrays(
+            [np.full(len(nuevos), marca, dtype=object), nuevos.index], names=['id_marca', 'id_fila']
+        )
+        nuevos = nuevos.assign(Palabras=tokens_comentarios(nuevos['Comentarios']))
+        for id_comentario, palabras in nuevos['Palabras'].items():
+            self.indice.agregar(id_comentario, palabras)
+        return nuevos
 
+    def actualizar(self, marca, df, reconciliada_en):
+        with self._lock:
+            desde = filas_pendientes(self._fuentes, marca, df, reconciliada_en)
+            if desde is None:
+                with span(f"indexar comentarios {marca}", filas=len(df)):
+                    anteriores = self.comentarios[self.comentarios['Marca'] == marca]
+                    for id_comentario in anteriores.index:
+                        self.indice.eliminar(id_comentario)
+                    resto = self.comentarios[self.comentarios['Marca'] != marca]
+                    self.comentarios = pd.concat([resto, self._indexar(marca, df, 0)])
+            elif len(df) > desde:
+                with span(f"indexar comentarios {marca}", filas=len(df) - desde):
+                    self.comentarios = pd.concat([self.comentarios, self._indexar(marca, df, desde)])
+
+    def buscar(self, consulta="", marcas=None, fecha_inicio=None, fecha_fin=None, atencion=None):
+        """Comentarios que contienen todas las palabras (por prefijo o parecidas) y cumplen
+        los filtros de marca, fecha y calificación de atención; más recientes primero"""
+        with self._lock:
+            comentarios = self.comentarios
+            terminos = tokenizar(consulta, PALABRAS_VACIAS)
+            mascara = np.ones(len(comentarios), dtype=bool)
+            if terminos:
+                mascara &= comentarios.index.isin(list(self.indice.buscar(terminos)))
+        fechas = comentarios['Marca temporal']
+        if marcas is not None:
+            mascara &= comentarios['Marca'].isin(marcas).to_numpy()
+        if fecha_inicio is not None:
+            mascara &= (fechas >= pd.Timestamp(fecha_inicio)).to_numpy()
+        if fecha_fin is not None:
+            mascara &= (fechas < pd.Timestamp(fecha_fin) + pd.Timedelta(days=1)).to_numpy()
+        if atencion is not None:
+            mascara &= comentarios['Atencion_Cliente'].between(*atencion).to_numpy()
+        return comentarios[mascara].sort_values('Marca temporal', ascending=False, na_position='last')
+
+@st.cache_resource
+def obtener_feed_comentarios():
+    """Feed único por proceso, compartido por todas las sesiones"""
+    return FeedComentarios()
+
+def frecuencias_palabras(comentarios, n=15):
+    """Palabras más mencionadas: en cuántos comentarios aparece cada una"""
+    return comentarios['Palabras'].explode().dropna().value_counts().head(n)
+
+def mostrar_feed_comentarios(feed, marcas, fecha_inicio, fecha_fin):
+    """Búsqueda, filtros y paginación de comentarios; solo se dibuja la página visible"""
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        consulta = st.text_input("🔍 Buscar en comentarios:", key="comentarios_buscar",
+                                 placeholder="Palabras (sin importar acentos)...")
+    with col2:
+        atencion = st.slider("Atención (1-5):", 1, 5, (1, 5), key="comentarios_atencion")
+    with col3:
+        tamano = st.selectbox("Por página:", COMENTARIOS_POR_PAGINA, index=1, key="comentarios_tamano")
+    
+    # Sin restringir la calificación se incluyen también las respuestas sin calificar
+    comentarios = feed.buscar(consulta, marcas, fecha_inicio, fecha_fin, None if atencion == (1, 5) else atencion)
+    
+    if comentarios.empty:
+        st.info("No hay comentarios disponibles para el período seleccionado.")
+        return
+    
+    frecuencias = frecuencias_palabras(comentarios)
+    if not frecuencias.empty:
+        with st.expander("🔠 Palabras más mencionadas", expanded=False):
+            fig, ax = plt.subplots(figsize=(10, 4))
+            ax.barh(frecuencias.index[::-1], frecuencias.values[::-1], color='#4ECDC4', alpha=0.8)
+            ax.set_xlabel('Comentarios que la mencionan')
+            st.pyplot(fig)
+    
+    total_paginas = max(1, -(-len(comentarios) // tamano))
+    # La página vuelve a 1 cuando cambia la búsqueda o los filtros
+    clave_pagina = f"comentarios_pagina_{hash((consulta, atencion, tamano, tuple(marcas), fecha_inicio, fecha_fin))}"
+    pagina = st.number_input("Página:", min_value=1, max_value=total_paginas, value=1, step=1, key=clave_pagina)
+    inicio = (pagina - 1) * tamano
+    
+    for row in comentarios.iloc[inicio:inicio + tamano].to_dict('records'):
+        fecha = row['Marca temporal'].strftime('%d/%m/%Y') if pd.notna(row['Marca temporal']) else 'sin fecha'
+        with st.expander(f"Comentario de {row['Marca']} - {fecha}"):
+            st.write(f"**Atención:** {row['Atencion_Cliente']}/5")
+            
+            # 🔴 MOSTRAR MÉTRICAS ESPECÍFICAS SEGÚN MARCA
+            if row['Marca'] == 'Costumatic':
+                st.write(f"**Satisfacción Productos:** {row['Satisfaccion_General']}/5")
+            elif row['Marca'] == 'Bordamatic':
+                st.write(f"**Tiempo Entrega:** {row['Tiempo_Entrega']}/5")
+                st.write(f"**Calidad Satisfactoria:** {row['Calidad_Trabajo']}")
+            
+            st.write(f"**Recomendaría:** {row['Recomendacion']}")
+            st.write(f"**Comentario:** {row['Comentarios']}")
+    
+    st.caption(
+        f"Comentarios {inicio + 1:,}–{min(inicio + tamano, len(comentarios)):,} de {len(comentarios):,}"
+        f" · página {pagina} de {total_paginas}"
+    )
+
+def sumar_celdas(tabla, marcas=None, fecha_inicio=None, fecha_fin=None, por=()):
+    """Sumar las celdas de las marcas y fechas pedidas, agrupadas por `por` ('Marca' y/o 'Mes')"""
+    marcas_celda = tabla.index.get_level_values('Marca')
+    dias = tabla.index.get_level_values('Dia')
+    mascara = np.ones(len(tabla), dtype=bool)
+    if marcas is not None:
+        mascara &= marcas_celda.isin(marcas)
+    if fecha_inicio is not None:
+        mascara &= dias >= pd.Timestamp(fecha_inicio)
+    if fecha_fin is not None:
+        mascara &= dias <= pd.Timestamp(fecha_fin)
+    
+    celdas = tabla[mascara]
+    claves = {'Marca': marcas_celda[mascara], 'Mes': dias[mascara].to_period('M')}
+    grupos = [claves[nivel].rename(nivel) for nivel in por] or [pd.Index(np.zeros(len(celdas), dtype=int))]
+    grupos.append(celdas.index.get_level_values('Metrica'))
+    return celdas.groupby(grupos).sum().unstack('Metrica', fill_value=0)
+
+def indicadores(sumas):
+    """Promedios (1-5), tasas (%) y total de respuestas por grupo a partir de las celdas sumadas"""
+    def campo(nombre, metrica):
+        return sumas[(nombre, metrica)] if (nombre, metrica) in sumas.columns else pd.Series(0.0, index=sumas.index)
+    
+    respuestas = campo('conteo', 'Respuestas')
+    resultado = {'Respuestas': respuestas}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for metrica in METRICAS_PROMEDIO:
+            resultado[metrica] = campo('suma', metrica) / campo('conteo', metrica).replace(0, np.nan)
+        for metrica in METRICAS_SI_NO:
+            resultado[metrica] = campo('si', metrica) / respuestas.replace(0, np.nan) * 100
+    return pd.DataFrame(resultado, index=sumas.index)
+
+def indicadores_totales(tabla, marcas=None, fecha_inicio=None, fecha_fin=None):
+    """Indicadores de todo el filtro en una sola fila (NaN si no hay respuestas)"""
+    totales = indicadores(sumar_celdas(tabla, marcas, fecha_inicio, fecha_fin))
+    return totales.reindex([0]).iloc[0]
+
+@trazar("mostrar_dashboard_satisfaccion", "render")
 def mostrar_dashboard_satisfaccion():
     # --- CONFIGURACIÓN STREAMLIT ---
     st.header("😊 Dashboard de Satisfacción al Cliente")
     st.caption("Datos actualizados desde Google Sheets - Costumatic & Bordamatic")
     
+    fase = Fases()
     try:
         # ✅ AUTENTICACIÓN
+        fase("autenticación google", "io")
         scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
         
         service_account_info = {
@@ -28,102 +339,64 @@ def mostrar_dashboard_satisfaccion():
         }
         
         creds = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, scope)
-        gc = gspread.authorize(creds)
+        gc = autorizar_gspread(creds)
     
         # Aquí necesitarás el Sheet ID de tus formularios de satisfacción
         sheet_id = st.secrets["gsheets"]["satisfaccion_cliente_sheet_id"]
-        sh = gc.open_by_key(sheet_id)
         
         # Leer las dos pestañas de formularios
-        costumatic_df = pd.DataFrame(sh.worksheet("respuesta_cliente_costumatic").get_all_records())
-        bordamatic_df = pd.DataFrame(sh.worksheet("respuesta_cliente_bordamatic").get_all_records())
+        fase("leer respuestas de formularios", "io")
+        # Respuestas de formulario: solo se descargan las filas nuevas desde la lectura anterior
+        pestañas = leer_hojas_incrementales(
+            gc, sheet_id, ["respuesta_cliente_costumatic", "respuesta_cliente_bordamatic"], registros=True
+        )
+        # --- PROCESAMIENTO DE DATOS ---
+        # Columnas y tipos según el esquema de cada formulario (renombra las preguntas largas) y
+        # valores limpios; solo se procesan las respuestas que llegaron desde la lectura anterior
+        fase("procesar respuestas", "compute")
+        respuestas = obtener_respuestas_preparadas()
+        costumatic_df, reconciliada_costumatic = respuestas.obtener(
+            'Costumatic', "satisfaccion_costumatic", pestañas["respuesta_cliente_costumatic"]
+        )
+        bordamatic_df, reconciliada_bordamatic = respuestas.obtener(
+            'Bordamatic', "satisfaccion_bordamatic", pestañas["respuesta_cliente_bordamatic"]
+        )
         
         st.success(f"✅ Datos cargados correctamente. Costumatic: {len(costumatic_df)} registros | Bordamatic: {len(bordamatic_df)} registros")
         
-        # --- PROCESAMIENTO DE DATOS ---
-        # Agregar identificador de marca
-        costumatic_df['Marca'] = 'Costumatic'
-        bordamatic_df['Marca'] = 'Bordamatic'
-        
-        # 🔴 RENOMBRADO DIFERENCIADO POR MARCA
-        costumatic_df = costumatic_df.rename(columns={
-            '¿Cómo calificarías nuestra atención al cliente?': 'Atencion_Cliente',
-            '¿Qué tan satisfecho está con los productos y servicios que ofrece Costumatic?': 'Satisfaccion_General',
-            '¿Nos recomendarías?': 'Recomendacion',
-            '¿Tienes algún comentario o sugerencia?': 'Comentarios'
-        })
-        
-        bordamatic_df = bordamatic_df.rename(columns={
-            '¿Cómo calificarías nuestra atención al cliente?': 'Atencion_Cliente',
-            '¿Cómo calificarías el tiempo de entrega?': 'Tiempo_Entrega',
-            '¿La calidad del trabajo fue la esperada?': 'Calidad_Trabajo',
-            '¿Nos recomendarías?': 'Recomendacion',
-            '¿Tienes algún comentario o sugerencia?': 'Comentarios'
-        })
-        
-        # Unificar dataframes
-        df_unificado = pd.concat([costumatic_df, bordamatic_df], ignore_index=True)
+        # Agregado por marca × día: solo se suman las respuestas que llegaron desde la última vez
+        agregado = obtener_agregado_satisfaccion()
+        agregado.actualizar('Costumatic', costumatic_df, reconciliada_costumatic)
+        tabla = agregado.actualizar('Bordamatic', bordamatic_df, reconciliada_bordamatic)
         
-        # --- LIMPIEZA Y CONVERSIÓN DE DATOS ---
-        # Convertir marca temporal a datetime
-        df_unificado['Marca temporal'] = pd.to_datetime(df_unificado['Marca temporal'])
-        df_unificado['Mes'] = df_unificado['Marca temporal'].dt.to_period('M')
-        
-        # 🔴 LIMPIEZA DE COLUMNAS NUMÉRICAS
-        columnas_numericas = ['Atencion_Cliente', 'Tiempo_Entrega', 'Satisfaccion_General']
-        for col in columnas_numericas:
-            if col in df_unificado.columns:
-                df_unificado[col] = pd.to_numeric(
-                    df_unificado[col].astype(str).str.strip(), 
-                    errors='coerce'
-                )
-        
-        # 🔴 FUNCIÓN PARA LIMPIAR VALORES SÍ/NO
-        def limpiar_si_no(valor):
-            if pd.isna(valor):
-                return valor
-            valor_str = str(valor).strip().lower()
-            if valor_str in ['Sí', 'si', 's', 'yes', 'y']:
-                return 'sí'
-            elif valor_str in ['No', 'n']:
-                return 'no'
-            return valor_str
-        
-        # Aplicar limpieza a columnas Sí/No
-        if 'Calidad_Trabajo' in df_unificado.columns:
-            df_unificado['Calidad_Trabajo'] = df_unificado['Calidad_Trabajo'].apply(limpiar_si_no)
-        
-        df_unificado['Recomendacion'] = df_unificado['Recomendacion'].apply(limpiar_si_no)
-        
-        # Limpiar comentarios
-        df_unificado['Comentarios'] = df_unificado['Comentarios'].astype(str).str.strip()
-        df_unificado['Comentarios'] = df_unificado['Comentarios'].replace({
-            'nan': '', 'None': '', '': ''
-        })
+        # Unificar dataframes (para los filtros y el detalle por marca)
+        df_unificado = pd.concat([costumatic_df, bordamatic_df], ignore_index=True)
         
         # --- SECCIÓN DE KPIs PRINCIPALES ---
+        fase("KPIs principales", "render")
         st.subheader("📊 KPIs Principales")
         
+        kpis = indicadores_totales(tabla)
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            csat_general = df_unificado['Atencion_Cliente'].mean()
+            csat_general = kpis['Atencion_Cliente']
             st.metric("CSAT General", f"{csat_general:.1f}/5", delta="0.2" if not pd.isna(csat_general) else "N/A")
         
         with col2:
-            tasa_recomendacion = (df_unificado['Recomendacion'] == 'sí').mean() * 100
+            tasa_recomendacion = kpis['Recomendacion']
             st.metric("Tasa Recomendación", f"{tasa_recomendacion:.1f}%", delta="3%")
         
         with col3:
-            total_respuestas = len(df_unificado)
+            total_respuestas = int(kpis['Respuestas']) if not pd.isna(kpis['Respuestas']) else 0
             st.metric("Total Respuestas", total_respuestas)
         
         with col4:
-            tasa_respuesta_comentarios = (df_unificado['Comentarios'].notna() & 
-                                        (df_unificado['Comentarios'] != '')).mean() * 100
+            tasa_respuesta_comentarios = kpis['Comentarios']
             st.metric("Feedback con Comentarios", f"{tasa_respuesta_comentarios:.1f}%")
         
         # --- FILTROS ---
+        fase("filtros", "render")
         st.subheader("🔍 Filtros")
         col1, col2, col3 = st.columns(3)
         
@@ -145,6 +418,7 @@ def mostrar_dashboard_satisfaccion():
             )
         
         with col3:
+            fecha_inicio = fecha_fin = None
             if len(rango_fechas) == 2:
                 fecha_inicio, fecha_fin = rango_fechas
                 df_filtrado = df_unificado[
@@ -155,15 +429,31 @@ def mostrar_dashboard_satisfaccion():
             else:
                 df_filtrado = df_unificado[df_unificado['Marca'].isin(marcas_seleccionadas)]
         
+        # Descarga de las respuestas filtradas (el archivo se genera solo al pedirlo)
+        version_respuestas = (
+            reconciliada_costumatic, len(costumatic_df), reconciliada_bordamatic, len(bordamatic_df),
+            tuple(marcas_seleccionadas), fecha_inicio, fecha_fin,
+        )
+        boton_exportar(
+            df_filtrado, "satisfaccion_cliente", version=str(version_respuestas), etiqueta="📥 Descargar respuestas"
+        )
+        
         # --- VISUALIZACIONES ---
+        fase("gráficos por marca", "render")
         st.subheader("📈 Análisis de Satisfacción")
         
+        # Indicadores del filtro por marca, sumando celdas del agregado
+        por_marca = indicadores(
+            sumar_celdas(tabla, marcas_seleccionadas, fecha_inicio, fecha_fin, por=('Marca',))
+        )
+        por_marca = por_marca[por_marca['Respuestas'] > 0]
+        
         col1, col2 = st.columns(2)
         
         with col1:
             # CSAT por Marca
             fig, ax = plt.subplots(figsize=(10, 6))
-            csat_por_marca = df_filtrado.groupby('Marca')['Atencion_Cliente'].mean()
+            csat_por_marca = por_marca['Atencion_Cliente'].dropna()
             colors = ['#FF6B6B', '#4ECDC4']
             
             if not csat_por_marca.empty:
@@ -185,9 +475,7 @@ def mostrar_dashboard_satisfaccion():
         with col2:
             # Tasa de Recomendación por Marca
             fig, ax = plt.subplots(figsize=(10, 6))
-            recomendacion_por_marca = df_filtrado.groupby('Marca')['Recomendacion'].apply(
-                lambda x: (x == 'sí').mean() * 100
-            )
+            recomendacion_por_marca = por_marca['Recomendacion']
             
             if not recomendacion_por_marca.empty:
                 bars = ax.bar(recomendacion_por_marca.index, recomendacion_por_marca.values, 
@@ -206,12 +494,14 @@ def mostrar_dashboard_satisfaccion():
                 st.info("No hay datos suficientes para mostrar recomendación por marca")
         
         # --- ANÁLISIS DETALLADO POR MARCA ---
+        fase("análisis detallado por marca", "render")
         st.subheader("🔬 Análisis Detallado por Marca")
         
         marca_seleccionada = st.selectbox("Selecciona una marca para análisis detallado:", 
                                          df_filtrado['Marca'].unique())
         
         df_marca = df_filtrado[df_filtrado['Marca'] == marca_seleccionada]
+        indicadores_marca = indicadores_totales(tabla, [marca_seleccionada], fecha_inicio, fecha_fin)
         
         # 🔴 ANÁLISIS DIFERENCIADO POR MARCA
         if marca_seleccionada == 'Costumatic':
@@ -219,7 +509,7 @@ def mostrar_dashboard_satisfaccion():
             col1, col2 = st.columns(2)
             
             with col1:
-                satisfaccion_productos = df_marca['Satisfaccion_General'].mean()
+                satisfaccion_productos = indicadores_marca['Satisfaccion_General']
                 st.metric("Satisfacción con Productos", f"{satisfaccion_productos:.1f}/5" if not pd.isna(satisfaccion_productos) else "N/A")
             
             with col2:
@@ -236,21 +526,21 @@ def mostrar_dashboard_satisfaccion():
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                tiempo_entrega = df_marca['Tiempo_Entrega'].mean()
+                tiempo_entrega = indicadores_marca['Tiempo_Entrega']
                 st.metric("Tiempo de Entrega", f"{tiempo_entrega:.1f}/5" if not pd.isna(tiempo_entrega) else "N/A")
             
             with col2:
-                calidad_trabajo = (df_marca['Calidad_Trabajo'] == 'sí').mean() * 100
+                calidad_trabajo = indicadores_marca['Calidad_Trabajo']
                 st.metric("Calidad Satisfactoria", f"{calidad_trabajo:.1f}%")
             
             with col3:
                 # Triple métrica para Bordamatic
                 fig, ax = plt.subplots(figsize=(10, 6))
                 metricas = ['Atencion_Cliente', 'Tiempo_Entrega']
-                promedios = [df_marca[metrica].mean() for metrica in metricas]
+                promedios = [indicadores_marca[metrica] for metrica in metricas]
                 
                 # Agregar calidad como porcentaje (escalado a 5)
-                calidad_escalada = (df_marca['Calidad_Trabajo'] == 'sí').mean() * 5
+                calidad_escalada = indicadores_marca['Calidad_Trabajo'] / 100 * 5
                 promedios.append(calidad_escalada)
                 
                 bars = ax.bar(['Atención', 'Tiempo Entrega', 'Calidad'], promedios, 
@@ -267,36 +557,25 @@ def mostrar_dashboard_satisfaccion():
                 st.pyplot(fig)
         
         # --- COMENTARIOS Y SUGERENCIAS ---
+        fase("comentarios", "render")
         st.subheader("💬 Comentarios y Sugerencias")
         
-        comentarios_df = df_filtrado[
-            (df_filtrado['Comentarios'].notna()) & 
-            (df_filtrado['Comentarios'] != '') &
-            (df_filtrado['Comentarios'] != 'nan')
-        ]
-        
-        if not comentarios_df.empty:
-            for idx, row in comentarios_df.iterrows():
-                with st.expander(f"Comentario de {row['Marca']} - {row['Marca temporal'].strftime('%d/%m/%Y')}"):
-                    st.write(f"**Atención:** {row['Atencion_Cliente']}/5")
-                    
-                    # 🔴 MOSTRAR MÉTRICAS ESPECÍFICAS SEGÚN MARCA
-                    if row['Marca'] == 'Costumatic' and 'Satisfaccion_General' in row:
-                        st.write(f"**Satisfacción Productos:** {row['Satisfaccion_General']}/5")
-                    elif row['Marca'] == 'Bordamatic':
-                        st.write(f"**Tiempo Entrega:** {row.get('Tiempo_Entrega', 'N/A')}/5")
-                        st.write(f"**Calidad Satisfactoria:** {row.get('Calidad_Trabajo', 'N/A')}")
-                    
-                    st.write(f"**Recomendaría:** {row['Recomendacion']}")
-                    st.write(f"**Comentario:** {row['Comentarios']}")
-        else:
-            st.info("No hay comentarios disponibles para el período seleccionado.")
+        # Solo se indexan los comentarios de las respuestas nuevas
+        feed = obtener_feed_comentarios()
+        feed.actualizar('Costumatic', costumatic_df, reconciliada_costumatic)
+        feed.actualizar('Bordamatic', bordamatic_df, reconciliada_bordamatic)
+        mostrar_feed_comentarios(feed, marcas_seleccionadas, fecha_inicio, fecha_fin)
         
         # --- TENDENCIAS TEMPORALES ---
+        fase("tendencias temporales", "render")
         st.subheader("📅 Evolución Temporal")
         
-        if len(df_filtrado) > 1:
-            tendencias = df_filtrado.groupby(['Mes', 'Marca'])['Atencion_Cliente'].mean().unstack()
+        # Meses enrollados desde las celdas diarias del agregado
+        por_mes = indicadores(
+            sumar_celdas(tabla, marcas_seleccionadas, fecha_inicio, fecha_fin, por=('Mes', 'Marca'))
+        )
+        if por_mes['Respuestas'].sum() > 1:
+            tendencias = por_mes['Atencion_Cliente'].unstack('Marca').dropna(how='all')
             
             if not tendencias.empty:
                 fig, ax = plt.subplots(figsize=(12, 6))
@@ -314,7 +593,10 @@ def mostrar_dashboard_satisfaccion():
             else:
                 st.info("No hay datos suficientes para mostrar tendencias temporales")
         
+        fase.terminar()
+        
     except Exception as e:
+        fase.terminar()
         st.error(f"❌ Error al cargar los datos: {str(e)}")
         st.info("""
         Para configurar este dashboard necesitas:
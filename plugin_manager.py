@@ -1,55 +1,204 @@
 # plugin_manager.py
 import streamlit as st
 import importlib
-import sys
+import importlib.metadata
+import importlib.util
+import threading
+import time
+
+# Plugins conocidos: se registran sin importarlos; el módulo se importa al activarlo
+PLUGINS_CONFIGURADOS = [
+    {"modulo": "modulo_ia_incidencias", "nombre": "Detección de Incidencias", "icono": "🚨"},
+    {"modulo": "modulo_ia_predicciones", "nombre": "Predicciones de Producción", "icono": "📈"},
+]
+
+# Plugins instalados como paquetes: entry points de este grupo ("nombre = paquete.modulo[:funcion]")
+GRUPO_ENTRY_POINTS = "dashboard_bordado.plugins"
+# Función del módulo que devuelve la configuración del plugin, si el entry point no nombra otra
+FUNCION_INTEGRACION = "integrar_en_produccion"
+
+# Tras un error de carga se vuelve a intentar pasado este tiempo (o antes con "Reintentar")
+REINTENTO_PLUGIN_SEG = 60
+# Segundos que una sesión espera el import que ya empezó otra antes de rendirse
+ESPERA_CARGA_PLUGIN_SEG = 120
+
+class RegistroPlugins:
+    """Registro de plugins del proceso: descubre una vez, importa al activar y mide tiempos"""
+
+    def __init__(self):
+        self.plugins = {}
+        self._lock = threading.Lock()
+        self._descubierto = False
+
+    def descubrir(self):
+        """Registrar metadatos de los plugins configurados y de entry points (sin importarlos)"""
+        with self._lock:
+            if self._descubierto:
+                return
+
+            candidatos = list(PLUGINS_CONFIGURADOS)
+            for entry_point in importlib.metadata.entry_points(group=GRUPO_ENTRY_POINTS):
+                candidatos.append({
+                    "modulo": entry_point.module,
+                    "funcion": entry_point.attr or FUNCION_INTEGRACION,
+                    "nombre": entry_point.name,
+                    "icono": "🔌",
+                })
+
+            for config in candidatos:
+                if config["nombre"] in self.plugins:
+                    continue
+                try:
+                    disponible = importlib.util.find_spec(config["modulo"]) is not None
+                except (ImportError, ValueError):
+                    disponible = False
+                self.plugins[config["nombre"]] = {
+                    'nombre': config["nombre"],
+                    'icono': config["icono"],
+                    'modulo_nombre': config["modulo"],
+                    'funcion_integracion': config.get("funcion", FUNCION_INTEGRACION),
+                    'disponible': disponible,
+                    'modulo': None,
+                    'funcion': None,
+                    'error': None,
+                    'error_en': None,
+                    'tiempo_carga_ms': None,
+                    'ejecuciones': 0,
+                    'tiempo_ultima_ejecucion_ms': None,
+                    'tiempo_total_ejecucion_ms': 0.0,
+                    # Un import a la vez por plugin; los demás plugins no esperan
+                    'lock_carga': threading.Lock(),
+                }
+            self._descubierto = True
+
+    def disponibles(self):
+        """Plugins cuyo módulo existe (importado o no)"""
+        return [p for p in self.plugins.values() if p['disponible']]
+
+    def activar(self, nombre):
+        """Importar el plugin la primera vez que se activa; devuelve su registro"""
+        plugin = self.plugins[nombre]
+        if not self._pendiente(plugin):
+            return plugin
+        # El lock global solo protege el estado; el import va bajo el lock del plugin, y quien
+        # llega mientras otra sesión lo importa espera y usa su resultado
+        if not plugin['lock_carga'].acquire(timeout=ESPERA_CARGA_PLUGIN_SEG):
+            return plugin
+        try:
+            if self._pendiente(plugin):
+                self._importar(plugin)
+        finally:
+            plugin['lock_carga'].release()
+        return plugin
+
+    def _pendiente(self, plugin):
+        """Si hay que (re)intentar el import: nunca cargó y no tiene un error reciente"""
+        with self._lock:
+            if plugin['funcion'] is not None:
+                return False
+            return plugin['error'] is None or time.monotonic() - plugin['error_en'] >= REINTENTO_PLUGIN_SEG
+
+    def _importar(self, plugin):
+        """Importar el módulo del plugin y guardar el resultado (o el error) en su registro"""
+        inicio = time.perf_counter()
+        try:
+            modulo = importlib.import_module(plugin['modulo_nombre'])
+            config = getattr(modulo, plugin['funcion_integracion'])()
+        except Exception as e:
+            with self._lock:
+                plugin['error'] = str(e)
+                plugin['error_en'] = time.monotonic()
+                plugin['tiempo_carga_ms'] = (time.perf_counter() - inicio) * 1000
+            return
+        with self._lock:
+            plugin['modulo'] = modulo
+            plugin['funcion'] = config['funcion']
+            plugin['icono'] = config.get('icono', plugin['icono'])
+            plugin['error'] = None
+            plugin['error_en'] = None
+            plugin['tiempo_carga_ms'] = (time.perf_counter() - inicio) * 1000
+
+    def reintentar(self, nombre):
+        """Olvidar el error de carga para que la próxima activación vuelva a importar"""
+        with self._lock:
+            self.plugins[nombre]['error_en'] = float("-inf")
+
+    def ejecutar(self, nombre, *args, **kwargs):
+        """Ejecutar el plugin registrando su tiempo de ejecución"""
+        plugin = self.activar(nombre)
+        if plugin['funcion'] is None:
+            raise RuntimeError(plugin['error'] or f"{nombre} todavía se está cargando")
+        inicio = time.perf_counter()
+        try:
+            return plugin['funcion'](*args, **kwargs)
+        finally:
+            duracion = (time.perf_counter() - inicio) * 1000
+            with self._lock:
+                plugin['ejecuciones'] += 1
+                plugin['tiempo_ultima_ejecucion_ms'] = duracion
+                plugin['tiempo_total_ejecucion_ms'] += duracion
+
+@st.cache_resource
+def obtener_registro_plugins():
+    """Registro único por proceso, compartido por todas las sesiones"""
+    registro = RegistroPlugins()
+    registro.descubrir()
+    return registro
 
 class PluginManager:
     def __init__(self):
+        self.registro = obtener_registro_plugins()
         self.plugins = []
-    
+
     def cargar_plugins(self):
-        """Carga todos los plugins disponibles"""
-        plugins_disponibles = [
-            "modulo_ia_incidencias",
-            "modulo_ia_predicciones" 
-        ]
-        
-        for plugin_name in plugins_disponibles:
-            try:
-                modulo = importlib.import_module(plugin_name)
-                if hasattr(modulo, 'integrar_en_produccion'):
-                    config = modulo.integrar_en_produccion()
-                    self.plugins.append({
-                        'nombre': config['nombre'],
-                        'icono': config['icono'],
-                        'funcion': config['funcion'],
-                        'modulo': modulo
-                    })
-                    st.sidebar.success(f"✅ {config['nombre']} cargado")
-            except ImportError as e:
-                st.sidebar.info(f"⚠️ {plugin_name} no disponible")
-            except Exception as e:
-                st.sidebar.error(f"❌ Error cargando {plugin_name}: {e}")
-    
+        """Lista los plugins disponibles (el descubrimiento ocurre una vez por proceso)"""
+        self.plugins = self.registro.disponibles()
+
     def mostrar_plugins(self, df_produccion=None, df_calculado=None):
         """Muestra la interfaz de plugins"""
         if not self.plugins:
             st.info("No hay plugins de IA disponibles")
             return
-        
+
         st.sidebar.markdown("---")
         st.sidebar.subheader("🤖 Plugins IA")
-        
+
         # Botones en sidebar para cada plugin
         plugin_activo = st.sidebar.radio(
             "Seleccionar Plugin:",
             [p['nombre'] for p in self.plugins],
             index=None
         )
-        
+
         # Mostrar plugin activo
         if plugin_activo:
-            plugin = next((p for p in self.plugins if p['nombre'] == plugin_activo), None)
-            if plugin:
+            plugin = self.registro.activar(plugin_activo)
+            if plugin['funcion'] is None and plugin['error'] is not None:
+                st.error(f"❌ Error cargando {plugin_activo}: {plugin['error']}")
+                if st.button("🔄 Reintentar", key=f"reintentar_{plugin_activo}"):
+                    self.registro.reintentar(plugin_activo)
+                    st.rerun()
+            elif plugin['funcion'] is None:
+                st.info(f"⏳ {plugin_activo} todavía se está cargando, vuelve a intentarlo en unos segundos")
+            else:
                 st.header(f"{plugin['icono']} {plugin['nombre']}")
-                plugin['funcion'](df_produccion, df_calculado)
+                self.registro.ejecutar(plugin_activo, df_produccion, df_calculado)
+
+        self.mostrar_estado_plugins()
+
+    def mostrar_estado_plugins(self):
+        """Estado y tiempos de carga/ejecución de cada plugin"""
+        with st.sidebar.expander("⏱️ Estado de plugins", expanded=False):
+            for plugin in self.registro.plugins.values():
+                if not plugin['disponible']:
+                    st.caption(f"⚠️ {plugin['nombre']}: no disponible")
+                elif plugin['error'] is not None:
+                    st.caption(f"❌ {plugin['nombre']}: {plugin['error']}")
+                elif plugin['funcion'] is None:
+                    st.caption(f"💤 {plugin['nombre']}: sin cargar")
+                else:
+                    promedio = plugin['tiempo_total_ejecucion_ms'] / max(plugin['ejecuciones'], 1)
+                    st.caption(
+                        f"✅ {plugin['nombre']}: carga {plugin['tiempo_carga_ms']:,.0f} ms · "
+                        f"{plugin['ejecuciones']} ejecuciones · promedio {promedio:,.0f} ms"
+                    )
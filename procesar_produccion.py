@@ -0,0 +1,64 @@
+# procesar_produccion.py
+"""Calcular puntadas y escribir puntadas_calculadas y resumen_ejecutivo sin abrir el dashboard.
+
+Pensado para ejecutarse programado (cron o un timer de systemd), por ejemplo cada 15 minutos:
+
+    python procesar_produccion.py --secrets /ruta/a/secrets.toml
+"""
+import argparse
+import os
+import sys
+from coordinacion import ejecutar_una_vez
+from modulo_produccion import (
+    CLAVE_MATERIALIZACION,
+    cargar_y_calcular_produccion,
+    conectar_produccion,
+    materializar_calculos,
+)
+
+# Mismo archivo de secretos que usa Streamlit
+RUTA_SECRETOS = os.path.join(".streamlit", "secrets.toml")
+
+def leer_secretos(ruta):
+    """Leer el archivo TOML de secretos ([gservice_account] y [gsheets])"""
+    try:
+        import tomllib
+    except ModuleNotFoundError:
+        # Python < 3.11: streamlit ya instala toml
+        import toml
+        return toml.load(ruta)
+    with open(ruta, "rb") as f:
+        return tomllib.load(f)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Calcula las puntadas y materializa puntadas_calculadas y resumen_ejecutivo en Google Sheets"
+    )
+    parser.add_argument("--secrets", default=RUTA_SECRETOS, help=f"archivo TOML de secretos (por defecto {RUTA_SECRETOS})")
+    parser.add_argument("--forzar", action="store_true", help="escribir aunque esta versión de datos ya esté materializada")
+    parser.add_argument("--sin-escribir", action="store_true", help="solo calcular y mostrar el resumen, sin escribir en Sheets")
+    args = parser.parse_args(argv)
+
+    try:
+        gc, sheet_id = conectar_produccion(leer_secretos(args.secrets))
+        df, df_calculado, version_datos = cargar_y_calcular_produccion(gc, sheet_id)
+        print(f"📊 {len(df)} registros · 🧵 {len(df_calculado)} cálculos · versión {version_datos}")
+
+        if df_calculado.empty or args.sin_escribir:
+            return 0
+
+        if args.forzar:
+            materializar_calculos(df_calculado, gc, sheet_id)
+            escrito = True
+        else:
+            escrito = ejecutar_una_vez(
+                CLAVE_MATERIALIZACION, version_datos, lambda: materializar_calculos(df_calculado, gc, sheet_id)
+            )
+        print("✅ Cálculos y resumen ejecutivo guardados" if escrito else "⏭️ Esta versión de datos ya estaba guardada")
+        return 0
+    except Exception as e:
+        print(f"❌ Error al procesar producción: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# series_tiempo.py
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# 📅 Frecuencias de agrupación (códigos de pandas Period), de la más fina a la más gruesa
+FRECUENCIAS = {"D": "Día", "W": "Semana", "M": "Mes"}
+DIAS_POR_PERIODO = {"D": 1, "W": 7}
+AUTOMATICA = "Automática"
+# Períodos que se aceptan antes de pasar a la frecuencia siguiente (modo automático)
+PUNTOS_OBJETIVO = 400
+# Tope de puntos por serie que viajan al navegador; por encima se reduce con LTTB
+MAX_PUNTOS = 1000
+
+def elegir_frecuencia(fechas, puntos_objetivo=PUNTOS_OBJETIVO):
+    """La frecuencia más fina con la que el rango visible queda en `puntos_objetivo` períodos o menos"""
+    fechas = pd.to_datetime(fechas).dropna()
+    if fechas.empty:
+        return "D"
+    dias = (fechas.max() - fechas.min()).days + 1
+    for frecuencia, dias_periodo in DIAS_POR_PERIODO.items():
+        if dias / dias_periodo <= puntos_objetivo:
+            return frecuencia
+    return "M"
+
+def agrupar_por_periodo(df, columna_fecha, agregaciones, frecuencia):
+    """Agregar las columnas por período (inicio del día, semana o mes) en la columna 'Fecha'"""
+    fechas = pd.to_datetime(df[columna_fecha])
+    periodo = fechas.dt.to_period(frecuencia).dt.start_time.rename("Fecha")
+    return df.groupby(periodo).agg(agregaciones).reset_index()
+
+def lttb(x, y, n):
+    """Largest-Triangle-Three-Buckets: posiciones de `n` puntos que conservan la forma de la serie
+    (picos y valles incluidos). `x` e `y` son arreglos numéricos ya ordenados por `x`."""
+    total = len(x)
+    if n >= total or n < 3:
+        return np.arange(total)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Cubetas para los puntos intermedios; el primero y el último siempre se conservan
+    bordes = np.linspace(1, total - 1, n - 1).astype(np.int64)
+    elegidos = np.empty(n, dtype=np.int64)
+    elegidos[0], elegidos[-1] = 0, total - 1
+
+    anterior = 0
+    for cubeta in range(n - 2):
+        inicio, fin = bordes[cubeta], bordes[cubeta + 1]
+        # Tercer vértice: el promedio de la cubeta siguiente
+        siguiente_fin = bordes[cubeta + 2] if cubeta + 2 < len(bordes) else total
+        x_medio = x[fin:siguiente_fin].mean()
+        y_medio = y[fin:siguiente_fin].mean()
+        areas = np.abs(
+            (x[anterior] - x_medio) * (y[inicio:fin] - y[anterior])
+            - (x[anterior] - x[inicio:fin]) * (y_medio - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        elegidos[cubeta + 1] = anterior
+    return elegidos
+
+def reducir_puntos(df, x, y, max_puntos=MAX_PUNTOS):
+    """Filas de `df` a graficar: todas si caben, si no las que elige LTTB sobre (x, y)"""
+    if len(df) <= max_puntos:
+        return df
+    datos = df.dropna(subset=[y]).sort_values(x)
+    valores_x = datos[x]
+    if pd.api.types.is_datetime64_any_dtype(valores_x):
+        valores_x = valores_x.astype("datetime64[ns]").astype(np.int64)
+    return datos.iloc[lttb(valores_x.to_numpy(), datos[y].to_numpy(), max_puntos)]
+
+def selector_frecuencia(fechas, clave, etiqueta="Agrupar por:"):
+    """Selectbox de frecuencia con opción automática según el rango visible; devuelve (código, nombre)"""
+    automatica = elegir_frecuencia(fechas)
+    opciones = [AUTOMATICA] + list(FRECUENCIAS)
+    eleccion = st.selectbox(
+        etiqueta, opciones, key=f"frecuencia_{clave}",
+        format_func=lambda f: f"{AUTOMATICA} ({FRECUENCIAS[automatica]})" if f == AUTOMATICA else FRECUENCIAS[f]
+    )
+    frecuencia = automatica if eleccion == AUTOMATICA else eleccion
+    return frecuencia, FRECUENCIAS[frecuencia]
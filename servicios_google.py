@@ -0,0 +1,318 @@
+# servicios_google.py
+import random
+import threading
+import time
+from typing import NamedTuple
+import gspread
+import requests
+from gspread.exceptions import APIError
+from googleapiclient.errors import HttpError
+
+# Cuotas por minuto de la cuenta de servicio (todas las sesiones comparten el mismo usuario).
+# Sheets API: 60 lecturas y 60 escrituras por minuto por usuario; Drive API es más holgada.
+CUOTAS_POR_MINUTO = {
+    "lectura": 60,
+    "escritura": 60,
+    "drive": 600,
+}
+
+# Reintentos con espera exponencial y jitter completo ante 429 y errores 5xx
+REINTENTOS_MAXIMOS = 6
+ESPERA_BASE_SEG = 1.0
+ESPERA_MAXIMA_SEG = 32.0
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+# Escrituras que dan lo mismo aplicadas una o dos veces (las demás, como values:append, solo se reintentan
+# ante 429: tras un 5xx o un timeout el servidor puede haberlas aplicado ya)
+METODOS_IDEMPOTENTES = {"GET", "PUT"}
+OPERACIONES_IDEMPOTENTES = ("values:batchUpdate", "values:batchGet", "values:batchClear")
+
+# Segundos que una sesión espera la descarga que ya hizo otra antes de rendirse
+TIEMPO_MAXIMO_CARGA_SEG = 120
+
+# 📥 Lectura incremental de pestañas de Google Forms (solo crecen)
+# Cada cuánto se descarga la pestaña completa para recoger ediciones o filas borradas
+INTERVALO_RECONCILIACION_SEG = 30 * 60
+# Lecturas más seguidas que esto reutilizan la copia local sin llamar a la API
+INTERVALO_MINIMO_DELTA_SEG = 10
+# Columnas extra que se piden más allá del encabezado, para notar si el formulario agregó preguntas
+COLUMNAS_EXTRA_DELTA = 5
+
+class CubetaTokens:
+    """Token bucket: permite ráfagas de hasta `capacidad` llamadas y repone `por_minuto` por minuto"""
+
+    def __init__(self, por_minuto, capacidad=None):
+        self.tasa = por_minuto / 60.0
+        self.capacidad = capacidad or por_minuto
+        self.tokens = float(self.capacidad)
+        self.ultima = time.monotonic()
+        self._lock = threading.Lock()
+
+    def tomar(self):
+        """Bloquear hasta que haya un token disponible; devuelve los segundos esperados"""
+        esperado = 0.0
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultima) * self.tasa)
+                self.ultima = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return esperado
+                espera = (1 - self.tokens) / self.tasa
+            time.sleep(espera)
+            esperado += espera
+
+# Limitadores únicos por proceso
+LIMITADORES = {tipo: CubetaTokens(por_minuto) for tipo, por_minuto in CUOTAS_POR_MINUTO.items()}
+
+def codigo_estado(error):
+    """Código HTTP de un error de gspread o de googleapiclient (None si no aplica)"""
+    if isinstance(error, APIError):
+        return error.response.status_code
+    if isinstance(error, HttpError):
+        return error.resp.status
+    return None
+
+def _es_reintentable(error, idempotente=True):
+    if not idempotente:
+        return codigo_estado(error) == 429
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    return codigo_estado(error) in CODIGOS_REINTENTABLES
+
+def _espera_sugerida(error):
+    """Retry-After del servidor, si lo envió"""
+    try:
+        if isinstance(error, APIError):
+            valor = error.response.headers.get("Retry-After")
+        elif isinstance(error, HttpError):
+            valor = error.resp.get("retry-after")
+        else:
+            valor = None
+        return float(valor) if valor else None
+    except (TypeError, ValueError):
+        return None
+
+def llamar_con_reintentos(funcion, *args, tipo="lectura", idempotente=True, **kwargs):
+    """Llamar a la API respetando la cuota del tipo de llamada y reintentando 429/5xx
+    (las llamadas no idempotentes solo ante 429, para no aplicarlas dos veces)"""
+    for intento in range(REINTENTOS_MAXIMOS):
+        LIMITADORES[tipo].tomar()
+        try:
+            return funcion(*args, **kwargs)
+        except Exception as e:
+            if not _es_reintentable(e, idempotente) or intento == REINTENTOS_MAXIMOS - 1:
+                raise
+            espera = random.uniform(0, min(ESPERA_MAXIMA_SEG, ESPERA_BASE_SEG * 2 ** intento))
+            time.sleep(max(espera, _espera_sugerida(e) or 0))
+
+def ejecutar_drive(solicitud):
+    """Ejecutar una solicitud de googleapiclient (Drive) con cuota y reintentos"""
+    return llamar_con_reintentos(solicitud.execute, tipo="drive")
+
+class CargaUnica:
+    """Single-flight: llamadas simultáneas con la misma clave comparten una sola descarga"""
+
+    def __init__(self):
+        self._en_curso = {}
+        self._lock = threading.Lock()
+
+    def cargar(self, clave, funcion, timeout=TIEMPO_MAXIMO_CARGA_SEG):
+        """El primero en llegar descarga; los demás esperan su resultado (o su excepción)"""
+        with self._lock:
+            vuelo = self._en_curso.get(clave)
+            es_lider = vuelo is None
+            if es_lider:
+                vuelo = {"listo": threading.Event(), "resultado": None, "error": None}
+                self._en_curso[clave] = vuelo
+
+        if es_lider:
+            try:
+                vuelo["resultado"] = funcion()
+            except BaseException as e:
+                vuelo["error"] = e
+                raise
+            finally:
+                with self._lock:
+                    self._en_curso.pop(clave, None)
+                vuelo["listo"].set()
+            return vuelo["resultado"]
+
+        if not vuelo["listo"].wait(timeout):
+            raise TimeoutError(f"La descarga de {clave} tardó más de {timeout} s")
+        if vuelo["error"] is not None:
+            raise vuelo["error"]
+        return vuelo["resultado"]
+
+# Única por proceso: las sesiones de Streamlit son hilos del mismo proceso
+CARGAS = CargaUnica()
+
+def leer_hojas(gc, sheet_id, nombres_hojas, registros=False):
+    """Descargar varias pestañas de un spreadsheet; devuelve {pestaña: get_all_values() o get_all_records()}"""
+    tipo = "registros" if registros else "valores"
+    spreadsheet = None
+
+    def descargar(nombre_hoja):
+        nonlocal spreadsheet
+        if spreadsheet is None:
+            spreadsheet = gc.open_by_key(sheet_id)
+        hoja = spreadsheet.worksheet(nombre_hoja)
+        return hoja.get_all_records() if registros else hoja.get_all_values()
+
+    return {
+        nombre_hoja: CARGAS.cargar((sheet_id, nombre_hoja, tipo), lambda: descargar(nombre_hoja))
+        for nombre_hoja in nombres_hojas
+    }
+
+def leer_hoja(gc, sheet_id, nombre_hoja, registros=False):
+    """Descargar una pestaña (compartiendo la descarga con otras sesiones que la pidan a la vez)"""
+    return leer_hojas(gc, sheet_id, [nombre_hoja], registros)[nombre_hoja]
+
+class LecturaHoja(NamedTuple):
+    datos: list       # como get_all_values() (encabezado + filas) o get_all_records()
+    nuevas: int       # filas agregadas desde la lectura anterior
+    completa: bool    # True si esta vez se descargó la pestaña entera
+    reconciliada_en: float  # time.monotonic() de la última descarga completa (cambia si se reescribieron filas)
+
+def _columna(numero):
+    """Letra de la columna (1 → A, 27 → AA)"""
+    return gspread.utils.rowcol_to_a1(1, numero).rstrip("0123456789")
+
+def _a_registros(encabezado, filas):
+    """Filas → dicts con números convertidos, igual que get_all_records()"""
+    return [dict(zip(encabezado, gspread.utils.numericise_all(fila))) for fila in filas]
+
+class HojaIncremental:
+    """Copia local de una pestaña que solo crece (destino de Google Forms).
+
+    Cada lectura pide solo `A{n+1}:<última columna>`, así el costo depende de las filas nuevas.
+    Cada INTERVALO_RECONCILIACION_SEG se descarga completa para recoger ediciones y borrados,
+    y también cuando una fila nueva trae más columnas que el encabezado (pregunta agregada).
+    """
+
+    def __init__(self, sheet_id, nombre_hoja):
+        self.sheet_id = sheet_id
+        self.nombre_hoja = nombre_hoja
+        self.valores = None
+        self.registros = None
+        self.hoja = None
+        self.ultima_reconciliacion = 0.0
+        self.ultima_consulta = 0.0
+        self._lock = threading.Lock()
+
+    def _worksheet(self, gc):
+        if self.hoja is None:
+            self.hoja = gc.open_by_key(self.sheet_id).worksheet(self.nombre_hoja)
+        return self.hoja
+
+    def _leer_completa(self, gc):
+        previas = len(self.valores) if self.valores else 1
+        self.valores = self._worksheet(gc).get_all_values() or [[]]
+        self.registros = None
+        self.ultima_reconciliacion = time.monotonic()
+        return max(len(self.valores) - previas, 0)
+
+    def _leer_delta(self, gc):
+        encabezado = self.valores[0]
+        ancho = len(encabezado)
+        inicio = len(self.valores) + 1
+        hoja = self._worksheet(gc)
+        if inicio > hoja.row_count:
+            # Pedir filas fuera de la cuadrícula da 400; el tamaño guardado puede ser viejo, así que se reabre
+            self.hoja = None
+            hoja = self._worksheet(gc)
+            if inicio > hoja.row_count:
+                return 0
+        if hoja.col_count < ancho:
+            return None
+        columnas = min(ancho + COLUMNAS_EXTRA_DELTA, hoja.col_count)
+        rango = f"A{inicio}:{_columna(columnas)}{hoja.row_count}"
+        filas = [list(fila) for fila in hoja.get(rango)]
+        if any(len(fila) > ancho for fila in filas):
+            return None
+        filas = [fila + [""] * (ancho - len(fila)) for fila in filas]
+        if filas:
+            # Listas nuevas (no extend): quien ya tiene la lectura anterior no la ve cambiar
+            self.valores = self.valores + filas
+            if self.registros is not None:
+                self.registros = self.registros + _a_registros(encabezado, filas)
+        return len(filas)
+
+    def leer(self, gc, registros=False):
+        with self._lock:
+            ahora = time.monotonic()
+            completa = False
+            if self.valores is not None and ahora - self.ultima_consulta < INTERVALO_MINIMO_DELTA_SEG:
+                nuevas = 0
+            else:
+                self.ultima_consulta = ahora
+                try:
+                    if self.valores is None or not self.valores[0] or \
+                            ahora - self.ultima_reconciliacion > INTERVALO_RECONCILIACION_SEG:
+                        nuevas, completa = self._leer_completa(gc), True
+                    else:
+                        try:
+                            nuevas = self._leer_delta(gc)
+                        except Exception:
+                            # Un delta fallido no debe repetirse en cada rerun: se cae a la lectura completa
+                            self.hoja = None
+                            nuevas = None
+                        if nuevas is None:
+                            nuevas, completa = self._leer_completa(gc), True
+                except Exception:
+                    # La próxima lectura vuelve a abrir la pestaña
+                    self.hoja = None
+                    raise
+            if not registros:
+                return LecturaHoja(self.valores, nuevas, completa, self.ultima_reconciliacion)
+            if self.registros is None:
+                self.registros = _a_registros(self.valores[0], self.valores[1:])
+            return LecturaHoja(self.registros, nuevas, completa, self.ultima_reconciliacion)
+
+_hojas_incrementales = {}
+_lock_hojas_incrementales = threading.Lock()
+
+def leer_hoja_incremental(gc, sheet_id, nombre_hoja, registros=False):
+    """Leer una pestaña de respuestas de formulario trayendo solo las filas nuevas; devuelve LecturaHoja"""
+    with _lock_hojas_incrementales:
+        hoja = _hojas_incrementales.setdefault((sheet_id, nombre_hoja), HojaIncremental(sheet_id, nombre_hoja))
+    return hoja.leer(gc, registros)
+
+def leer_hojas_incrementales(gc, sheet_id, nombres_hojas, registros=False):
+    """Como leer_hojas, pero para pestañas que solo crecen: {pestaña: LecturaHoja}"""
+    return {nombre_hoja: leer_hoja_incremental(gc, sheet_id, nombre_hoja, registros) for nombre_hoja in nombres_hojas}
+
+def _tipo_por_metodo(method):
+    return "lectura" if method.upper() == "GET" else "escritura"
+
+def _es_idempotente(method, endpoint):
+    return method.upper() in METODOS_IDEMPOTENTES or str(endpoint).endswith(OPERACIONES_IDEMPOTENTES)
+
+if hasattr(gspread, "http_client"):
+    # gspread >= 6: todas las llamadas pasan por HTTPClient.request
+    class HTTPClientLimitado(gspread.http_client.HTTPClient):
+        """Cliente HTTP de gspread que pasa cada llamada por el limitador y los reintentos"""
+
+        def request(self, method, endpoint, *args, **kwargs):
+            return llamar_con_reintentos(
+                super().request, method, endpoint, *args, tipo=_tipo_por_metodo(method),
+                idempotente=_es_idempotente(method, endpoint), **kwargs
+            )
+
+    def autorizar_gspread(creds):
+        """gspread.authorize con limitador de cuota y reintentos"""
+        return gspread.authorize(creds, http_client=HTTPClientLimitado)
+else:
+    # gspread 5.x: todas las llamadas pasan por Client.request
+    class ClienteLimitado(gspread.Client):
+        """Cliente de gspread que pasa cada llamada por el limitador y los reintentos"""
+
+        def request(self, method, endpoint, *args, **kwargs):
+            return llamar_con_reintentos(
+                super().request, method, endpoint, *args, tipo=_tipo_por_metodo(method),
+                idempotente=_es_idempotente(method, endpoint), **kwargs
+            )
+
+    def autorizar_gspread(creds):
+        """gspread.authorize con limitador de cuota y reintentos"""
+        return gspread.authorize(creds, client_factory=ClienteLimitado)
@@ -0,0 +1,188 @@
+# tabla_paginada.py
+import threading
+from collections import OrderedDict, defaultdict
+import numpy as np
+import pandas as pd
+import streamlit as st
+from exportaciones import version_dataframe
+from indice_texto import PATRON_PALABRAS, IndiceInvertido, normalizar_texto, tokenizar
+from trazas import registrar_cache, span
+
+TAMANOS_PAGINA = [25, 50, 100, 200]
+# Tablas indexadas que se conservan en el proceso (las más antiguas se descartan)
+MAX_TABLAS = 8
+SIN_ORDEN = "(sin ordenar)"
+
+def _tokens_valores(serie):
+    """Códigos por fila y tokens de cada valor distinto de la columna (las fechas se indexan por día)"""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        serie = serie.dt.strftime("%d/%m/%Y")
+    codigos, valores = pd.factorize(serie)
+    textos = pd.Series(valores, dtype=object).astype(str).str.lower()
+    # Solo los textos con acentos pasan por la normalización completa
+    con_acentos = ~textos.map(str.isascii)
+    textos[con_acentos] = textos[con_acentos].map(normalizar_texto)
+    return codigos, textos.str.findall(PATRON_PALABRAS)
+
+class IndiceTabla:
+    """Índices de una versión de un DataFrame para paginar en el servidor.
+
+    - Texto: un IndiceInvertido sobre los valores distintos de cada columna (no sobre cada
+      fila), así el costo depende de la cardinalidad; las filas salen de los códigos.
+    - Orden: por columna y sentido, el rango de cada fila; se calcula la primera vez que se pide.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._indice = None
+        self._codigos = {}
+        self._rangos = {}
+        self._lock = threading.Lock()
+
+    def _indice_texto(self):
+        if self._indice is None:
+            indice = IndiceInvertido()
+            for posicion in range(self.df.shape[1]):
+                codigos, tokens = _tokens_valores(self.df.iloc[:, posicion])
+                for codigo, tokens_valor in enumerate(tokens):
+                    indice.agregar((posicion, codigo), tokens_valor)
+                self._codigos[posicion] = codigos
+            self._indice = indice
+        return self._indice
+
+    def buscar(self, consulta):
+        """Posiciones de las filas que contienen todas las palabras de la consulta (por prefijo)"""
+        terminos = tokenizar(consulta)
+        if not terminos:
+            return np.arange(len(self.df))
+        with self._lock:
+            indice = self._indice_texto()
+            coincide = np.ones(len(self.df), dtype=bool)
+            for termino in terminos:
+                codigos_por_columna = defaultdict(list)
+                for posicion, codigo in indice.buscar_termino(termino, aproximado=False):
+                    codigos_por_columna[posicion].append(codigo)
+                con_termino = np.zeros(len(self.df), dtype=bool)
+                for posicion, codigos in codigos_por_columna.items():
+                    con_termino |= np.isin(self._codigos[posicion], codigos)
+                coincide &= con_termino
+        return np.flatnonzero(coincide)
+
+    def _rango(self, posicion, ascendente):
+        clave = (posicion, ascendente)
+        with self._lock:
+            if clave not in self._rangos:
+                serie = self.df.iloc[:, posicion].reset_index(drop=True)
+                try:
+                    orden = serie.sort_values(ascending=ascendente, kind="stable", na_position="last").index
+                except TypeError:
+                    # Columna con tipos mezclados: ordenar por su texto
+                    orden = serie.astype(str).sort_values(ascending=ascendente, kind="stable").index
+                rango = np.empty(len(serie), dtype=np.int64)
+                rango[orden.to_numpy()] = np.arange(len(serie))
+                self._rangos[clave] = rango
+            return self._rangos[clave]
+
+    def tamano_bytes(self):
+        """Tamaño aproximado de los índices (el DataFrame es del módulo, no se cuenta)"""
+        with self._lock:
+            arreglos = sum(arreglo.nbytes for arreglo in [*self._codigos.values(), *self._rangos.values()])
+            # Entradas del índice de texto: unos 100 bytes por par token-valor
+            texto = 100 * self._indice.entradas() if self._indice is not None else 0
+        return arreglos + texto
+
+    def filas(self, consulta="", posicion_orden=None, ascendente=True):
+        """Posiciones de las filas filtradas y ordenadas por la columna en `posicion_orden`"""
+        filas = self.buscar(consulta)
+        if posicion_orden is not None:
+            filas = filas[np.argsort(self._rango(posicion_orden, ascendente)[filas], kind="stable")]
+        return filas
+
+@st.cache_resource
+def obtener_almacen_tablas():
+    """Índices por (nombre, versión), compartidos por todas las sesiones"""
+    return {'lock': threading.Lock(), 'tablas': OrderedDict()}
+
+def _tamano_tablas():
+    almacen = obtener_almacen_tablas()
+    with almacen['lock']:
+        tablas = list(almacen['tablas'].values())
+    return sum(tabla.tamano_bytes() for tabla in tablas)
+
+def _descartar_tabla_antigua():
+    """Descartar los índices de la tabla menos usada (se reconstruyen al usarse)"""
+    almacen = obtener_almacen_tablas()
+    with almacen['lock']:
+        if not almacen['tablas']:
+            return False
+        almacen['tablas'].popitem(last=False)
+        return True
+
+registrar_cache(_tamano_tablas, _descartar_tabla_antigua)
+
+def obtener_indice_tabla(df, nombre, version):
+    almacen = obtener_almacen_tablas()
+    with almacen['lock']:
+        clave = (nombre, version)
+        if clave not in almacen['tablas']:
+            almacen['tablas'][clave] = IndiceTabla(df)
+            while len(almacen['tablas']) > MAX_TABLAS:
+                almacen['tablas'].popitem(last=False)
+        almacen['tablas'].move_to_end(clave)
+        return almacen['tablas'][clave]
+
+def mostrar_tabla_paginada(df, nombre, version=None, clave=None, columnas=None, filas_por_pagina=50):
+    """Tabla que se queda en el servidor: búsqueda y orden con índices, y al navegador solo
+    viaja la página visible con las columnas elegidas"""
+    clave = clave or nombre
+    if df is None or df.empty:
+        st.info("No hay datos para mostrar.")
+        return
+    if version is None:
+        version = version_dataframe(df)
+    tabla = obtener_indice_tabla(df, nombre, version)
+    todas = [str(col) for col in df.columns]
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        consulta = st.text_input("🔍 Buscar:", key=f"tabla_buscar_{clave}", placeholder="Palabras o números...")
+    with col2:
+        columna_orden = st.selectbox("Ordenar por:", [SIN_ORDEN] + todas, key=f"tabla_orden_{clave}")
+    with col3:
+        sentido = st.radio("Sentido:", ["⬆️ Asc", "⬇️ Desc"], horizontal=True, key=f"tabla_sentido_{clave}")
+
+    col4, col5 = st.columns([3, 1])
+    with col4:
+        visibles = st.multiselect(
+            "Columnas:", todas, default=[c for c in (columnas or todas) if c in todas], key=f"tabla_columnas_{clave}"
+        )
+    with col5:
+        tamano = st.selectbox(
+            "Filas por página:", TAMANOS_PAGINA,
+            index=TAMANOS_PAGINA.index(filas_por_pagina) if filas_por_pagina in TAMANOS_PAGINA else 1,
+            key=f"tabla_tamano_{clave}"
+        )
+
+    with span(f"paginar {nombre}", filas=len(df)):
+        filas = tabla.filas(
+            consulta,
+            None if columna_orden == SIN_ORDEN else todas.index(columna_orden),
+            ascendente=sentido.startswith("⬆️"),
+        )
+
+    total_paginas = max(1, -(-len(filas) // tamano))
+    # La página vuelve a 1 cuando cambia la búsqueda, el orden o el tamaño
+    clave_pagina = f"tabla_pagina_{clave}_{hash((consulta, columna_orden, sentido, tamano, version))}"
+    pagina = st.number_input("Página:", min_value=1, max_value=total_paginas, value=1, step=1, key=clave_pagina)
+
+    inicio = (pagina - 1) * tamano
+    posiciones_visibles = [todas.index(c) for c in visibles] or list(range(len(todas)))
+    st.dataframe(
+        df.iloc[filas[inicio:inicio + tamano], posiciones_visibles],
+        use_container_width=True, hide_index=True
+    )
+    filtro = f" (de {len(df):,} en total)" if len(filas) != len(df) else ""
+    st.caption(
+        f"Filas {min(inicio + 1, len(filas)):,}–{min(inicio + tamano, len(filas)):,} de {len(filas):,}{filtro}"
+        f" · página {pagina} de {total_paginas}"
+    )
@@ -0,0 +1,272 @@
+# trazas.py
+import functools
+import gc
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+import streamlit as st
+
+# Archivo JSON-lines donde se agregan los spans de cada rerun (análisis fuera de línea)
+RUTA_LOG_TRAZAS = os.environ.get("DASHBOARD_TRAZAS_LOG", os.path.join("logs", "trazas.jsonl"))
+
+# Categorías de los spans: importaciones, I/O con Google, cálculo con pandas, dibujo de la interfaz
+CATEGORIAS = ("import", "io", "compute", "render")
+
+# 🧠 Presupuesto de memoria residente del proceso (MB): solo se informa. CPython casi nunca devuelve
+# al sistema la memoria liberada, así que la RSS no baja y no sirve para decidir cuándo vaciar cachés
+PRESUPUESTO_MEMORIA_MB = float(os.environ.get("DASHBOARD_PRESUPUESTO_MEMORIA_MB", "512"))
+# Presupuesto de las cachés registradas (MB), medido con su propio tamaño: al pasarlo se descartan
+# sus entradas menos usadas hasta bajar a la fracción objetivo (histéresis, no se vacían enteras)
+PRESUPUESTO_CACHES_MB = float(os.environ.get("DASHBOARD_PRESUPUESTO_CACHES_MB", "192"))
+FRACCION_OBJETIVO_CACHES = 0.8
+# Con DASHBOARD_TRACEMALLOC=1 cada span registra también el pico de memoria asignada por Python
+# (tracemalloc cuesta tiempo y memoria: activarlo solo para medir)
+if os.environ.get("DASHBOARD_TRACEMALLOC") == "1" and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+_caches = []
+
+# Cada sesión de Streamlit ejecuta su script en su propio hilo
+_estado = threading.local()
+_lock_log = threading.Lock()
+
+def memoria_rss_mb():
+    """Memoria residente actual del proceso en MB (en sistemas sin /proc, el máximo alcanzado)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo / (2**20 if sys.platform == "darwin" else 2**10)
+
+def registrar_cache(tamano, descartar_antigua):
+    """Registrar una caché para el presupuesto: `tamano()` da sus bytes y `descartar_antigua()`
+    suelta su entrada menos usada (devuelve False si ya no tenía ninguna)"""
+    _caches.append((tamano, descartar_antigua))
+
+def _tamano_cache(cache):
+    try:
+        return cache[0]()
+    except Exception:
+        return 0
+
+def tamano_caches_mb():
+    """Tamaño total de las cachés registradas en MB"""
+    return sum(_tamano_cache(cache) for cache in _caches) / 2**20
+
+def _controlar_caches():
+    """Si las cachés pasan su presupuesto, descartar entradas LRU (de la caché más grande primero)
+    hasta bajar al objetivo; devuelve los MB liberados"""
+    inicial = total = tamano_caches_mb()
+    if total <= PRESUPUESTO_CACHES_MB:
+        return 0.0
+    while total > PRESUPUESTO_CACHES_MB * FRACCION_OBJETIVO_CACHES:
+        tamanos = [(_tamano_cache(cache), cache) for cache in _caches]
+        tamano, cache = max(tamanos, key=lambda item: item[0])
+        try:
+            if tamano == 0 or not cache[1]():
+                break
+        except Exception:
+            break
+        total = tamano_caches_mb()
+    gc.collect()
+    return inicial - total
+
+def iniciar_rerun(pagina):
+    """Empezar a registrar los spans de un rerun"""
+    _estado.rerun = {
+        "rerun_id": uuid.uuid4().hex[:12],
+        "pagina": pagina,
+        "inicio": time.perf_counter(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "spans": [],
+        "contador": 0,
+        "rss_proceso_inicio_mb": memoria_rss_mb(),
+    }
+    _estado.pila = []
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+def rerun_actual():
+    return getattr(_estado, "rerun", None)
+
+@contextmanager
+def span(nombre, categoria="compute", **atributos):
+    """Medir un bloque; los spans anidados guardan quién es su padre"""
+    rerun = rerun_actual()
+    if rerun is None:
+        yield {}
+        return
+
+    pila = _estado.pila
+    registro = {
+        "span_id": rerun["contador"],
+        "nombre": nombre,
+        "categoria": categoria,
+        "padre": pila[-1]["span_id"] if pila else None,
+        "profundidad": len(pila),
+        "inicio_ms": (time.perf_counter() - rerun["inicio"]) * 1000,
+        **atributos,
+    }
+    midiendo = tracemalloc.is_tracing()
+    if midiendo:
+        # El pico de tracemalloc es uno solo: se guarda el del padre antes de reiniciarlo para el hijo
+        asignado_inicio, pico = tracemalloc.get_traced_memory()
+        if pila:
+            pila[-1]["_pico"] = max(pila[-1].get("_pico", 0), pico)
+        tracemalloc.reset_peak()
+    rss_inicio = memoria_rss_mb()
+    pila.append(registro)
+    rerun["contador"] += 1
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except Exception as e:
+        registro["error"] = str(e)
+        raise
+    finally:
+        registro["duracion_ms"] = (time.perf_counter() - inicio) * 1000
+        rss_fin = memoria_rss_mb()
+        if rss_fin is not None and rss_inicio is not None:
+            registro["rss_proceso_mb"] = rss_fin
+            registro["rss_proceso_delta_mb"] = rss_fin - rss_inicio
+        if midiendo and tracemalloc.is_tracing():
+            asignado_fin, pico = tracemalloc.get_traced_memory()
+            pico = max(registro.pop("_pico", 0), pico)
+            registro["pico_mb"] = (pico - asignado_inicio) / 2**20
+            registro["asignado_mb"] = (asignado_fin - asignado_inicio) / 2**20
+            if len(pila) > 1:
+                pila[-2]["_pico"] = max(pila[-2].get("_pico", 0), pico)
+            tracemalloc.reset_peak()
+        pila.pop()
+        rerun["spans"].append(registro)
+
+def trazar(nombre=None, categoria="compute"):
+    """Decorador: cada llamada a la función queda registrada como un span"""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with span(nombre or funcion.__name__, categoria):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+class Fases:
+    """Fases consecutivas de una función larga: cada fase termina cuando empieza la siguiente"""
+
+    def __init__(self):
+        self._actual = None
+
+    def __call__(self, nombre, categoria="compute"):
+        self.terminar()
+        self._actual = span(nombre, categoria)
+        self._actual.__enter__()
+
+    def terminar(self):
+        """Cerrar la fase abierta (llamar también en el manejo de errores)"""
+        if self._actual is not None:
+            actual, self._actual = self._actual, None
+            actual.__exit__(None, None, None)
+
+def finalizar_rerun():
+    """Cerrar el rerun actual y agregar sus spans al log JSON-lines"""
+    rerun = rerun_actual()
+    if rerun is None:
+        return None
+    rerun["duracion_ms"] = (time.perf_counter() - rerun["inicio"]) * 1000
+    rerun.pop("contador")
+    rss_mb = memoria_rss_mb()
+    rerun["rss_proceso_mb"] = rss_mb
+    rerun["excede_presupuesto"] = rss_mb is not None and rss_mb > PRESUPUESTO_MEMORIA_MB
+    rerun["caches_liberadas_mb"] = _controlar_caches()
+    rerun["caches_mb"] = tamano_caches_mb()
+    if tracemalloc.is_tracing():
+        rerun["pico_mb"] = max([registro.get("pico_mb", 0) for registro in rerun["spans"]] or [0])
+    rerun["spans"].sort(key=lambda registro: registro["inicio_ms"])
+    _estado.rerun = None
+
+    try:
+        lineas = [
+            json.dumps({
+                "rerun_id": rerun["rerun_id"],
+                "fecha": rerun["fecha"],
+                "pagina": rerun["pagina"],
+                "rerun_ms": round(rerun["duracion_ms"], 2),
+                "rerun_rss_proceso_mb": round(rss_mb, 1) if rss_mb is not None else None,
+                "excede_presupuesto": rerun["excede_presupuesto"],
+                "caches_mb": round(rerun["caches_mb"], 1),
+                **{clave: round(valor, 2) if isinstance(valor, float) else valor for clave, valor in registro.items()},
+            }, ensure_ascii=False, default=str)
+            for registro in rerun["spans"]
+        ]
+        if lineas:
+            directorio = os.path.dirname(RUTA_LOG_TRAZAS)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            with _lock_log, open(RUTA_LOG_TRAZAS, "a", encoding="utf-8") as f:
+                f.write("\n".join(lineas) + "\n")
+    except OSError:
+        # Las trazas nunca deben tumbar el dashboard
+        pass
+
+    return rerun
+
+def mostrar_panel_rendimiento(rerun):
+    """Desglose del rerun en un panel plegable del sidebar"""
+    if rerun is None:
+        return
+    with st.sidebar.expander("🔬 Rendimiento de este rerun", expanded=False):
+        st.caption(f"Total: {rerun['duracion_ms']:,.0f} ms · {len(rerun['spans'])} spans")
+        if rerun.get("rss_proceso_mb") is not None:
+            # RSS y tracemalloc miden el proceso entero: incluyen a las demás sesiones abiertas
+            pico = f" · pico Python {rerun['pico_mb']:,.1f} MB" if "pico_mb" in rerun else ""
+            st.caption(
+                f"Memoria del proceso (todas las sesiones): {rerun['rss_proceso_mb']:,.0f} MB "
+                f"de {PRESUPUESTO_MEMORIA_MB:,.0f} MB{pico}"
+            )
+            if rerun["excede_presupuesto"]:
+                st.warning("⚠️ La memoria del proceso pasa el presupuesto")
+        liberadas = (
+            f" · se descartaron {rerun['caches_liberadas_mb']:,.1f} MB de las entradas menos usadas"
+            if rerun["caches_liberadas_mb"] else ""
+        )
+        st.caption(f"Cachés: {rerun['caches_mb']:,.1f} MB de {PRESUPUESTO_CACHES_MB:,.0f} MB{liberadas}")
+        if not rerun["spans"]:
+            return
+
+        # Tiempo propio por categoría (sin el de los spans hijos, para no contar dos veces)
+        tiempo_hijos = {}
+        for registro in rerun["spans"]:
+            if registro["padre"] is not None:
+                tiempo_hijos[registro["padre"]] = tiempo_hijos.get(registro["padre"], 0) + registro["duracion_ms"]
+        por_categoria = {}
+        for registro in rerun["spans"]:
+            propio = registro["duracion_ms"] - tiempo_hijos.get(registro["span_id"], 0)
+            por_categoria[registro["categoria"]] = por_categoria.get(registro["categoria"], 0) + propio
+        st.caption(" · ".join(f"{categoria}: {ms:,.0f} ms" for categoria, ms in por_categoria.items()))
+
+        filas = ["| Span | Tipo | ms | % | MB proceso |", "|---|---|---:|---:|---:|"]
+        for registro in rerun["spans"]:
+            sangria = "&nbsp;&nbsp;" * registro["profundidad"]
+            porcentaje = registro["duracion_ms"] / rerun["duracion_ms"] * 100 if rerun["duracion_ms"] else 0
+            marca = " ❌" if "error" in registro else ""
+            # Pico de Python si tracemalloc está activo; si no, cuánto creció la memoria residente
+            # (en ambos casos del proceso: otras sesiones concurrentes también suman)
+            memoria = registro.get("pico_mb", registro.get("rss_proceso_delta_mb"))
+            filas.append(
+                f"| {sangria}{registro['nombre']}{marca} | {registro['categoria']} | "
+                f"{registro['duracion_ms']:,.1f} | {porcentaje:.0f}% | "
+                f"{'' if memoria is None else f'{memoria:+,.1f}'} |"
+            )
+        st.markdown("\n".join(filas), unsafe_allow_html=True)